@@ -1,3 +1,9 @@
+import os
+import sys
+
+# the script runs from its own directory, the shared Pure package is imported from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # from pydantic import BaseModel
 # from langchain_openai import ChatOpenAI
 # from langchain_anthropic import ChatAnthropic
@@ -6,33 +12,26 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 # from langchain.agents import create_react_agent, AgentExecutor
 from langchain_classic.agents import create_tool_calling_agent, AgentExecutor
-import subprocess
-import ResearchResponse
-
-
-def check_ollama_model(model_name: str):
-    """Ensure an Ollama model is available locally; pull if missing"""
-    try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        if model_name in result.stdout:
-            return
-        else:
-            subprocess.run(["ollama", "pull", model_name], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error while checking or pulling model '{model_name}':\n{e}")
-        raise
+from ResearchResponse import ResearchResponse
+from Pure.model_admin import ensure_models_sync, stop_model_sync
+from Pure.OllamaClient import OLLAMA_HOST
+
+# "record" writes every model call to TRACE_PATH, "replay" talks to `python -m Pure.Replay TRACE_PATH` instead of Ollama
+TRACE_MODE = None
+TRACE_PATH = "trace_langchain.jsonl"
+REPLAY_URL = "http://127.0.0.1:11500"
 
 
 class Agent:
     def __init__(self, model_name: str, tools, role: str):
         self.model_name = model_name
-        check_ollama_model(model_name)
-        self.llm = ChatOllama(model=model_name)
+        self.host = REPLAY_URL if TRACE_MODE == "replay" else OLLAMA_HOST
+        ensure_models_sync([model_name], host=self.host)
+        self.callbacks = []
+        if TRACE_MODE == "record":
+            from Pure.TraceCallbackHandler import TraceCallbackHandler
+            self.callbacks = [TraceCallbackHandler(TRACE_PATH)]
+        self.llm = ChatOllama(model=model_name, base_url=self.host, callbacks=self.callbacks or None)
         self.parser = PydanticOutputParser(pydantic_object=ResearchResponse)
         self.prompt = self._build_prompt(role)
         self.query = ""
@@ -59,6 +58,12 @@ class Agent:
         return prompt
 
 
+    def close(self):
+        """Closes the trace of record mode"""
+        for callback in self.callbacks:
+            callback.close()
+
+
     def set_query(self, query: str):
         """Sets the query that will be executed by the agent"""
         self.query = query
@@ -73,8 +78,8 @@ class Agent:
 
         try:
             structured_response = self.parser.parse((raw_response.get("output") or raw_response.get("output_text")))
-            subprocess.run(["ollama", "stop", self.model_name]) # stop ollama – saves A LOT of RAM
+            stop_model_sync(self.model_name, host=self.host) # stop ollama – saves A LOT of RAM
             return structured_response
         except Exception as e:
-            subprocess.run(["ollama", "stop", self.model_name]) # stop ollama – saves A LOT of RAM
+            stop_model_sync(self.model_name, host=self.host) # stop ollama – saves A LOT of RAM
             return "Error parsing response:", e, "Raw Response: ", raw_response
\ No newline at end of file
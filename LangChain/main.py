@@ -14,4 +14,5 @@ query = input("What would you like to search for? ")
 research_agent.set_query(query)
 
 response = research_agent.run_agent()
-print(response)
\ No newline at end of file
+print(response)
+research_agent.close()
\ No newline at end of file
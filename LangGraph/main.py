@@ -1,34 +1,33 @@
-import subprocess
-from langchain.chat_models import init_chat_model
-from Agent import Agent
+import os
+import sys
 
+# the script runs from its own directory, the shared Pure package is imported from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def check_ollama_model(model_name: str):
-    """Ensure an Ollama model is available locally; pull if missing"""
-    try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        if model_name in result.stdout:
-            return
-        else:
-            subprocess.run(["ollama", "pull", model_name], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error while checking or pulling model '{model_name}':\n{e}")
-        raise
+from langchain.chat_models import init_chat_model
+from Agent import Agent
+from Pure.model_admin import ensure_models_sync, stop_model_sync
+from Pure.OllamaClient import OLLAMA_HOST
 
+# "record" writes every model call to TRACE_PATH, "replay" talks to `python -m Pure.Replay TRACE_PATH` instead of Ollama
+TRACE_MODE = None
+TRACE_PATH = "trace_langgraph.jsonl"
+REPLAY_URL = "http://127.0.0.1:11500"
 
 model_name = "gpt-oss:20b"
-check_ollama_model(model_name)
-llm = init_chat_model(model=model_name, model_provider="ollama")
+host = REPLAY_URL if TRACE_MODE == "replay" else OLLAMA_HOST
+ensure_models_sync([model_name], host=host)
+callbacks = None
+if TRACE_MODE == "record":
+    from Pure.TraceCallbackHandler import TraceCallbackHandler
+    callbacks = [TraceCallbackHandler(TRACE_PATH)]
+llm = init_chat_model(model=model_name, model_provider="ollama", base_url=host, callbacks=callbacks)
 
 mind = Agent(llm)
-mind.run_chatbot()
-
 try:
-    subprocess.run(["ollama", "stop", model_name]) # stop ollama – saves a lot of RAM
-except Exception as e:
-    pass
\ No newline at end of file
+    mind.run_chatbot()
+finally:
+    for callback in callbacks or []:
+        callback.close() # the trace of record mode
+
+stop_model_sync(model_name, host=host) # stop ollama – saves a lot of RAM
\ No newline at end of file
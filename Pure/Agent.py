@@ -1,41 +1,34 @@
-import subprocess
-import requests
-import aiohttp
-
-OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
-OLLAMA_TIMEOUT = 120
-
-
-def check_ollama_model(model: str):
-    """Ensure an Ollama model is available locally; pull if missing"""
-    try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        if model in result.stdout:
-            return
-        else:
-            subprocess.run(["ollama", "pull", model], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error while checking or pulling model '{model}':\n{e}")
-        raise
+import time
+from contextlib import aclosing
 
+import requests
 
-def quit_ollama(model: str):
-    """Quit Ollama. Saves a lot of RAM"""
-    try:
-        subprocess.run(["ollama", "stop", model])
-    except Exception as e:
-        print(e)
+from Pure.OllamaClient import OllamaClient
+from Pure.deadline import within_deadline
+from Pure.question_stats import count_tokens
+from Pure.StreamParser import JsonFieldWatcher
+from Pure.tracing import span
 
 
 class Agent():
-    def __init__(self, model, role):
+    def __init__(self, model, role, client: OllamaClient = None, stage: str = None, timeout: float = None):
         self.model = model
         self.role = role
+        self.client = client
+        self.stage = stage
+        # seconds a single call may take, on top of the deadline of the question (None: only that deadline)
+        self.timeout = timeout
+        self.last_stream_stats = None
+        # prompt and generated tokens of the last call, None until a call finished
+        self.last_tokens = None
+
+    def role_name(self):
+        """First line of the role prompt, short enough for span attributes"""
+        return self.role.strip().split("\n", 1)[0][:80]
+
+    def call_span(self, streamed: bool):
+        return span("model_call", kind="model_call", model=self.model, stage=self.stage, role=self.role_name(),
+                    streamed=streamed)
 
     def build_chat_prompt(self, user_input):
         """Build a chat prompt"""
@@ -44,22 +37,92 @@ class Agent():
             {"role": "user", "content": user_input}
         ]
 
-    async def ollama_chat(self, prompt: list[dict], temperature: float = 0.7, max_tokens: int = 2000):
-        """Get a response from Ollama /api/chat"""
-        package = {
+    def build_package(self, prompt: list[dict], temperature: float, max_tokens: int):
+        """Build an /api/chat request body"""
+        return {
             "model": self.model,
             "messages": prompt,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens,
-                "no_cache": True,
             },
             "stream": False,
             "format": "json"
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(OLLAMA_CHAT_URL, json=package) as response:
-                response.raise_for_status()
-                data = await response.json()
-                return data["message"]["content"]
\ No newline at end of file
+    async def ollama_chat(self, prompt: list[dict], temperature: float = 0.7, max_tokens: int = 2000):
+        """Get a response from Ollama /api/chat"""
+        package = self.build_package(prompt=prompt, temperature=temperature, max_tokens=max_tokens)
+        self.last_tokens = None
+
+        with self.call_span(streamed=False):
+            data = await within_deadline(self._chat(package), timeout=self.timeout)
+        self.last_tokens = (data.get("prompt_eval_count") or 0) + (data.get("eval_count") or 0)
+        return data["message"]["content"]
+
+    async def _chat(self, package: dict):
+        if self.client is None:
+            async with OllamaClient() as client:
+                return await client.chat(package, stage=self.stage)
+        return await self.client.chat(package, stage=self.stage)
+
+    async def ollama_chat_stream(self, prompt: list[dict], temperature: float = 0.7, max_tokens: int = 2000,
+                                 stop_field: str = None, on_progress=None):
+        """Get a streamed response from Ollama /api/chat.
+        If stop_field is given, generation is cut as soon as that top-level JSON field is complete.
+        on_progress(chunks, text) is called for every received chunk"""
+        package = self.build_package(prompt=prompt, temperature=temperature, max_tokens=max_tokens)
+        self.last_tokens = None
+
+        with self.call_span(streamed=True) as call:
+            result = await within_deadline(self._stream(package, stop_field, on_progress), timeout=self.timeout)
+            call.set(**self.last_stream_stats)
+        return result
+
+    async def _stream(self, package: dict, stop_field: str, on_progress):
+        if self.client is None:
+            async with OllamaClient() as client:
+                return await self._consume_stream(client, package, stop_field, on_progress)
+        return await self._consume_stream(self.client, package, stop_field, on_progress)
+
+    async def _consume_stream(self, client: OllamaClient, package: dict, stop_field: str, on_progress):
+        watcher = JsonFieldWatcher(stop_field) if stop_field else None
+        parts = []
+        chunks = 0
+        stopped_early = False
+        start = time.perf_counter()
+        first_token = None
+        final = None
+
+        async with aclosing(client.chat_stream(package, stage=self.stage)) as stream:
+            async for chunk in stream:
+                text = chunk.get("message", {}).get("content", "")
+                if chunk.get("done"):
+                    final = chunk
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks += 1
+                parts.append(text)
+                if on_progress is not None:
+                    on_progress(chunks, text)
+                if watcher is not None and watcher.feed(text):
+                    stopped_early = not chunk.get("done", False)
+                    break
+
+        if final is not None:
+            self.last_tokens = (final.get("prompt_eval_count") or 0) + (final.get("eval_count") or 0)
+        else:
+            # a stream stopped before Ollama's final chunk reports no counts; every chunk is one generated token
+            self.last_tokens = chunks
+            count_tokens({"eval_count": chunks})
+        self.last_stream_stats = {
+            "time_to_first_token": first_token,
+            "duration": time.perf_counter() - start,
+            "chunks": chunks,
+            "stopped_early": stopped_early
+        }
+        if watcher is not None and watcher.done:
+            return watcher.closed_json()
+        return "".join(parts)
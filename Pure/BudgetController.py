@@ -0,0 +1,100 @@
+import time
+
+from Pure.answer_normalizer import NO_SOLUTION, NOT_GOOD, cluster_answers
+from Pure.deadline import expired
+from Pure.question_stats import current
+
+AGREED = "agreed"
+BEST_EFFORT = "best_effort"
+
+
+class BudgetController():
+    """Plans the calculate/evaluate retry rounds of one question.
+    Each rejected round gets more calculators the more the candidates disagree, as long as the question's
+    wall-clock and token budgets (None: unlimited) still cover the round. Rounds also stop once the
+    leading answer has stayed the same for `patience` rounds, because more of the same rarely flips the evaluators"""
+    def __init__(self, time_budget: float = None, token_budget: int = None, max_rounds: int = 9,
+                 max_width: int = 3, patience: int = 2, precision: int = None):
+        self.time_budget = time_budget
+        self.token_budget = token_budget
+        self.max_rounds = max_rounds
+        self.max_width = max_width
+        self.patience = patience
+        self.precision = precision
+        self.stats = current()
+        self.start = self.stats.start if self.stats is not None else time.perf_counter()
+        self.rounds = 0
+        self.round_times = []
+        self.calls = 0
+        self.leader = None
+        self.unchanged = 0
+        self.stop_reason = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def tokens_used(self):
+        return self.stats.tokens if self.stats is not None else 0
+
+    def clusters(self, candidates: list):
+        return [c for c in cluster_answers(candidates, self.precision) if c["key"] != NOT_GOOD]
+
+    def disagreement(self, candidates: list):
+        """0 when all valid candidates are equivalent, close to 1 when every one of them differs"""
+        clusters = self.clusters(candidates)
+        valid = sum(c["support"] for c in clusters)
+        if valid == 0:
+            return 1.0
+        return 1.0 - clusters[0]["support"] / valid
+
+    def record_round(self, seconds: float, calls: int, candidates: list):
+        """Account for a finished calculate/evaluate round and the candidates known after it"""
+        self.rounds += 1
+        self.round_times.append(seconds)
+        self.calls += calls
+        clusters = self.clusters(candidates)
+        leader = clusters[0]["key"] if clusters else None
+        self.unchanged = self.unchanged + 1 if leader is not None and leader == self.leader else 0
+        self.leader = leader
+
+    def next_width(self, candidates: list):
+        """How many calculators the next round runs, 0 when the question should stop. Sets stop_reason"""
+        if expired():
+            return self._stop("deadline")
+        if self.rounds >= self.max_rounds:
+            return self._stop("max_rounds")
+        if self.unchanged >= self.patience:
+            return self._stop("stalled")
+
+        width = 1 + round(self.disagreement(candidates) * (self.max_width - 1))
+        if self.time_budget is not None:
+            remaining = self.time_budget - self.elapsed()
+            expected = sum(self.round_times) / len(self.round_times) if self.round_times else 0.0
+            if remaining <= 0 or remaining < expected:
+                return self._stop("time_budget")
+        if self.token_budget is not None:
+            remaining = self.token_budget - self.tokens_used()
+            per_call = self.tokens_used() / self.calls if self.calls else 0
+            affordable = int(remaining // per_call) if per_call else width
+            if remaining <= 0 or affordable < 1:
+                return self._stop("token_budget")
+            width = min(width, affordable)
+        return width
+
+    def _stop(self, reason: str):
+        self.stop_reason = reason
+        return 0
+
+    def best_effort(self, candidates: list):
+        """Representative of the best supported candidate cluster, or None when there is no usable candidate"""
+        clusters = [c for c in self.clusters(candidates) if c["key"] != NO_SOLUTION] or self.clusters(candidates)
+        return clusters[0]["representative"] if clusters else None
+
+    def summary(self):
+        return {
+            "rounds": self.rounds,
+            "calls": self.calls,
+            "elapsed": self.elapsed(),
+            "tokens": self.tokens_used(),
+            "stop_reason": self.stop_reason
+        }
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from Pure.SingleFlight import question_key
+
+# stage of a question's state once it has an answer, or once it stopped with an error
+ANSWERED = "answered"
+FAILED = "failed"
+
+
+class Checkpoint():
+    """Pipeline state of one question: research, candidates, retry round, evaluator outputs and, once known, the
+    answer. Every update is written through to the store, so a crash loses at most the stage in progress"""
+    def __init__(self, store, question: str, state: dict = None):
+        self.store = store
+        self.question = question
+        self.state = state or {"stage": None, "research": None, "candidates": [], "round": 0, "evaluations": []}
+        self.resumed = state is not None
+
+    def get(self, name: str, default=None):
+        return self.state.get(name, default)
+
+    async def update(self, **fields):
+        self.state.update(fields, updated=time.time())
+        await self.store.save(self.question, dict(self.state))
+
+    async def add_evaluation(self, verdicts: list):
+        await self.update(stage="evaluate", evaluations=self.state["evaluations"] + [verdicts])
+
+
+class CheckpointStore():
+    """Persists per-question pipeline state in SQLite, keyed like coalesced questions (case and spacing do not
+    matter), so a failed or interrupted question resumes from its last completed stage"""
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db_lock = threading.Lock()
+        self.db.execute("""CREATE TABLE IF NOT EXISTS checkpoints (
+            key TEXT PRIMARY KEY,
+            question TEXT,
+            stage TEXT,
+            state TEXT,
+            updated REAL
+        )""")
+        self.db.commit()
+        self.counters = {"started": 0, "resumed": 0, "saves": 0}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def open(self, question: str):
+        """The Checkpoint of a question, with its saved state if there is one"""
+        state = await asyncio.to_thread(self._disk_get, question_key(question))
+        self.counters["resumed" if state is not None else "started"] += 1
+        return Checkpoint(self, question, state)
+
+    async def save(self, question: str, state: dict):
+        self.counters["saves"] += 1
+        await asyncio.to_thread(self._disk_put, question_key(question), question, state)
+
+    def _disk_get(self, key: str):
+        with self.db_lock:
+            row = self.db.execute("SELECT state FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _disk_put(self, key: str, question: str, state: dict):
+        with self.db_lock:
+            self.db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                            (key, question, state.get("stage"), json.dumps(state, default=str), time.time()))
+            self.db.commit()
+
+    def summary(self):
+        """Saved questions per stage and this process's counters"""
+        with self.db_lock:
+            stages = dict(self.db.execute("SELECT stage, COUNT(*) FROM checkpoints GROUP BY stage").fetchall())
+        return dict(self.counters, stages=stages)
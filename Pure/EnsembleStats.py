@@ -0,0 +1,180 @@
+import asyncio
+import random
+import re
+import sqlite3
+import threading
+
+from Pure.answer_normalizer import equivalent
+
+DEFAULT_MIN_SAMPLES = 5
+DEFAULT_CONFIDENT_AGREEMENT = 0.8
+DEFAULT_EXPLORATION = 0.1
+# how much a slower calculator is penalised: score *= (fastest mean latency / its mean latency) ** LATENCY_WEIGHT
+LATENCY_WEIGHT = 0.5
+COUNTERS = ("runs", "judged", "agreed", "failures", "latency", "tokens", "cancelled")
+COLUMNS = ", ".join(COUNTERS)
+
+CATEGORIES = [
+    ("calculus", re.compile(r"derivative|integral|limit|differentiat|integrat", re.IGNORECASE)),
+    ("probability", re.compile(r"probabilit|chance|coin|dice|\bdie\b|random|expected value", re.IGNORECASE)),
+    ("geometry", re.compile(r"triangle|circle|square|tetrahedron|polyhedron|hypotenuse|angle|area|volume|vector",
+                            re.IGNORECASE)),
+    ("number_theory", re.compile(r"remainder|prime|divisib|gcd|lcm|modulo|\bmod\b|factorial|\d!|trailing zeros",
+                                 re.IGNORECASE)),
+    ("series", re.compile(r"\bsum\b|series|sequence|\.\.\.", re.IGNORECASE)),
+    ("equation", re.compile(r"\bsolve\b|=", re.IGNORECASE)),
+]
+
+
+def question_category(question: str):
+    """Coarse kind of math a question asks for; calculators are ranked separately per category"""
+    for name, pattern in CATEGORIES:
+        if pattern.search(question):
+            return name
+    return "arithmetic"
+
+
+class EnsembleStats():
+    """How each (model, role) calculator did per question category: runs, runs with a known verdict,
+    agreement with that verdict, JSON/call failures, runs cancelled by a quorum, latency and tokens. Kept in
+    memory and, with a path, in SQLite so the history survives restarts. Used to pick the calculators of a question"""
+    def __init__(self, path: str = None, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 confident_agreement: float = DEFAULT_CONFIDENT_AGREEMENT, exploration: float = DEFAULT_EXPLORATION):
+        self.min_samples = min_samples
+        self.confident_agreement = confident_agreement
+        self.exploration = exploration
+        self.rows = {}
+        self.db = None
+        self.db_lock = threading.Lock()
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("""CREATE TABLE IF NOT EXISTS calculators (
+                model TEXT,
+                role TEXT,
+                category TEXT,
+                runs INTEGER,
+                judged INTEGER,
+                agreed INTEGER,
+                failures INTEGER,
+                latency REAL,
+                tokens INTEGER,
+                cancelled INTEGER DEFAULT 0,
+                PRIMARY KEY (model, role, category)
+            )""")
+            self.db.commit()
+            for model, role, category, *counters in self.db.execute(f"SELECT model, role, category, {COLUMNS} "
+                                                                    f"FROM calculators"):
+                self.rows[(model, role, category)] = dict(zip(COUNTERS, counters))
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def row(self, model: str, role: str, category: str):
+        return self.rows.get((model, role, category)) or \
+            {"runs": 0, "judged": 0, "agreed": 0, "failures": 0, "latency": 0.0, "tokens": 0, "cancelled": 0}
+
+    def agreement(self, row: dict):
+        """Share of judged runs that agreed with the verdict, pulled towards 1/2 while there are few"""
+        return (row["agreed"] + 1) / (row["judged"] + 2)
+
+    def reliability(self, row: dict):
+        # a cancelled run neither failed nor succeeded
+        finished = row["runs"] - row["cancelled"]
+        return (finished - row["failures"] + 1) / (finished + 2)
+
+    def successes(self, row: dict):
+        return row["runs"] - row["failures"] - row["cancelled"]
+
+    def mean_latency(self, row: dict):
+        """Cancelled runs are censored samples: their time until the cancellation is added, but only completed
+        runs count as samples, so calculators the quorum usually cuts off do not look fast"""
+        successes = self.successes(row)
+        if successes > 0:
+            return row["latency"] / successes
+        return row["latency"] or None
+
+    def ranking(self, category: str, pairs: list[tuple]):
+        """(model, role) pairs best first. Pairs without history rank as if they were the fastest,
+        so new calculators get tried"""
+        latencies = [self.mean_latency(self.row(m, r, category)) for m, r in pairs]
+        fastest = min((latency for latency in latencies if latency), default=None)
+
+        def score(pair, latency):
+            row = self.row(*pair, category)
+            speed = (fastest / latency) ** LATENCY_WEIGHT if fastest and latency else 1.0
+            return self.agreement(row) * self.reliability(row) * speed
+
+        scored = [(score(pair, latency), i, pair) for i, (pair, latency) in enumerate(zip(pairs, latencies))]
+        return [pair for _, _, pair in sorted(scored, key=lambda s: (-s[0], s[1]))]
+
+    def choose(self, category: str, pairs: list[tuple], width: int, exclude: list[tuple] = ()):
+        """`width` pairs from the top of the ranking, preferring models not chosen yet so that the answers
+        stay independent. With probability `exploration` the last pick is a random other pair"""
+        ranked = [p for p in self.ranking(category, pairs) if p not in exclude] or self.ranking(category, pairs)
+        chosen = []
+        models = {m for m, _ in exclude}
+        while len(chosen) < width:
+            fresh = [p for p in ranked if p not in chosen and p[0] not in models]
+            remaining = fresh or [p for p in ranked if p not in chosen] or ranked
+            chosen.append(remaining[0])
+            models.add(remaining[0][0])
+        others = [p for p in ranked if p not in chosen]
+        if others and random.random() < self.exploration:
+            chosen[-1] = random.choice(others)
+        return chosen
+
+    def initial_width(self, category: str, chosen: list[tuple], default: int):
+        """Two calculators are enough for a local consensus when both reliably agreed with past verdicts"""
+        if default <= 2 or len(chosen) < 2:
+            return default
+        rows = [self.row(*pair, category) for pair in chosen[:2]]
+        if all(r["judged"] >= self.min_samples and r["agreed"] / r["judged"] >= self.confident_agreement
+               for r in rows):
+            return 2
+        return default
+
+    async def record(self, category: str, calculations: list[dict], verdict=None, precision: int = None):
+        """Add the calculator runs of a question. verdict is the accepted answer, None when there was none"""
+        changed = set()
+        for run in calculations:
+            key = (run["model"], run["role"], category)
+            row = self.rows.setdefault(key, self.row(*key))
+            row["runs"] += 1
+            if run.get("cancelled"):
+                row["cancelled"] += 1
+                row["latency"] += run["latency"]
+            elif run["failed"]:
+                row["failures"] += 1
+            else:
+                row["latency"] += run["latency"]
+                row["tokens"] += run["tokens"] or 0
+                if verdict is not None:
+                    row["judged"] += 1
+                    row["agreed"] += int(equivalent(run["answer"], verdict, precision=precision))
+            changed.add(key)
+        if self.db is not None and changed:
+            await asyncio.to_thread(self._disk_put, [(key, dict(self.rows[key])) for key in changed])
+
+    def _disk_put(self, rows: list):
+        with self.db_lock:
+            self.db.executemany(f"INSERT OR REPLACE INTO calculators (model, role, category, {COLUMNS}) "
+                                f"VALUES (?, ?, ?, {', '.join('?' * len(COUNTERS))})",
+                                [(*key, *(r[name] for name in COUNTERS)) for key, r in rows])
+            self.db.commit()
+
+    def summary(self):
+        """Per category and (model, role): runs, agreement, failure and cancellation rates, mean latency and tokens"""
+        result = {}
+        for (model, role, category), row in sorted(self.rows.items()):
+            successes = self.successes(row)
+            result.setdefault(category, {})[f"{model}/{role}"] = {
+                "runs": row["runs"],
+                "agreement": row["agreed"] / row["judged"] if row["judged"] else None,
+                "failure_rate": row["failures"] / row["runs"] if row["runs"] else 0.0,
+                "cancelled_rate": row["cancelled"] / row["runs"] if row["runs"] else 0.0,
+                "latency": self.mean_latency(row),
+                "tokens": row["tokens"] / successes if successes > 0 else None
+            }
+        return result
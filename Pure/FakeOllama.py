@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+from Pure.answer_normalizer import NOT_GOOD, clear_majority
+from Pure.model_admin import normalize_name
+
+GIGABYTE = 1024 ** 3
+DEFAULT_MODELS = {
+    "llama3.1:8b": 4.9 * GIGABYTE,
+    "deepseek-r1:14b": 9.0 * GIGABYTE,
+    "qwen2.5:7b": 4.7 * GIGABYTE,
+    "qwen2.5:3b": 1.9 * GIGABYTE,
+    "phi4-mini:latest": 2.5 * GIGABYTE,
+    "gemma2:2b": 1.6 * GIGABYTE,
+    "nomic-embed-text:latest": 0.3 * GIGABYTE
+}
+QUESTION_PATTERN = re.compile(r"QUESTION:\s*(.*?)\s*(?:RESEARCH:|$)", re.DOTALL)
+ANSWERS_PATTERN = re.compile(r"POSSIBLE ANSWERS:\s*(\[.*?\])\s*$", re.MULTILINE)
+SUPPORT_PATTERN = re.compile(r"SUPPORT:\s*(\[.*?\])\s*$", re.MULTILINE)
+EMBED_DIMENSIONS = 64
+
+
+class FakeOllama():
+    """Local stand-in for the Ollama API (/api/chat, /api/generate, /api/ps, /api/tags, /api/embed, /api/pull).
+    Returns schema-valid researcher, calculator and evaluator JSON with configurable load delay, per-token latency,
+    parallel slots per model, error and invalid JSON rates. Identical request sequences get identical responses.
+    parallel is the slots of every model or a {model: slots} mapping, models not listed get 1"""
+    def __init__(self, models: dict = None, load_delay: float = 0.5, token_latency: float = 0.002,
+                 parallel: int | dict = 1, max_loaded_models: int = 3, error_rate: float = 0.0,
+                 invalid_json_rate: float = 0.0, wrong_answer_rate: float = 0.2, answers: dict = None,
+                 seed: int = 0):
+        self.models = {normalize_name(m): size for m, size in (models or DEFAULT_MODELS).items()}
+        self.load_delay = load_delay
+        self.token_latency = token_latency
+        self.parallel = {normalize_name(m): n for m, n in parallel.items()} if isinstance(parallel, dict) else parallel
+        self.max_loaded_models = max_loaded_models
+        self.error_rate = error_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.wrong_answer_rate = wrong_answer_rate
+        self.answers = answers or {}
+        self.seed = seed
+        self.loaded = OrderedDict()
+        self.slots = {}
+        self.in_use = {}
+        self.occurrences = {}
+        self.loading = {}
+        self.requests = 0
+        self.runner = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_post("/api/generate", self.handle_generate)
+        app.router.add_post("/api/embed", self.handle_embed)
+        app.router.add_post("/api/pull", self.handle_pull)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_get("/api/tags", self.handle_tags)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 11434):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def rng(self, payload: dict):
+        """Random generator seeded by the request itself and how often it was seen before"""
+        material = json.dumps([payload.get("model"), payload.get("messages"), payload.get("prompt"),
+                               payload.get("options", {}).get("temperature")], sort_keys=True)
+        count = self.occurrences.get(material, 0)
+        self.occurrences[material] = count + 1
+        digest = hashlib.sha256(f"{self.seed}|{count}|{material}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    async def ensure_loaded(self, model: str):
+        """Simulate a model load, evicting the least recently used idle model when too many are loaded"""
+        if model in self.loaded:
+            self.loaded.move_to_end(model)
+            return 0.0
+        if model in self.loading:
+            start = time.perf_counter()
+            await self.loading[model]
+            return time.perf_counter() - start
+
+        self.loading[model] = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.sleep(self.load_delay)
+            while len(self.loaded) >= self.max_loaded_models:
+                idle = [m for m in self.loaded if self.in_use.get(m, 0) == 0]
+                if not idle:
+                    break
+                del self.loaded[idle[0]]
+            self.loaded[model] = time.time()
+        finally:
+            self.loading.pop(model).set_result(None)
+        return self.load_delay
+
+    def slot(self, model: str):
+        if model not in self.slots:
+            slots = self.parallel.get(model, 1) if isinstance(self.parallel, dict) else self.parallel
+            self.slots[model] = asyncio.Semaphore(slots)
+        return self.slots[model]
+
+    def expected_answer(self, question: str, rng: random.Random):
+        answer = self.answers.get(question.strip())
+        if answer is None:
+            answer = str(int(hashlib.sha256(question.encode("utf-8")).hexdigest()[:4], 16) % 97)
+        if rng.random() < self.wrong_answer_rate:
+            return f"{answer}+{rng.randint(1, 3)}" if not str(answer).isdigit() else str(int(answer) + rng.randint(1, 3))
+        return str(answer)
+
+    def respond(self, payload: dict, rng: random.Random):
+        """Build the JSON content a real model would produce for the researcher, calculator or evaluator role"""
+        messages = payload.get("messages") or [{"role": "user", "content": payload.get("prompt", "")}]
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = "\n".join(m["content"] for m in messages if m["role"] == "user")
+        match = QUESTION_PATTERN.search(user)
+        question = match.group(1).strip() if match else user.strip()
+
+        if "researcher" in system:
+            content = {
+                "theory_notes": ["Definition relevant to the question", "Standard identity", "Common pitfall"],
+                "methods": ["Apply the standard method step by step"],
+                "constraints": {"validity_checks_for_evaluator": []},
+                "constraint_sources": []
+            }
+        elif "result selector" in system:
+            # the prompt lists distinct candidates and how many calculators gave each, like with_candidates writes them
+            candidates = self.listed(ANSWERS_PATTERN, user)
+            support = self.listed(SUPPORT_PATTERN, user) or [1] * len(candidates)
+            if len(support) != len(candidates):
+                support = [1] * len(candidates)
+            majority = clear_majority([c for c, n in zip(candidates, support) for _ in range(int(n))])
+            content = {"final_answer": majority if majority is not None else NOT_GOOD}
+        else:
+            steps = " ".join(f"Step {i}: work on the problem." for i in range(1, rng.randint(3, 12)))
+            content = {"thought": steps, "final_answer": self.expected_answer(question, rng)}
+
+        text = json.dumps(content)
+        if rng.random() < self.invalid_json_rate:
+            text = rng.choice([
+                text[:max(1, len(text) // 2)],
+                f"Sure! Here is the result:\n```json\n{text}\n```",
+                f"{text}\nI hope this helps."
+            ])
+        return text
+
+    @staticmethod
+    def listed(pattern: re.Pattern, text: str):
+        match = pattern.search(text)
+        if match is None:
+            return []
+        try:
+            values = json.loads(match.group(1))
+        except ValueError:
+            return []
+        return values if isinstance(values, list) else []
+
+    def tokens(self, text: str):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def stats(self, payload: dict, load_time: float, tokens: int, started: float):
+        prompt = json.dumps(payload.get("messages") or payload.get("prompt", ""))
+        eval_duration = tokens * self.token_latency
+        return {
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(load_time * 1e9),
+            "prompt_eval_count": math.ceil(len(prompt) / 4),
+            "prompt_eval_duration": int(len(prompt) / 4 * self.token_latency / 10 * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(eval_duration * 1e9)
+        }
+
+    async def handle_chat(self, request: web.Request):
+        payload = await request.json()
+        return await self.generate(request, payload, chat=True)
+
+    async def handle_generate(self, request: web.Request):
+        payload = await request.json()
+        model = normalize_name(payload.get("model", ""))
+        if model not in self.models:
+            return web.json_response({"error": f"model '{payload.get('model')}' not found"}, status=404)
+        if payload.get("keep_alive") == 0 and not payload.get("prompt"):
+            self.loaded.pop(model, None)
+            return web.json_response({"model": model, "response": "", "done": True, "done_reason": "unload"})
+        if not payload.get("prompt"):
+            load_time = await self.ensure_loaded(model)
+            return web.json_response({"model": model, "response": "", "done": True,
+                                      "load_duration": int(load_time * 1e9)})
+        return await self.generate(request, payload, chat=False)
+
+    async def generate(self, request: web.Request, payload: dict, chat: bool):
+        started = time.perf_counter()
+        self.requests += 1
+        model = normalize_name(payload.get("model", ""))
+        if model not in self.models:
+            return web.json_response({"error": f"model '{payload.get('model')}' not found"}, status=404)
+        rng = self.rng(payload)
+        if rng.random() < self.error_rate:
+            return web.json_response({"error": "simulated server error"}, status=500)
+
+        async with self.slot(model):
+            self.in_use[model] = self.in_use.get(model, 0) + 1
+            try:
+                load_time = await self.ensure_loaded(model)
+                text = self.respond(payload, rng)
+                limit = payload.get("options", {}).get("num_predict")
+                tokens = self.tokens(text)[:limit] if limit else self.tokens(text)
+                if payload.get("stream", True):
+                    return await self.stream(request, model, tokens, payload, load_time, started, chat)
+
+                await asyncio.sleep(len(tokens) * self.token_latency)
+                body = {"model": model, "done": True, "done_reason": "stop"}
+                if chat:
+                    body["message"] = {"role": "assistant", "content": "".join(tokens)}
+                else:
+                    body["response"] = "".join(tokens)
+                body.update(self.stats(payload, load_time, len(tokens), started))
+                return web.json_response(body)
+            finally:
+                self.in_use[model] -= 1
+
+    async def stream(self, request: web.Request, model: str, tokens: list[str], payload: dict, load_time: float,
+                     started: float, chat: bool):
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        try:
+            for token in tokens:
+                await asyncio.sleep(self.token_latency)
+                chunk = {"model": model, "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": token}
+                else:
+                    chunk["response"] = token
+                await response.write((json.dumps(chunk) + "\n").encode("utf-8"))
+            final = {"model": model, "done": True, "done_reason": "stop"}
+            final.update({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})
+            final.update(self.stats(payload, load_time, len(tokens), started))
+            await response.write((json.dumps(final) + "\n").encode("utf-8"))
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            # the client stopped reading, like a real server we stop generating
+            pass
+        return response
+
+    async def handle_embed(self, request: web.Request):
+        payload = await request.json()
+        inputs = payload.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        embeddings = []
+        for text in inputs:
+            vector = [0.0] * EMBED_DIMENSIONS
+            padded = f" {text.lower()} "
+            for i in range(len(padded) - 2):
+                bucket = int(hashlib.md5(padded[i:i + 3].encode("utf-8")).hexdigest()[:8], 16) % EMBED_DIMENSIONS
+                vector[bucket] += 1.0
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            embeddings.append([v / norm for v in vector])
+        return web.json_response({"model": payload.get("model"), "embeddings": embeddings})
+
+    async def handle_pull(self, request: web.Request):
+        payload = await request.json()
+        self.models.setdefault(normalize_name(payload.get("model", "")), 1 * GIGABYTE)
+        return web.json_response({"status": "success"})
+
+    async def handle_ps(self, request: web.Request):
+        return web.json_response({"models": [
+            {"name": model, "model": model, "size": int(self.models[model]), "size_vram": 0}
+            for model in self.loaded
+        ]})
+
+    async def handle_tags(self, request: web.Request):
+        return web.json_response({"models": [
+            {"name": model, "model": model, "size": int(size)} for model, size in self.models.items()
+        ]})
+
+
+def load_answers(path: str):
+    """question -> correct_answer map from a question bank file"""
+    if path is None:
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        entries = [json.loads(line) for line in file if line.strip()] if path.endswith(".jsonl") else json.load(file)
+    return {e["question"].strip(): e.get("correct_answer") for e in entries if e.get("correct_answer") is not None}
+
+
+async def serve(server: FakeOllama, host: str, port: int):
+    await server.start(host, port)
+    print(f"Fake Ollama listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def parse_parallel(value: str):
+    """--parallel 2 for every model, or --parallel qwen2.5:7b=2,phi4-mini=4 per model"""
+    if "=" not in value:
+        return int(value)
+    return {model.strip(): int(slots) for model, slots in (item.rsplit("=", 1) for item in value.split(","))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--load-delay", type=float, default=0.5, help="seconds to load a model")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--parallel", type=parse_parallel, default=1,
+                        help="requests each model serves at once, or model=slots,... per model (others get 1)")
+    parser.add_argument("--max-loaded-models", type=int, default=3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="share of responses with broken JSON")
+    parser.add_argument("--wrong-answer-rate", type=float, default=0.2, help="share of calculators answering wrong")
+    parser.add_argument("--answers", default=None, help="question bank (JSON/JSONL) with correct answers to return")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOllama(load_delay=args.load_delay, token_latency=args.token_latency, parallel=args.parallel,
+                        max_loaded_models=args.max_loaded_models, error_rate=args.error_rate,
+                        invalid_json_rate=args.invalid_json_rate, wrong_answer_rate=args.wrong_answer_rate,
+                        answers=load_answers(args.answers), seed=args.seed)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
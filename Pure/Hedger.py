@@ -0,0 +1,87 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from Pure.question_stats import count_hedge
+from Pure.tracing import annotate
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_WINDOW = 200
+
+
+class Hedger():
+    """Sends a backup copy of a slow call, keeps whichever answer comes first and cancels the other.
+    A call counts as slow once it runs longer than `percentile` of the recent calls of its kind (e.g. a stage);
+    until `min_samples` calls finished nothing is hedged"""
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 window: int = DEFAULT_WINDOW):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.latencies = {}
+        self.counters = {}
+
+    def record(self, key: str, seconds: float):
+        self.latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, key: str):
+        """Latency after which a call of this kind is hedged, None while there are too few samples"""
+        samples = self.latencies.get(key)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(1, math.ceil(self.percentile / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    async def run(self, key: str, primary, backup=None):
+        """Await primary() and, if it is slower than the threshold, also backup(). Both are callables returning
+        coroutines. An error of one copy is only raised when the other one fails too"""
+        counters = self.counters.setdefault(key, {"calls": 0, "hedged": 0, "backup_wins": 0, "cancelled": 0})
+        counters["calls"] += 1
+        start = time.perf_counter()
+        limit = self.threshold(key) if backup is not None else None
+        if limit is None:
+            result = await primary()
+            self.record(key, time.perf_counter() - start)
+            return result
+
+        tasks = {asyncio.ensure_future(primary()): "primary"}
+        pending = set(tasks)
+        try:
+            done, pending = await asyncio.wait(pending, timeout=limit)
+            if not done:
+                counters["hedged"] += 1
+                count_hedge(key)
+                annotate(hedged=True, hedge_after=limit)
+                backup_task = asyncio.ensure_future(backup())
+                tasks[backup_task] = "backup"
+                pending.add(backup_task)
+
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] == "backup":
+                            counters["backup_wins"] += 1
+                        self.record(key, time.perf_counter() - start)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                if len(tasks) > 1:
+                    counters["cancelled"] += len(pending)
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self):
+        """Per kind of call: calls, hedged calls (each one extra model call), wins of the backup,
+        cancelled copies and the current hedging threshold"""
+        return {key: dict(counters, hedge_rate=counters["hedged"] / counters["calls"] if counters["calls"] else 0.0,
+                          threshold=self.threshold(key))
+                for key, counters in self.counters.items()}
@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+
+from Pure.model_admin import normalize_name, stop_model
+
+GIGABYTE = 1024 ** 3
+DEFAULT_RAM_BUDGET = 16 * GIGABYTE
+DEFAULT_KEEP_ALIVE = "30m"
+# /api/ps is read again after this many seconds, so models Ollama unloaded on its own are noticed
+DEFAULT_SYNC_INTERVAL = 30
+
+
+class ModelResidency():
+    """Keeps track of which models Ollama has in memory and evicts the least recently used ones
+    only when loading another model would go over the RAM budget. Models are tracked under their
+    normalized names ("phi4-mini:latest"), the way /api/ps and /api/tags list them. Wraps an OllamaClient"""
+    def __init__(self, client, ram_budget: int = DEFAULT_RAM_BUDGET, keep_alive: str = DEFAULT_KEEP_ALIVE,
+                 sync_interval: float = DEFAULT_SYNC_INTERVAL):
+        self.client = client
+        self.ram_budget = ram_budget
+        self.keep_alive = keep_alive
+        self.sync_interval = sync_interval
+        self.loaded = OrderedDict()
+        self.sizes = {}
+        self.in_use = {}
+        self.load_times = {}
+        self.evictions = 0
+        # the latest prefetch of each model; finished ones are added to prefetch_totals once used or replaced
+        self.prefetches = {}
+        self.prefetch_totals = {}
+        self.lock = asyncio.Lock()
+        self.synced_at = None
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def used_memory(self):
+        return sum(self.loaded.values())
+
+    async def refresh(self):
+        """Sync the residency table with Ollama's /api/ps. Models in use or being loaded stay in the table
+        even when Ollama does not list them yet"""
+        data = await self.client.get("/api/ps")
+        resident = {normalize_name(m["name"]): m.get("size", 0) for m in data.get("models", [])}
+        for model in list(self.loaded):
+            if model not in resident and self.in_use.get(model, 0) == 0:
+                del self.loaded[model]
+        for model, size in resident.items():
+            self.sizes[model] = size
+            if model not in self.loaded:
+                self.loaded[model] = size
+        self.synced_at = time.monotonic()
+
+    async def _sync(self):
+        """refresh() when the table was never synced or is older than sync_interval. Called with the lock held"""
+        if self.synced_at is None or time.monotonic() - self.synced_at >= self.sync_interval:
+            await self.refresh()
+
+    async def estimate_size(self, model: str):
+        """Memory needed by a model. Uses the last loaded size, or the on-disk size from /api/tags"""
+        model = normalize_name(model)
+        if model not in self.sizes:
+            data = await self.client.get("/api/tags")
+            for entry in data.get("models", []):
+                self.sizes.setdefault(normalize_name(entry["name"]), entry.get("size", 0))
+        return self.sizes.get(model, 0)
+
+    async def ensure(self, model: str):
+        """Make room for a model before it is used and mark it as most recently used"""
+        model = normalize_name(model)
+        async with self.lock:
+            await self._sync()
+            if model in self.loaded:
+                self.loaded.move_to_end(model)
+                return
+
+            needed = await self.estimate_size(model)
+            for candidate in list(self.loaded):
+                if self.used_memory() + needed <= self.ram_budget:
+                    break
+                if self.in_use.get(candidate, 0) == 0:
+                    await self.unload(candidate)
+                    self.evictions += 1
+            self.loaded[model] = needed
+
+    async def load(self, model: str):
+        """Load a model into memory without generating anything. Returns the load time in seconds"""
+        model = normalize_name(model)
+        await self._pin(model)
+        start = time.perf_counter()
+        try:
+            await self.client.post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+        finally:
+            self._after_call(model)
+        self.load_times[model] = time.perf_counter() - start
+        return self.load_times[model]
+
+    def prefetch(self, models: list[str], stage: str):
+        """Start loading the models of an upcoming stage in the background.
+        Only models that fit into the RAM budget without evicting anything are loaded.
+        A model whose prefetch is still loading is not prefetched again"""
+        for model in dict.fromkeys(normalize_name(m) for m in models):
+            previous = self.prefetches.get(model)
+            if previous is not None and not previous["task"].done():
+                continue
+            self._retire(model)
+            self.prefetches[model] = {
+                "stage": stage,
+                "load_start": None,
+                "loaded_at": None,
+                "first_use": None,
+                "skipped": False,
+                "failed": False,
+                "task": asyncio.create_task(self._prefetch(model))
+            }
+
+    async def _prefetch(self, model: str):
+        entry = self.prefetches[model]
+        async with self.lock:
+            try:
+                await self._sync()
+                needed = await self.estimate_size(model)
+            except Exception as e:
+                entry["failed"] = True
+                print(f"[PREFETCH] sizing {model} failed: {type(e).__name__}: {e}")
+                return
+            if model in self.loaded or self.used_memory() + needed > self.ram_budget:
+                entry["skipped"] = True
+                return
+            # reserve the memory right away so concurrent prefetches see it
+            self.loaded[model] = needed
+            self.in_use[model] = self.in_use.get(model, 0) + 1
+
+        entry["load_start"] = time.perf_counter()
+        try:
+            await self.client.post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+        except Exception as e:
+            # the model is loaded on its first real use instead, without the memory reserved for it here
+            entry["failed"] = True
+            self.loaded.pop(model, None)
+            print(f"[PREFETCH] loading {model} failed: {type(e).__name__}: {e}")
+            return
+        finally:
+            self._after_call(model)
+        entry["loaded_at"] = time.perf_counter()
+        self.load_times[model] = entry["loaded_at"] - entry["load_start"]
+
+    async def _wait_for_prefetch(self, model: str):
+        """Called on the first real use of a prefetched model. Waits for its load to finish,
+        records how much of the load time was hidden behind earlier stages and retires the prefetch"""
+        entry = self.prefetches.get(model)
+        if entry is None or entry["first_use"] is not None:
+            return
+        entry["first_use"] = time.perf_counter()
+        await asyncio.shield(entry["task"])
+        if self.prefetches.get(model) is entry:
+            self._retire(model)
+
+    def _retire(self, model: str):
+        """Move a finished prefetch of a model into prefetch_totals"""
+        entry = self.prefetches.get(model)
+        if entry is None or not entry["task"].done():
+            return
+        del self.prefetches[model]
+        self._add_prefetch(self.prefetch_totals, entry)
+
+    @staticmethod
+    def _add_prefetch(stages: dict, entry: dict):
+        stage = stages.setdefault(entry["stage"], {"models": 0, "skipped": 0, "failed": 0, "load_time": 0.0,
+                                                   "hidden": 0.0})
+        if entry["failed"]:
+            stage["failed"] += 1
+        elif entry["skipped"] or entry["loaded_at"] is None:
+            stage["skipped"] += 1
+        else:
+            stage["models"] += 1
+            stage["load_time"] += entry["loaded_at"] - entry["load_start"]
+            used_at = entry["first_use"] if entry["first_use"] is not None else entry["loaded_at"]
+            stage["hidden"] += min(entry["loaded_at"], used_at) - entry["load_start"]
+
+    def prefetch_stats(self):
+        """Per stage over every question so far: models prefetched, skipped (already resident or no room) and
+        failed, their total load time and how much of it was hidden"""
+        stages = {name: dict(stage) for name, stage in self.prefetch_totals.items()}
+        for entry in self.prefetches.values():
+            if entry["task"].done():
+                self._add_prefetch(stages, entry)
+        return stages
+
+    async def unload(self, model: str):
+        await stop_model(self.client, model)
+        self.loaded.pop(normalize_name(model), None)
+
+    async def unload_all(self):
+        async with self.lock:
+            for model in list(self.loaded):
+                await self.unload(model)
+
+    def stats(self):
+        """Resident models in LRU order with their sizes, and the number of evictions so far"""
+        return {
+            "resident": dict(self.loaded),
+            "used_memory": self.used_memory(),
+            "ram_budget": self.ram_budget,
+            "evictions": self.evictions
+        }
+
+    async def _pin(self, model: str):
+        await self.ensure(model)
+        model = normalize_name(model)
+        self.in_use[model] = self.in_use.get(model, 0) + 1
+
+    async def _before_call(self, package: dict):
+        await self._wait_for_prefetch(normalize_name(package["model"]))
+        await self._pin(package["model"])
+        return dict(package, keep_alive=self.keep_alive)
+
+    def _after_call(self, model: str):
+        model = normalize_name(model)
+        self.in_use[model] -= 1
+        if model in self.loaded:
+            self.loaded.move_to_end(model)
+
+    async def chat(self, package: dict, stage: str = None):
+        package = await self._before_call(package)
+        try:
+            return await self.client.chat(package, stage=stage)
+        finally:
+            self._after_call(package["model"])
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        package = await self._before_call(package)
+        try:
+            async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            self._after_call(package["model"])
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import aclosing
+
+from Pure.tracing import current_span
+
+DEFAULT_MODEL_SLOTS = 1
+DEFAULT_MAX_ACTIVE_MODELS = 3
+
+
+class ModelScheduler():
+    """Queues chat requests per model so Ollama only gets as many as each model can serve in parallel.
+    Wraps an OllamaClient (or anything with the same chat/chat_stream methods)"""
+    def __init__(self, client, slots: dict = None, default_slots: int = DEFAULT_MODEL_SLOTS,
+                 max_active_models: int = DEFAULT_MAX_ACTIVE_MODELS):
+        self.client = client
+        self.slots = slots or {}
+        self.default_slots = default_slots
+        self.max_active_models = max_active_models
+        self.queues = {}
+        self.running = {}
+        self.waits = {}
+        self.last_model = None
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def slots_for(self, model: str):
+        return self.slots.get(model, self.default_slots)
+
+    async def acquire(self, model: str):
+        """Wait until the model has a free slot. Returns the time spent queued"""
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(model, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(model)
+            elif waiter in self.queues[model]:
+                self.queues[model].remove(waiter)
+            raise
+
+        wait = time.perf_counter() - start
+        stats = self.waits.setdefault(model, {"requests": 0, "total_wait": 0.0, "max_wait": 0.0})
+        stats["requests"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        return wait
+
+    def release(self, model: str):
+        self.running[model] -= 1
+        if self.running[model] == 0:
+            del self.running[model]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to queued requests. Models that are already running are served first,
+        a new model is only started when there is room for it, longest queue first"""
+        for model in list(self.running):
+            self._grant(model)
+
+        while len(self.running) < self.max_active_models:
+            pending = [m for m, q in self.queues.items() if q and m not in self.running]
+            if not pending:
+                break
+            # staying on the last served model avoids a swap, otherwise batch up the busiest queue
+            model = self.last_model if self.last_model in pending else max(pending, key=lambda m: len(self.queues[m]))
+            self._grant(model)
+
+    def _grant(self, model: str):
+        queue = self.queues.get(model)
+        while queue and self.running.get(model, 0) < self.slots_for(model):
+            waiter = queue.popleft()
+            if waiter.done():
+                continue
+            self.running[model] = self.running.get(model, 0) + 1
+            self.last_model = model
+            waiter.set_result(None)
+
+    def queue_depth(self, model: str = None):
+        """Number of requests waiting for a slot, for one model or in total"""
+        if model is not None:
+            return len(self.queues.get(model, ()))
+        return sum(len(q) for q in self.queues.values())
+
+    def stats(self):
+        """Queue depth, in-flight requests and wait times per model"""
+        return {
+            model: {
+                "queued": self.queue_depth(model),
+                "running": self.running.get(model, 0),
+                "requests": wait["requests"],
+                "avg_wait": wait["total_wait"] / wait["requests"] if wait["requests"] else 0.0,
+                "max_wait": wait["max_wait"]
+            }
+            for model, wait in self.waits.items()
+        }
+
+    async def chat(self, package: dict, stage: str = None):
+        model = package["model"]
+        current_span().add("queue_wait", await self.acquire(model))
+        try:
+            return await self.client.chat(package, stage=stage)
+        finally:
+            self.release(model)
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        model = package["model"]
+        current_span().add("queue_wait", await self.acquire(model))
+        try:
+            async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            self.release(model)
@@ -0,0 +1,112 @@
+import json
+
+import aiohttp
+
+from Pure.question_stats import count_model_call, count_tokens
+from Pure.tracing import record_response
+
+OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_CHAT_URL = f"{OLLAMA_HOST}/api/chat"
+# no total limit on a request: how long a call may take is up to its caller (Agent timeout, question deadline).
+# A socket that sends nothing for OLLAMA_READ_TIMEOUT seconds is dropped; a non-streaming chat sends nothing
+# until it is done, so this stays above any call timeout
+OLLAMA_READ_TIMEOUT = 600
+OLLAMA_CONNECT_TIMEOUT = 10
+OLLAMA_MAX_CONNECTIONS = 32
+OLLAMA_MAX_CONNECTIONS_PER_HOST = 16
+OLLAMA_KEEPALIVE_TIMEOUT = 60
+
+
+class StreamError(RuntimeError):
+    """A streamed response broke off: Ollama reported an error mid-stream or sent a line that is not JSON"""
+
+
+class OllamaClient():
+    """Shared HTTP client for Ollama. Keeps one pooled session alive for all agents"""
+    def __init__(self, host: str = OLLAMA_HOST, read_timeout: float = OLLAMA_READ_TIMEOUT,
+                 connect_timeout: float = OLLAMA_CONNECT_TIMEOUT, max_connections: int = OLLAMA_MAX_CONNECTIONS,
+                 max_connections_per_host: int = OLLAMA_MAX_CONNECTIONS_PER_HOST,
+                 keepalive_timeout: float = OLLAMA_KEEPALIVE_TIMEOUT):
+        self.host = host.rstrip("/")
+        self.read_timeout = read_timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Create the pooled session. Safe to call more than once"""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        )
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def post(self, path: str, payload: dict, timeout: float = None):
+        """POST a JSON payload to the Ollama API and return the decoded response.
+        timeout overrides the session timeout for slow calls such as pulls"""
+        await self.open()
+        options = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+        async with self.session.post(f"{self.host}{path}", json=payload, **options) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get(self, path: str):
+        """GET an Ollama API endpoint and return the decoded response"""
+        await self.open()
+        async with self.session.get(f"{self.host}{path}") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def chat(self, package: dict, stage: str = None):
+        """Send a non-streaming /api/chat request and return the full response.
+        stage names the pipeline stage of the call; wrappers such as caches use it, here it is only counted"""
+        count_model_call(stage)
+        data = await self.post("/api/chat", package)
+        record_response(data)
+        count_tokens(data)
+        return data
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        """Send a streaming /api/chat request and yield the NDJSON chunks as they arrive.
+        Closing the generator early drops the connection, which makes Ollama stop generating"""
+        await self.open()
+        count_model_call(stage)
+        package = dict(package, stream=True)
+        async with self.session.post(f"{self.host}/api/chat", json=package) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise StreamError(f"Ollama stream sent invalid JSON: {line[:120]!r}") from e
+                if "error" in chunk:
+                    raise StreamError(f"Ollama stream failed: {chunk['error']}")
+                if chunk.get("done"):
+                    record_response(chunk)
+                    count_tokens(chunk)
+                yield chunk
+                if chunk.get("done"):
+                    return
@@ -0,0 +1,233 @@
+import asyncio
+import contextvars
+import time
+from contextlib import aclosing, contextmanager
+
+import aiohttp
+
+from Pure.deadline import DeadlineExceeded
+from Pure.model_admin import normalize_name
+from Pure.tracing import annotate
+
+DEFAULT_POLL_INTERVAL = 10
+DEFAULT_HEALTH_TIMEOUT = 5
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_EJECT_TIME = 30
+# how many in-flight calls on a host with the model in memory are worth as much as loading it on another host
+DEFAULT_COLD_PENALTY = 2
+
+# hosts of a hedged call: the primary copy adds the host it is sent to, the backup copy avoids them
+_hedge = contextvars.ContextVar("hedge", default=None)
+
+
+@contextmanager
+def hedge_copy(hosts: set, backup: bool):
+    """Run the block as one copy of a hedged call. The backup copy goes to another host than the primary"""
+    token = _hedge.set((hosts, backup))
+    try:
+        yield
+    finally:
+        _hedge.reset(token)
+
+
+class Endpoint():
+    """One Ollama host of the pool: its client stack (OllamaClient -> ModelResidency -> ModelScheduler),
+    the models it serves (None: any) and its health"""
+    def __init__(self, host: str, ollama, residency, scheduler, models: list[str] = None):
+        self.host = host
+        self.ollama = ollama
+        self.residency = residency
+        self.scheduler = scheduler
+        self.models = None if models is None else {normalize_name(m) for m in models}
+        self.resident = set()
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = None
+        self.ejections = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def serves(self, model: str):
+        return self.models is None or normalize_name(model) in self.models
+
+    def has_resident(self, model: str):
+        model = normalize_name(model)
+        return model in self.resident or model in {normalize_name(m) for m in self.residency.loaded}
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "resident": sorted(self.resident)
+        }
+
+
+def host_failure(error: BaseException):
+    """Errors that say something about the host rather than about the request or the caller's deadline"""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class OllamaPool():
+    """Spreads chat calls over several Ollama hosts. Each call goes to the least loaded healthy host serving
+    its model, where a host without the model in memory counts cold_penalty calls more. Hosts are polled
+    (/api/ps) every poll_interval seconds; a host whose poll fails or whose calls fail max_failures times
+    in a row is ejected for eject_time seconds and re-admitted by the first successful poll after that.
+    Has the same chat/chat_stream/get/post methods as an OllamaClient"""
+    def __init__(self, endpoints: list[Endpoint], poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 health_timeout: float = DEFAULT_HEALTH_TIMEOUT, max_failures: int = DEFAULT_MAX_FAILURES,
+                 eject_time: float = DEFAULT_EJECT_TIME, cold_penalty: int = DEFAULT_COLD_PENALTY):
+        self.endpoints = endpoints
+        self.poll_interval = poll_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.cold_penalty = cold_penalty
+        self.poller = None
+
+    async def open(self):
+        for endpoint in self.endpoints:
+            await endpoint.ollama.open()
+        await self.poll()
+        if self.poller is None and self.poll_interval:
+            self.poller = asyncio.create_task(self._poll_loop())
+
+    async def close(self):
+        if self.poller is not None:
+            self.poller.cancel()
+            await asyncio.gather(self.poller, return_exceptions=True)
+            self.poller = None
+        # prefetches still loading would otherwise outlive the sessions they use
+        loading = [entry["task"] for e in self.endpoints for entry in e.residency.prefetches.values()
+                   if not entry["task"].done()]
+        for task in loading:
+            task.cancel()
+        await asyncio.gather(*loading, return_exceptions=True)
+        for endpoint in self.endpoints:
+            await endpoint.ollama.close()
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.poll()
+
+    async def poll(self):
+        """Check every host that is not serving out an ejection and refresh its resident models"""
+        now = time.monotonic()
+        due = [e for e in self.endpoints if e.ejected_until is None or e.ejected_until <= now]
+        await asyncio.gather(*(self._check(e) for e in due))
+
+    async def _check(self, endpoint: Endpoint):
+        try:
+            data = await asyncio.wait_for(endpoint.ollama.get("/api/ps"), self.health_timeout)
+        except Exception:
+            self.eject(endpoint)
+            return
+        endpoint.resident = {normalize_name(m["name"]) for m in data.get("models", [])}
+        if not endpoint.healthy:
+            print(f"[POOL] re-admitting {endpoint.host}")
+        endpoint.healthy = True
+        endpoint.failures = 0
+        endpoint.ejected_until = None
+
+    def eject(self, endpoint: Endpoint):
+        if endpoint.healthy:
+            endpoint.ejections += 1
+            print(f"[POOL] ejecting {endpoint.host}")
+        endpoint.healthy = False
+        endpoint.ejected_until = time.monotonic() + self.eject_time
+
+    def route(self, model: str):
+        """The endpoint the next call of `model` goes to. When every host serving the model is ejected,
+        the one ejected first is tried anyway"""
+        serving = [e for e in self.endpoints if e.serves(model)]
+        if not serving:
+            raise KeyError(f"No Ollama endpoint serves model '{model}'")
+        healthy = [e for e in serving if e.healthy]
+        hedge = _hedge.get()
+        if hedge is not None and hedge[1]:
+            healthy = [e for e in healthy if e.host not in hedge[0]] or healthy
+        if not healthy:
+            return min(serving, key=lambda e: e.ejected_until or 0)
+        # among equally loaded hosts the one with the most free memory wins
+        return min(healthy, key=lambda e: (e.in_flight + (0 if e.has_resident(model) else self.cold_penalty),
+                                           e.residency.used_memory()))
+
+    def serving(self, model: str):
+        """Healthy hosts serving a model"""
+        return [e for e in self.endpoints if e.serves(model) and e.healthy]
+
+    def _routed(self, model: str):
+        endpoint = self.route(model)
+        annotate(endpoint=endpoint.host)
+        hedge = _hedge.get()
+        if hedge is not None and not hedge[1]:
+            hedge[0].add(endpoint.host)
+        return endpoint
+
+    def _succeeded(self, endpoint: Endpoint):
+        endpoint.failures = 0
+
+    def _failed(self, endpoint: Endpoint, error: BaseException):
+        if not host_failure(error):
+            return
+        endpoint.errors += 1
+        endpoint.failures += 1
+        if endpoint.failures >= self.max_failures:
+            self.eject(endpoint)
+
+    async def chat(self, package: dict, stage: str = None):
+        endpoint = self._routed(package["model"])
+        endpoint.in_flight += 1
+        endpoint.requests += 1
+        try:
+            data = await endpoint.scheduler.chat(package, stage=stage)
+        except Exception as e:
+            self._failed(endpoint, e)
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        self._succeeded(endpoint)
+        return data
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        endpoint = self._routed(package["model"])
+        endpoint.in_flight += 1
+        endpoint.requests += 1
+        try:
+            async with aclosing(endpoint.scheduler.chat_stream(package, stage=stage)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        except Exception as e:
+            self._failed(endpoint, e)
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        self._succeeded(endpoint)
+
+    async def get(self, path: str):
+        endpoint = next((e for e in self.endpoints if e.healthy), self.endpoints[0])
+        return await endpoint.ollama.get(path)
+
+    async def post(self, path: str, payload: dict, timeout: float = None):
+        """Admin and embedding calls go to a host serving the payload's model, bypassing its queue"""
+        endpoint = self.route(payload["model"]) if "model" in payload else self.endpoints[0]
+        return await endpoint.ollama.post(path, payload, timeout=timeout)
+
+    def prefetch(self, models: list[str], stage: str):
+        """Load each model on the endpoint its next call will be routed to"""
+        for model in dict.fromkeys(models):
+            self.route(model).residency.prefetch([model], stage=stage)
+
+    async def unload_all(self):
+        await asyncio.gather(*(e.residency.unload_all() for e in self.endpoints))
+
+    def stats(self):
+        return {endpoint.host: endpoint.stats() for endpoint in self.endpoints}
@@ -0,0 +1,136 @@
+import json
+import os
+import random
+import struct
+import zlib
+from array import array
+
+from Pure.EnsembleStats import question_category
+
+INDEX_MAGIC = b"QIDX1"
+# magic, size and mtime (ns) of the indexed file, number of offsets
+INDEX_HEADER = struct.Struct("<5sQQQ")
+
+
+def normalize_entry(entry: dict, position: int):
+    """A dataset record with every field the benchmark reads. The id defaults to the record's position,
+    the category to the keyword category of the question"""
+    if isinstance(entry, str):
+        entry = {"question": entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get("question"), str):
+        raise ValueError(f"Record {position} has no 'question'")
+    normalized = dict(entry)
+    normalized["id"] = str(entry.get("id", position))
+    normalized.setdefault("correct_answer", None)
+    normalized.setdefault("acceptable_answers", None)
+    normalized["category"] = entry.get("category") or question_category(entry["question"])
+    normalized.setdefault("difficulty", None)
+    return normalized
+
+
+def shard_of(question_id: str, shards: int):
+    """Shard a record belongs to. Depends only on its id, so records keep their shard when the file grows"""
+    return zlib.crc32(question_id.encode("utf-8")) % shards
+
+
+class QuestionDataset():
+    """Question set in JSONL (one record per line: question, correct_answer/acceptable_answers, category,
+    difficulty, id) read lazily. A byte offset index (8 bytes per record, saved next to the file and rebuilt when
+    the file changes) gives random access and sampling without parsing the file. A JSON list is also accepted,
+    but it is loaded whole"""
+    def __init__(self, path: str, index_path: str = None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self.jsonl = not path.endswith(".json")
+        self._offsets = None
+        self._entries = None
+
+    def __iter__(self):
+        """Records in file order"""
+        if not self.jsonl:
+            yield from self._loaded()
+            return
+        with open(self.path, "rb") as file:
+            position = 0
+            for line in file:
+                if line.strip():
+                    yield normalize_entry(json.loads(line), position)
+                    position += 1
+
+    def __len__(self):
+        return len(self._loaded()) if not self.jsonl else len(self.offsets())
+
+    def __getitem__(self, position: int):
+        if not self.jsonl:
+            return self._loaded()[position]
+        offsets = self.offsets()
+        if position < 0:
+            position += len(offsets)
+        if not 0 <= position < len(offsets):
+            raise IndexError(position)
+        with open(self.path, "rb") as file:
+            file.seek(offsets[position])
+            return normalize_entry(json.loads(file.readline()), position)
+
+    def _loaded(self):
+        if self._entries is None:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self._entries = [normalize_entry(entry, i) for i, entry in enumerate(json.load(file))]
+        return self._entries
+
+    def offsets(self):
+        """Byte offset of every record, from the saved index when it matches the file"""
+        if self._offsets is None:
+            self._offsets = self._read_index()
+            if self._offsets is None:
+                self._offsets = self._build_index()
+                self._write_index(self._offsets)
+        return self._offsets
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _build_index(self):
+        offsets = array("Q")
+        with open(self.path, "rb") as file:
+            offset = 0
+            for line in file:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        return offsets
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "rb") as file:
+                magic, size, mtime, count = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC or (size, mtime) != self._signature():
+                    return None
+                offsets = array("Q")
+                offsets.fromfile(file, count)
+                return offsets
+        except (OSError, EOFError, struct.error):
+            return None
+
+    def _write_index(self, offsets: array):
+        # an index that cannot be saved (e.g. a read-only directory) is only rebuilt next time
+        try:
+            with open(self.index_path, "wb") as file:
+                file.write(INDEX_HEADER.pack(INDEX_MAGIC, *self._signature(), len(offsets)))
+                offsets.tofile(file)
+        except OSError:
+            pass
+
+    def sample(self, count: int, seed: int = 0):
+        """`count` records drawn without replacement, the same ones for the same seed"""
+        positions = random.Random(seed).sample(range(len(self)), min(count, len(self)))
+        return [self[position] for position in positions]
+
+    def shard(self, index: int, shards: int):
+        """Records of shard `index` out of `shards`, in file order. Every record is in exactly one shard"""
+        if not 0 <= index < shards:
+            raise ValueError(f"Shard {index} does not exist out of {shards}")
+        for entry in self:
+            if shard_of(entry["id"], shards) == index:
+                yield entry
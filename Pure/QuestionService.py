@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+import Pure.main as hive_main
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_MAX_RESULTS = 1000
+RETRY_AFTER = 5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class QuestionService():
+    """Long-running HTTP front of the pipeline. Questions are queued and answered by `concurrency` workers
+    sharing one Hive, so loaded models, caches and schedulers serve every question. When `max_queue` questions
+    are waiting, new ones are rejected with 429 instead of piling up.
+
+    POST /questions        {"question": "...", "wait": true} -> the answer (wait) or 202 with the job id
+    GET  /questions/{id}   status of a job and, once finished, its answer and per-stage timings
+    GET  /health, /stats   liveness; queue, workers and the Hive's endpoint pool
+    GET  /metrics          the Hive's spans as Prometheus metrics"""
+    def __init__(self, hive, concurrency: int = DEFAULT_CONCURRENCY, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_results: int = DEFAULT_MAX_RESULTS):
+        self.hive = hive
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.max_results = max_results
+        self.jobs = OrderedDict()
+        self.ids = itertools.count(1)
+        self.workers = []
+        self.busy = 0
+        self.counters = {"submitted": 0, "rejected": 0, "answered": 0, "failed": 0}
+        self.runner = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/questions", self.handle_submit)
+        app.router.add_get("/questions/{id}", self.handle_job)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_get("/metrics", self.handle_metrics)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        self.workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, question: str):
+        """Queue a question and return its job. Raises QueueFull when the queue is at its limit"""
+        job = {
+            "id": str(next(self.ids)),
+            "question": question,
+            "status": "queued",
+            "submitted": time.time(),
+            "done": asyncio.get_running_loop().create_future()
+        }
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise QueueFull()
+        self.counters["submitted"] += 1
+        self.jobs[job["id"]] = job
+        # finished jobs are forgotten oldest first
+        while len(self.jobs) > self.max_results:
+            oldest = next(iter(self.jobs))
+            if self.jobs[oldest]["status"] in ("queued", "running"):
+                break
+            del self.jobs[oldest]
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            self.busy += 1
+            job["status"] = "running"
+            job["queue_wait"] = time.time() - job["submitted"]
+            try:
+                answer, stats = await hive_main.solve_question(self.hive, job["question"])
+                job.update(status="answered", answer=answer, stats=stats.to_dict())
+                self.counters["answered"] += 1
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+                self.counters["failed"] += 1
+            finally:
+                job["latency"] = time.time() - job["submitted"]
+                if not job["done"].done():
+                    job["done"].set_result(None)
+                self.busy -= 1
+                self.queue.task_done()
+
+    @staticmethod
+    def describe(job: dict):
+        return {key: value for key, value in job.items() if key != "done"}
+
+    async def handle_submit(self, request: web.Request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({"error": "body must be JSON"}, status=400)
+        question = body.get("question") if isinstance(body, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            return web.json_response({"error": "'question' must be a non-empty string"}, status=400)
+        try:
+            job = self.submit(question.strip())
+        except QueueFull:
+            return web.json_response({"error": "queue is full"}, status=429,
+                                     headers={"Retry-After": str(RETRY_AFTER)})
+        if not body.get("wait", True):
+            return web.json_response(self.describe(job), status=202)
+        # a client that disconnects only stops waiting, the question is still answered
+        await asyncio.shield(job["done"])
+        return web.json_response(self.describe(job), status=200 if job["status"] == "answered" else 500)
+
+    async def handle_job(self, request: web.Request):
+        job = self.jobs.get(request.match_info["id"])
+        if job is None:
+            return web.json_response({"error": "unknown job"}, status=404)
+        return web.json_response(self.describe(job))
+
+    async def handle_health(self, request: web.Request):
+        return web.json_response({"status": "ok", "workers": len(self.workers)})
+
+    async def handle_stats(self, request: web.Request):
+        return web.json_response({
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "running": self.busy,
+            "concurrency": self.concurrency,
+            **self.counters,
+            "coalesced_questions": self.hive.questions.stats(),
+            "coalesced_calls": self.hive.coalescing.stats() if self.hive.coalescing is not None else None,
+            "endpoints": self.hive.pool.stats()
+        }, dumps=lambda data: json.dumps(data, default=str))
+
+    async def handle_metrics(self, request: web.Request):
+        if self.hive.metrics is None:
+            return web.json_response({"error": "metrics are disabled"}, status=404)
+        return web.Response(text=self.hive.metrics.render(), content_type="text/plain")
+
+
+async def serve(host: str, port: int, concurrency: int, max_queue: int):
+    async with hive_main.Hive(metrics=True) as hive:
+        service = QuestionService(hive, concurrency=concurrency, max_queue=max_queue)
+        await service.start(host, port)
+        print(f"Hive answering questions on http://{host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.stop()
+            if hive_main.CONSOLE_LOGS:
+                hive.print_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer questions over HTTP with one long-lived Hive")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="questions answered at once")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="waiting questions before new ones are rejected with 429")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's console logs")
+    args = parser.parse_args()
+
+    hive_main.CONSOLE_LOGS = args.verbose
+    try:
+        asyncio.run(serve(args.host, args.port, args.concurrency, args.max_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
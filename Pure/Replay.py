@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import deque
+from contextlib import aclosing
+
+from aiohttp import web
+
+from Pure.ResponseCache import cache_key
+from Pure.model_admin import normalize_name
+from Pure.question_stats import count_model_call, count_tokens
+
+# how long a replayed call whose recording was cancelled waits for its own cancellation after the recorded time
+CANCEL_GRACE = 1.0
+
+
+class TraceDiverged(Exception):
+    pass
+
+
+def message_key(model: str, messages: list[dict]):
+    """Looser match than cache_key: only the model and the role/content of each message"""
+    material = [normalize_name(model), [[m.get("role"), m.get("content")] for m in messages]]
+    return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+
+class TraceWriter():
+    """Append-only JSONL trace, one compact line per model call"""
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, entry: dict):
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def trace_entry(package: dict, stage: str, response: dict, latency: float, chunks: list = None,
+                cancelled: bool = False):
+    entry = {
+        "ts": time.time(),
+        "key": cache_key(package),
+        "message_key": message_key(package["model"], package["messages"]),
+        "model": normalize_name(package["model"]),
+        "stage": stage,
+        "request": package,
+        "response": response,
+        "latency": latency
+    }
+    if chunks is not None:
+        entry["chunks"] = chunks
+    if cancelled:
+        entry["cancelled"] = True
+    return entry
+
+
+class RecordingClient():
+    """Passes calls through to an OllamaClient and writes every request, response and timing to a trace.
+    Clients of several hosts can share one TraceWriter"""
+    def __init__(self, client, path: str = None, writer: TraceWriter = None):
+        self.client = client
+        self.writer = writer if writer is not None else TraceWriter(path)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def close(self):
+        self.writer.close()
+        await self.client.close()
+
+    async def chat(self, package: dict, stage: str = None):
+        start = time.perf_counter()
+        try:
+            response = await self.client.chat(package, stage=stage)
+        except asyncio.CancelledError:
+            # calls cut off by a quorum are replayed as cancelled at the same time
+            self.writer.write(trace_entry(package, stage, None, time.perf_counter() - start, cancelled=True))
+            raise
+        self.writer.write(trace_entry(package, stage, response, time.perf_counter() - start))
+        return response
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        start = time.perf_counter()
+        chunks = []
+        parts = []
+        final = None
+        failed = False
+        cancelled = False
+        async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+            try:
+                async for chunk in stream:
+                    text = chunk.get("message", {}).get("content", "")
+                    chunks.append([round(time.perf_counter() - start, 6), text])
+                    parts.append(text)
+                    if chunk.get("done"):
+                        final = chunk
+                    yield chunk
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            except Exception:
+                failed = True
+                raise
+            finally:
+                # streams cut short by the consumer are recorded too, replay then ends at the same point
+                if not failed:
+                    response = dict(final or {"done": False}, message={"role": "assistant", "content": "".join(parts)})
+                    self.writer.write(trace_entry(package, stage, response, time.perf_counter() - start, chunks,
+                                                  cancelled=cancelled))
+
+
+class TraceIndex():
+    """Recorded calls looked up by exact request, then by model + messages, then by model + stage in trace order.
+    Each lookup consumes the next matching entry; once used up, the last one keeps being served"""
+    def __init__(self, path: str):
+        self.by_key = {}
+        self.by_messages = {}
+        self.by_stage = {}
+        self.models = set()
+        self.matches = {"exact": 0, "messages": 0, "stage": 0, "missing": 0}
+        self.used = set()
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    self.add(json.loads(line))
+
+    def add(self, entry: dict):
+        self.models.add(entry["model"])
+        self.by_key.setdefault(entry["key"], deque()).append(entry)
+        self.by_messages.setdefault(entry["message_key"], deque()).append(entry)
+        self.by_stage.setdefault((entry["model"], entry.get("stage")), deque()).append(entry)
+
+    def _take(self, queue: deque):
+        # the same entry sits in all three tables, skip the ones another lookup already served
+        while len(queue) > 1 and id(queue[0]) in self.used:
+            queue.popleft()
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+        self.used.add(id(entry))
+        return entry
+
+    def take(self, package: dict, stage: str = None):
+        lookups = [
+            ("exact", self.by_key, cache_key(package) if "options" in package else None),
+            ("messages", self.by_messages, message_key(package["model"], package.get("messages", []))),
+            ("stage", self.by_stage, (normalize_name(package["model"]), stage))
+        ]
+        for kind, table, key in lookups:
+            if key in table:
+                self.matches[kind] += 1
+                return self._take(table[key])
+        self.matches["missing"] += 1
+        raise KeyError(f"No recorded response for model '{package['model']}' (stage {stage})")
+
+
+class ReplayClient():
+    """Serves chat calls from a recorded trace instead of Ollama, sleeping for the recorded latency
+    multiplied by latency_scale (0 replays as fast as possible)"""
+    def __init__(self, path: str, latency_scale: float = 1.0, cancel_grace: float = CANCEL_GRACE):
+        self.index = TraceIndex(path)
+        self.latency_scale = latency_scale
+        self.cancel_grace = cancel_grace
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get(self, path: str):
+        if path == "/api/tags":
+            return {"models": [{"name": model, "model": model, "size": 0} for model in sorted(self.index.models)]}
+        if path == "/api/ps":
+            return {"models": []}
+        raise KeyError(f"{path} is not available in replay mode")
+
+    async def post(self, path: str, payload: dict, timeout: float = None):
+        if path == "/api/chat":
+            return await self.chat(payload)
+        if path in ("/api/generate", "/api/pull"):
+            return {"model": payload.get("model"), "done": True}
+        raise KeyError(f"{path} is not available in replay mode")
+
+    async def chat(self, package: dict, stage: str = None):
+        count_model_call(stage)
+        entry = self.index.take(package, stage)
+        await asyncio.sleep(entry["latency"] * self.latency_scale)
+        if entry.get("cancelled"):
+            await self._cancelled(entry)
+        count_tokens(entry["response"])
+        return entry["response"]
+
+    async def _cancelled(self, entry: dict):
+        """The recorded call was cancelled (by a quorum) at this point, so the replayed one should be cancelled now
+        too. If nothing cancels it within cancel_grace, the run no longer follows the trace"""
+        await asyncio.sleep(self.cancel_grace)
+        raise TraceDiverged(f"Trace diverged: the recorded call to '{entry['model']}' (stage {entry.get('stage')}) "
+                            f"was cancelled after {entry['latency']:.2f}s, the replayed one was not")
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        count_model_call(stage)
+        entry = self.index.take(package, stage)
+        chunks = entry.get("chunks") or [[entry["latency"], entry["response"]["message"]["content"]]]
+        elapsed = 0.0
+        for offset, text in chunks:
+            await asyncio.sleep(max(0.0, offset - elapsed) * self.latency_scale)
+            elapsed = offset
+            yield {"model": entry["model"], "message": {"role": "assistant", "content": text}, "done": False}
+        if entry.get("cancelled"):
+            await asyncio.sleep(max(0.0, entry["latency"] - elapsed) * self.latency_scale)
+            await self._cancelled(entry)
+        final_message = dict(entry["response"].get("message", {}), content="")
+        count_tokens(entry["response"])
+        yield dict(entry["response"], message=final_message, done=True)
+
+    def stats(self):
+        return dict(self.index.matches)
+
+
+class ReplayServer():
+    """Serves a trace over HTTP so clients we do not control (LangChain's ChatOllama) can be replayed
+    by pointing their base_url at it"""
+    def __init__(self, replay: ReplayClient):
+        self.replay = replay
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_get("/api/tags", self.handle_get)
+        app.router.add_get("/api/ps", self.handle_get)
+        app.router.add_post("/api/generate", self.handle_post)
+        app.router.add_post("/api/pull", self.handle_post)
+        return app
+
+    async def handle_get(self, request: web.Request):
+        return web.json_response(await self.replay.get(request.path))
+
+    async def handle_post(self, request: web.Request):
+        return web.json_response(await self.replay.post(request.path, await request.json()))
+
+    async def handle_chat(self, request: web.Request):
+        package = await request.json()
+        try:
+            if not package.get("stream", True):
+                return web.json_response(await self.replay.chat(package))
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            async with aclosing(self.replay.chat_stream(package)) as stream:
+                async for chunk in stream:
+                    await response.write((json.dumps(chunk) + "\n").encode("utf-8"))
+            await response.write_eof()
+            return response
+        except KeyError as e:
+            return web.json_response({"error": str(e)}, status=404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded model trace as an Ollama-compatible server")
+    parser.add_argument("trace", help="JSONL trace written in record mode")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded latencies (0 = no delay)")
+    args = parser.parse_args()
+
+    server = ReplayServer(ReplayClient(args.trace, latency_scale=args.latency_scale))
+    print(f"Replaying {args.trace} on http://{args.host}:{args.port}")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
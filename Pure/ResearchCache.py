@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter, OrderedDict
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_ENTRIES = 256
+
+# standalone numbers only: exponents (x^2, x**3) and digits inside names (log2, x1) change the kind of problem
+NUMBER_PATTERN = re.compile(r"(?<![a-z_\d.^])(?<!\*\*)\d+(?:[.,]\d+)*")
+WORD_PATTERN = re.compile(r"[a-z_<>]+|[^\sa-z0-9]")
+TERM_PATTERN = re.compile(r"[a-z_]\w*|\d+(?:[.,]\d+)*")
+
+
+def normalize_question(question: str):
+    """Lowercase the question, mask standalone numbers and collapse whitespace,
+    so questions that differ only in numbers or spacing look the same"""
+    question = NUMBER_PATTERN.sub("<num>", question.lower())
+    return " ".join(question.split())
+
+
+def lexical_vector(text: str):
+    """Sparse bag of words plus character trigrams"""
+    words = WORD_PATTERN.findall(text)
+    vector = Counter(words)
+    padded = f" {text} "
+    vector.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return vector
+
+
+def terms(text: str):
+    """Words, names and exponents of a normalized question; the masked numbers are left out"""
+    return frozenset(TERM_PATTERN.findall(text.replace("<num>", " ")))
+
+
+def sparse_cosine(a: Counter, b: Counter):
+    dot = sum(value * b.get(key, 0) for key, value in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def dense_cosine(a: list[float], b: list[float]):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResearchCache():
+    """Reuses researcher output for questions similar to ones already researched.
+    Similarity uses Ollama embeddings when embed_model is set, otherwise (or if embedding fails) a lexical fallback.
+    The lexical fallback only matches questions with the same words, since one word ("at least" instead of
+    "exactly", "minimum" instead of "maximum") makes a different problem that a high similarity hides"""
+    def __init__(self, client, embed_model: str = None, threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_ENTRIES):
+        self.client = client
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.embed_failures = 0
+
+    async def embed(self, text: str):
+        if self.embed_model is None:
+            return None
+        try:
+            data = await self.client.post("/api/embed", {"model": self.embed_model, "input": text})
+            return data["embeddings"][0]
+        except Exception as e:
+            print(f"[RESEARCH CACHE] embedding failed, using lexical similarity: {e}")
+            self.embed_failures += 1
+            self.embed_model = None
+            return None
+
+    def similarity(self, embedding, lexical: Counter, lexical_terms: frozenset, entry_key: str, entry: dict):
+        if embedding is not None and entry["embedding"] is not None:
+            return dense_cosine(embedding, entry["embedding"])
+        if entry["lexical"] is None:
+            entry["lexical"] = lexical_vector(entry_key)
+        if terms(entry_key) != lexical_terms:
+            return 0.0
+        return sparse_cosine(lexical, entry["lexical"])
+
+    async def lookup(self, question: str):
+        """Return cached research for the most similar known question, or None below the threshold"""
+        key = normalize_question(question)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]["research"]
+
+        embedding = await self.embed(key) if self.entries else None
+        lexical = lexical_vector(key)
+        lexical_terms = terms(key)
+        best_key, best_score = None, 0.0
+        for entry_key, entry in self.entries.items():
+            score = self.similarity(embedding, lexical, lexical_terms, entry_key, entry)
+            if score > best_score:
+                best_key, best_score = entry_key, score
+
+        if best_key is not None and best_score >= self.threshold:
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            return self.entries[best_key]["research"]
+        self.misses += 1
+        return None
+
+    async def store(self, question: str, research: str):
+        key = normalize_question(question)
+        self.entries[key] = {"research": research, "embedding": await self.embed(key), "lexical": None}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "embed_failures": self.embed_failures,
+            "mode": "embedding" if self.embed_model else "lexical"
+        }
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+
+from Pure.json_repair import MalformedResponse, extract_json
+from Pure.tracing import annotate
+
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_DISK_ENTRIES = 20000
+# stage -> highest temperature that may be cached (None caches every temperature)
+DEFAULT_STAGE_POLICY = {"research": None, "calculator": 0.1}
+# stage -> keys the JSON in a response must have. A response extract_json rejects is never cached, so a broken
+# or cut-off completion is retried instead of served again on every run
+DEFAULT_REQUIRED_KEYS = {"research": (), "calculator": ("final_answer",)}
+
+
+def cache_key(package: dict):
+    """Content address of a chat request: model, messages (role + content), temperature and max_tokens"""
+    options = package.get("options", {})
+    material = {
+        "model": package["model"],
+        "messages": package["messages"],
+        "temperature": options.get("temperature"),
+        "max_tokens": options.get("num_predict"),
+        "format": package.get("format")
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache():
+    """Caches chat responses in a bounded in-memory LRU and, optionally, a persistent SQLite table.
+    Only stages listed in the policy are cached, and only responses whose JSON is usable. Wraps an OllamaClient"""
+    def __init__(self, client, path: str = None, memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 disk_entries: int = DEFAULT_DISK_ENTRIES, policy: dict = None, required_keys: dict = None):
+        self.client = client
+        self.memory = OrderedDict()
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.policy = DEFAULT_STAGE_POLICY if policy is None else policy
+        self.required_keys = DEFAULT_REQUIRED_KEYS if required_keys is None else required_keys
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "rejected": 0}
+        self.db = None
+        self.db_lock = threading.Lock()
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                stage TEXT,
+                response TEXT,
+                created REAL,
+                last_access REAL
+            )""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self.db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def cacheable(self, package: dict, stage: str):
+        if stage not in self.policy:
+            return False
+        max_temperature = self.policy[stage]
+        temperature = package.get("options", {}).get("temperature", 0)
+        return max_temperature is None or temperature <= max_temperature
+
+    def usable(self, stage: str, response: dict):
+        """Whether the response holds the JSON its stage needs"""
+        if stage not in self.required_keys:
+            return True
+        try:
+            extract_json(response.get("message", {}).get("content", ""), required=self.required_keys[stage])
+        except MalformedResponse:
+            return False
+        return True
+
+    async def lookup(self, key: str, stage: str = None):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return self.memory[key]
+        if self.db is not None:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None:
+                response = json.loads(row)
+                if self.usable(stage, response):
+                    self.counters["disk_hits"] += 1
+                    self._remember(key, response)
+                    return response
+                # written before responses were checked
+                await asyncio.to_thread(self._disk_delete, key)
+        self.counters["misses"] += 1
+        return None
+
+    async def store(self, key: str, package: dict, stage: str, response: dict):
+        if not self.usable(stage, response):
+            self.counters["rejected"] += 1
+            return
+        self._remember(key, response)
+        if self.db is not None:
+            await asyncio.to_thread(self._disk_put, key, package["model"], stage, json.dumps(response))
+
+    def _remember(self, key: str, response: dict):
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _disk_get(self, key: str):
+        with self.db_lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    def _disk_delete(self, key: str):
+        with self.db_lock:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.db.commit()
+
+    def _disk_put(self, key: str, model: str, stage: str, response: str):
+        now = time.time()
+        with self.db_lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                            (key, model, stage, response, now, now))
+            # evict the least recently used rows above the limit
+            self.db.execute("""DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )""", (self.disk_entries,))
+            self.db.commit()
+
+    def cache_stats(self):
+        stats = dict(self.counters)
+        stats["memory_entries"] = len(self.memory)
+        if self.db is not None:
+            with self.db_lock:
+                stats["disk_entries"] = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
+
+    async def chat(self, package: dict, stage: str = None):
+        if not self.cacheable(package, stage):
+            self.counters["bypassed"] += 1
+            return await self.client.chat(package, stage=stage)
+
+        key = cache_key(package)
+        cached = await self.lookup(key, stage)
+        if cached is not None:
+            annotate(cache_hit=True)
+            return cached
+        response = await self.client.chat(package, stage=stage)
+        await self.store(key, package, stage, response)
+        return response
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        if not self.cacheable(package, stage):
+            self.counters["bypassed"] += 1
+            async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
+
+        key = cache_key(package)
+        cached = await self.lookup(key, stage)
+        if cached is not None:
+            annotate(cache_hit=True)
+            yield dict(cached, done=True)
+            return
+
+        parts = []
+        async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+            async for chunk in stream:
+                parts.append(chunk.get("message", {}).get("content", ""))
+                if chunk.get("done"):
+                    # only complete generations are cached, streams stopped early are not
+                    response = dict(chunk, message={"role": "assistant", "content": "".join(parts)})
+                    await self.store(key, package, stage, response)
+                yield chunk
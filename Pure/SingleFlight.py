@@ -0,0 +1,90 @@
+import asyncio
+from contextlib import aclosing
+
+from Pure.ResponseCache import cache_key
+from Pure.question_stats import count_coalesced, current
+from Pure.tracing import annotate
+
+# chat calls above this temperature are samples, merging them would cost the ensemble its diversity
+DEFAULT_MAX_TEMPERATURE = 0.1
+
+
+def question_key(question: str):
+    """Questions that differ only in case, spacing or the closing punctuation are the same question"""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class SingleFlight():
+    """Runs one computation per key at a time. A caller whose key is already in flight waits for that
+    computation instead of starting its own. The computation is only cancelled once every caller waiting
+    for it is cancelled. Calls of the same owner (e.g. one question) are never merged with each other"""
+    def __init__(self):
+        self.in_flight = {}
+        self.counters = {"leaders": 0, "waiters": 0}
+
+    async def run(self, key, factory, owner=None):
+        """Await factory() or join the in-flight computation of `key`. Returns (result, joined)"""
+        entry = self.in_flight.get(key)
+        if entry is not None and (owner is None or owner not in entry["owners"]):
+            self.counters["waiters"] += 1
+            joined = True
+        else:
+            task = asyncio.ensure_future(factory())
+            entry = {"task": task, "callers": 0, "owners": set()}
+            if key not in self.in_flight:
+                self.in_flight[key] = entry
+                task.add_done_callback(lambda _: self._finished(key, entry))
+            self.counters["leaders"] += 1
+            joined = False
+
+        entry["callers"] += 1
+        if owner is not None:
+            entry["owners"].add(owner)
+        try:
+            return await asyncio.shield(entry["task"]), joined
+        except asyncio.CancelledError:
+            if not entry["task"].done():
+                entry["callers"] -= 1
+                if entry["callers"] == 0:
+                    entry["task"].cancel()
+            raise
+
+    def _finished(self, key, entry: dict):
+        if self.in_flight.get(key) is entry:
+            del self.in_flight[key]
+
+    def stats(self):
+        return dict(self.counters, in_flight=len(self.in_flight))
+
+
+class CoalescingClient():
+    """Merges identical concurrent chat calls (model, messages and options) of different questions into one.
+    Only calls at or below max_temperature are merged; streams pass through. Wraps an OllamaClient"""
+    def __init__(self, client, max_temperature: float = DEFAULT_MAX_TEMPERATURE):
+        self.client = client
+        self.max_temperature = max_temperature
+        self.flights = SingleFlight()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def mergeable(self, package: dict):
+        return package.get("options", {}).get("temperature", 0) <= self.max_temperature
+
+    async def chat(self, package: dict, stage: str = None):
+        if not self.mergeable(package):
+            return await self.client.chat(package, stage=stage)
+        response, joined = await self.flights.run(cache_key(package), lambda: self.client.chat(package, stage=stage),
+                                                  owner=current())
+        if joined:
+            count_coalesced(stage)
+            annotate(coalesced=True)
+        return response
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        async with aclosing(self.client.chat_stream(package, stage=stage)) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    def stats(self):
+        return self.flights.stats()
@@ -0,0 +1,94 @@
+import json
+
+
+class JsonFieldWatcher():
+    """Incrementally scans a streamed JSON object and notices when a top-level field is complete"""
+    def __init__(self, field: str = "final_answer"):
+        self.field = field
+        self.buffer = ""
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        self.string_is_key = False
+        self.last_key = None
+        self.expecting_value = False
+        self.value_start = None
+        self.value_end = None
+
+    @property
+    def done(self):
+        return self.value_end is not None
+
+    def feed(self, text: str):
+        """Consume the next piece of output. Returns True once the watched field is complete"""
+        if self.done:
+            return True
+
+        offset = len(self.buffer)
+        self.buffer += text
+        for i in range(offset, len(self.buffer)):
+            end = self._step(i, self.buffer[i])
+            if end is not None:
+                self.value_end = end
+                return True
+        return False
+
+    def _step(self, i: int, char: str):
+        """Advance the scanner by one character. Returns the end index of the watched value once known"""
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    self.last_key = json.loads(self.buffer[self.string_start:i + 1])
+                elif self._watching() and self.depth == 1:
+                    return i + 1
+            return None
+
+        if char == '"':
+            self.in_string = True
+            self.string_start = i
+            self.string_is_key = self.depth == 1 and not self.expecting_value
+            self._start_value(i)
+        elif char in "{[":
+            self._start_value(i)
+            self.depth += 1
+        elif char in "}]":
+            self.depth -= 1
+            if self._watching() and self.depth == 1:
+                return i + 1
+            if self._watching() and self.depth == 0:
+                return i
+        elif char == ":" and self.depth == 1:
+            self.expecting_value = True
+        elif char == "," and self.depth == 1:
+            if self._watching():
+                return i
+        elif not char.isspace():
+            self._start_value(i)
+        return None
+
+    def _start_value(self, i: int):
+        if self.expecting_value and self.depth == 1:
+            self.expecting_value = False
+            if self.last_key == self.field:
+                self.value_start = i
+
+    def _watching(self):
+        return self.value_start is not None
+
+    def result(self):
+        """Return the watched field's parsed value, or None if it is not complete yet"""
+        if not self.done:
+            return None
+        return json.loads(self.buffer[self.value_start:self.value_end])
+
+    def closed_json(self):
+        """Return the consumed output cut right after the watched field and closed into a valid object"""
+        if not self.done:
+            return self.buffer
+        return self.buffer[:self.value_end].rstrip().rstrip(",") + "}"
@@ -0,0 +1,45 @@
+import json
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from Pure.Replay import TraceWriter, trace_entry
+
+ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Records ChatOllama calls of the LangChain/LangGraph scripts in the trace format of Pure/Replay.py.
+    Replay them with `python -m Pure.Replay <trace>` and ChatOllama(base_url=...) pointing at it"""
+    def __init__(self, path: str, stage: str = "langchain"):
+        self.writer = TraceWriter(path)
+        self.stage = stage
+        self.pending = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or (kwargs.get("metadata") or {}).get("ls_model_name")
+        converted = [
+            {"role": ROLES.get(m.type, m.type), "content": m.content if isinstance(m.content, str) else json.dumps(m.content)}
+            for m in messages[0]
+        ]
+        self.pending[run_id] = (time.perf_counter(), model, converted)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id not in self.pending:
+            return
+        start, model, messages = self.pending.pop(run_id)
+        generation = response.generations[0][0]
+        message = {"role": "assistant", "content": generation.text}
+        tool_calls = getattr(getattr(generation, "message", None), "tool_calls", None)
+        if tool_calls:
+            message["tool_calls"] = [{"function": {"name": c["name"], "arguments": c["args"]}} for c in tool_calls]
+        package = {"model": model, "messages": messages}
+        result = {"model": model, "message": message, "done": True}
+        self.writer.write(trace_entry(package, self.stage, result, time.perf_counter() - start))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.pending.pop(run_id, None)
+
+    def close(self):
+        self.writer.close()
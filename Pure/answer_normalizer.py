@@ -0,0 +1,347 @@
+import ast
+import math
+import re
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+NO_SOLUTION = "#no_solution"
+NOT_GOOD = "#not_good"
+FLOAT_DIGITS = 10
+MAX_EXACT_EXPONENT = 4096
+# exact values above this many bits (numerator + denominator) are not computed: the arithmetic starts to take
+# seconds and str() of such numbers hits Python's int digit limit
+MAX_EXACT_BITS = 8192
+SAMPLE_POINTS = (0.37, 1.13, 2.71)
+# larger radicands are not checked for square factors, so they never count as simplified
+MAX_SIMPLIFIED_RADICAND = 10 ** 12
+
+FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "cbrt": lambda x: math.copysign(abs(x) ** (1 / 3), x),
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "exp": math.exp,
+    "log": math.log,
+    "ln": math.log,
+    "abs": abs
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+REPLACEMENTS = [
+    ("√", "sqrt"), ("π", "pi"), ("×", "*"), ("·", "*"), ("÷", "/"), ("−", "-"), ("^", "**"), ("\\pi", "pi"),
+    ("\\sqrt", "sqrt"), ("\\cdot", "*"), ("{", "("), ("}", ")")
+]
+PRECISION_PATTERN = re.compile(r"(\d+)\s*(?:decimal|digits? after)", re.IGNORECASE)
+
+
+class NotComputable(Exception):
+    pass
+
+
+COMPUTE_ERRORS = (NotComputable, ZeroDivisionError, OverflowError, ValueError, TypeError, RecursionError)
+
+
+def exact_bits(value: Fraction):
+    return value.numerator.bit_length() + value.denominator.bit_length()
+
+
+def checked(value):
+    """value, or NotComputable when it is an exact value above MAX_EXACT_BITS"""
+    if isinstance(value, Fraction) and exact_bits(value) > MAX_EXACT_BITS:
+        raise NotComputable("exact value too large")
+    return value
+
+
+def rounded(value, precision: int):
+    """value rounded half-up (ties away from zero) to `precision` decimal places, as text.
+    Fractions are rounded exactly, floats as their shortest decimal form (2.675 -> 2.68)"""
+    quantum = Decimal(1).scaleb(-precision)
+    if isinstance(value, Fraction):
+        quotient, remainder = divmod(abs(value.numerator) * 10 ** precision, value.denominator)
+        if 2 * remainder >= value.denominator:
+            quotient += 1
+        result = Decimal(-quotient if value < 0 else quotient).scaleb(-precision).quantize(quantum)
+    else:
+        if math.isnan(value) or math.isinf(value):
+            raise NotComputable("not finite")
+        result = Decimal(repr(float(value))).quantize(quantum, rounding=ROUND_HALF_UP)
+    # -0.00 and 0.00 are the same answer
+    return f"{result.copy_abs() if result == 0 else result:f}"
+
+
+def stated_precision(question: str):
+    """Number of decimal places the question asks for, if any"""
+    match = PRECISION_PATTERN.search(question or "")
+    return int(match.group(1)) if match else None
+
+
+def _prepare(text: str):
+    text = text.strip().rstrip(".")
+    text = re.sub(r"√\s*(\d+(?:\.\d+)?|[a-zA-Z]\w*)", r"sqrt(\1)", text)
+    for old, new in REPLACEMENTS:
+        text = text.replace(old, new)
+    # drop a leading "x =" and LaTeX-ish fractions like \frac(a)(b)
+    text = re.sub(r"^[a-zA-Z]\w*\s*=\s*", "", text)
+    text = re.sub(r"\\frac\(([^()]*)\)\(([^()]*)\)", r"((\1)/(\2))", text)
+    text = text.replace(",", "") if re.fullmatch(r"-?\d{1,3}(,\d{3})+(\.\d+)?", text) else text
+    # implicit multiplication: 2x, 2(, )(, )x, 3sqrt(2), 2pi
+    text = re.sub(r"(\d)\s*(?![eE][-+]?\d)([a-zA-Z(])", r"\1*\2", text)
+    text = re.sub(r"\)\s*([a-zA-Z0-9(])", r")*\1", text)
+    return text
+
+
+def _evaluate(node, variables: dict):
+    """Evaluate a parsed expression. Rationals stay exact Fractions, everything else becomes float"""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, variables)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return Fraction(str(node.value))
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        if node.id in variables:
+            return variables[node.id]
+        raise NotComputable(node.id)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _evaluate(node.operand, variables)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left = _evaluate(node.left, variables)
+        right = _evaluate(node.right, variables)
+        if isinstance(node.op, ast.Add):
+            return checked(left + right)
+        if isinstance(node.op, ast.Sub):
+            return checked(left - right)
+        if isinstance(node.op, ast.Mult):
+            return checked(left * right)
+        if isinstance(node.op, ast.Div):
+            if right == 0:
+                raise NotComputable("division by zero")
+            return checked(left / right)
+        if isinstance(node.op, ast.Pow):
+            return _power(left, right)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+            and len(node.args) == 1:
+        argument = _evaluate(node.args[0], variables)
+        if node.func.id == "sqrt" and isinstance(argument, Fraction) and argument >= 0:
+            root = _exact_root(argument)
+            if root is not None:
+                return root
+        try:
+            return float(FUNCTIONS[node.func.id](float(argument)))
+        except (ValueError, OverflowError):
+            raise NotComputable(node.func.id)
+    if isinstance(node, ast.Tuple):
+        return tuple(_evaluate(element, variables) for element in node.elts)
+    raise NotComputable(type(node).__name__)
+
+
+def _exact_root(value: Fraction):
+    numerator, denominator = math.isqrt(value.numerator), math.isqrt(value.denominator)
+    if numerator * numerator == value.numerator and denominator * denominator == value.denominator:
+        return Fraction(numerator, denominator)
+    return None
+
+
+def _power(base, exponent):
+    if isinstance(base, Fraction) and isinstance(exponent, Fraction) and exponent.denominator == 1 \
+            and abs(exponent) <= MAX_EXACT_EXPONENT and not (base == 0 and exponent < 0) \
+            and exact_bits(base) * abs(exponent) <= MAX_EXACT_BITS:
+        return base ** int(exponent)
+    try:
+        result = float(base) ** float(exponent)
+    except (OverflowError, ZeroDivisionError):
+        raise NotComputable("power")
+    if isinstance(result, complex):
+        raise NotComputable("complex power")
+    return result
+
+
+def _key(value, precision: int = None):
+    if isinstance(value, tuple):
+        return tuple(_key(v, precision) for v in value)
+    if precision is not None:
+        return rounded(value, precision)
+    if isinstance(value, Fraction):
+        return str(value)
+    if math.isnan(value) or math.isinf(value):
+        raise NotComputable("not finite")
+    # a float that is really a short rational (0.5 computed through sqrt etc.) still matches the fraction
+    approximation = Fraction(value).limit_denominator(10000)
+    if math.isclose(float(approximation), value, rel_tol=1e-12, abs_tol=1e-12):
+        return str(approximation)
+    return f"~{value:.{FLOAT_DIGITS}g}"
+
+
+def parse_expression(text: str):
+    """Expression tree of an answer or math expression after normalising its notation. Raises NotComputable"""
+    try:
+        return ast.parse(_prepare(str(text)), mode="eval")
+    except (SyntaxError, RecursionError):
+        raise NotComputable(text)
+
+
+def evaluate_answer(answer, variables: dict = None):
+    """Value of an answer or expression: a Fraction when it is rational, a float otherwise
+    (or a tuple of them). Raises one of COMPUTE_ERRORS when it cannot be computed"""
+    return _evaluate(parse_expression(answer), variables or {})
+
+
+def canonicalize(answer, precision: int = None):
+    """Deterministic canonical form of a calculator final_answer. Equivalent answers such as
+    "0.5", "1/2" and "0.50" get the same form. Returns None for empty answers"""
+    if answer is None:
+        return None
+    if isinstance(answer, (list, tuple)):
+        return tuple(canonicalize(a, precision) for a in answer)
+    text = str(answer).strip()
+    if not text:
+        return None
+    if text.lower() in (NO_SOLUTION, NOT_GOOD):
+        return text.lower()
+
+    prepared = _prepare(text)
+    try:
+        tree = ast.parse(prepared, mode="eval")
+    except (SyntaxError, RecursionError):
+        return " ".join(text.lower().split())
+
+    try:
+        return _key(_evaluate(tree, {}), precision)
+    except COMPUTE_ERRORS:
+        pass
+
+    # expressions in variables are compared by their values at a few sample points
+    names = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} - set(CONSTANTS) - set(FUNCTIONS)
+    if names:
+        try:
+            samples = []
+            for point in SAMPLE_POINTS:
+                value = _evaluate(tree, {name: point + i * 0.11 for i, name in enumerate(sorted(names))})
+                samples.append(f"{float(value):.{FLOAT_DIGITS - 2}g}")
+            return "f(" + ",".join(sorted(names)) + ")=" + ";".join(samples)
+        except COMPUTE_ERRORS:
+            pass
+    return prepared.replace(" ", "").lower()
+
+
+def equivalent(a, b, precision: int = None):
+    key = canonicalize(a, precision)
+    return key is not None and key == canonicalize(b, precision)
+
+
+def cluster_answers(candidates, precision: int = None):
+    """Group equivalent candidates. Returns clusters sorted by support, largest first.
+    Each cluster holds its canonical key, its members and a representative member"""
+    clusters = {}
+    for candidate in candidates:
+        key = canonicalize(candidate, precision)
+        if key is None:
+            continue
+        clusters.setdefault(key, []).append(candidate)
+
+    result = []
+    for key, members in clusters.items():
+        literals = [str(m) for m in members]
+        # the most common spelling wins, shorter (usually exact) forms break ties
+        representative = min(members, key=lambda m: (-literals.count(str(m)), len(str(m))))
+        result.append({"key": key, "members": members, "support": len(members), "representative": representative})
+    return sorted(result, key=lambda c: -c["support"])
+
+
+def _is_integer(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        return _is_integer(node.operand)
+    return isinstance(node, ast.Constant) and type(node.value) is int
+
+
+def _is_number(node):
+    return isinstance(node, ast.Constant) and type(node.value) in (int, float)
+
+
+def _is_radical(node):
+    """sqrt(n) of a squarefree integer n > 1"""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "sqrt"
+            and len(node.args) == 1 and _is_integer(node.args[0])):
+        return False
+    radicand = node.args[0].value
+    return 1 < radicand <= MAX_SIMPLIFIED_RADICAND and \
+        all(radicand % (k * k) for k in range(2, math.isqrt(radicand) + 1))
+
+
+def _is_radical_term(node):
+    """sqrt(n) with an optional number factor"""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        return (_is_number(node.left) and _is_radical(node.right)) or \
+            (_is_radical(node.left) and _is_number(node.right))
+    return _is_radical(node)
+
+
+def _is_term(node):
+    """A number, a fraction of integers or a radical term, the last two over an optional integer denominator"""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        return _is_term(node.operand)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
+        return _is_integer(node.right) and (_is_integer(node.left) or _is_radical_term(node.left))
+    return _is_number(node) or _is_radical_term(node)
+
+
+def _summands(node):
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        return _summands(node.left) + [node.right]
+    return [node]
+
+
+def _radicands(node):
+    return {n.args[0].value for n in ast.walk(node) if _is_radical(n)}
+
+
+def _is_sum(node):
+    """Terms with at most one rational part and one term per radical, e.g. -1 + 2*sqrt(3)"""
+    terms = _summands(node)
+    if not all(_is_term(term) for term in terms):
+        return False
+    radicands = [_radicands(term) for term in terms]
+    rational = sum(1 for r in radicands if not r)
+    radicals = [next(iter(r)) for r in radicands if r]
+    return rational <= 1 and len(radicals) == len(set(radicals))
+
+
+def _is_final(node):
+    if isinstance(node, ast.Tuple):
+        return bool(node.elts) and all(_is_final(element) for element in node.elts)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div) and _is_integer(node.right) \
+            and isinstance(node.left, ast.BinOp) and isinstance(node.left.op, (ast.Add, ast.Sub)):
+        # (a + b*sqrt(c)) / d
+        return _is_sum(node.left)
+    return _is_sum(node)
+
+
+def is_final_form(answer):
+    """Whether an answer is written in final form: a number, a fraction or a simplified radical expression
+    (or a tuple of them) that evaluates exactly as written. Products, powers, binomials and anything only
+    comparable as text or at sample points are not"""
+    try:
+        tree = parse_expression(answer)
+        evaluate_answer(answer)
+    except COMPUTE_ERRORS:
+        return False
+    return _is_final(tree.body)
+
+
+def clear_majority(candidates, precision: int = None, min_support: int = 2, final_only: bool = False):
+    """Representative of the cluster backed by more than half of the valid candidates
+    and at least min_support of them, or None when there is no such cluster.
+    With final_only the representative is a member in final form, None when the cluster has none"""
+    clusters = cluster_answers(candidates, precision)
+    if not clusters:
+        return None
+    top = clusters[0]
+    valid = sum(c["support"] for c in clusters)
+    if top["support"] >= min_support and top["support"] * 2 > valid and top["key"] != NOT_GOOD:
+        if not final_only:
+            return top["representative"]
+        final = [m for m in top["members"] if is_final_form(m)]
+        literals = [str(m) for m in final]
+        return min(final, key=lambda m: (-literals.count(str(m)), len(str(m))), default=None)
+    return None
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import Pure.main as hive_main
+from Pure.answer_normalizer import equivalent
+from Pure.BudgetController import BEST_EFFORT
+from Pure.fast_math import COMPUTED
+from Pure.QuestionDataset import QuestionDataset
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(__file__), "questions", "questions_math.json")
+UNRELIABLE = "Could not find reliable answer"
+
+
+def load_results(path: str):
+    """The latest record of every question in a results file, so a stopped run can skip them and an error
+    retried later replaces its record. A line cut off by a crash is dropped and its question asked again"""
+    records = {}
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record.get("id")] = record
+    return list(records.values())
+
+
+def percentile(values: list[float], p: float):
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def is_correct(answer, entry: dict, precision: int = None):
+    expected = entry.get("acceptable_answers") or [entry.get("correct_answer")]
+    expected = [e for e in expected if e is not None]
+    if not expected:
+        return None
+    return any(equivalent(answer, e, precision=precision) for e in expected)
+
+
+async def run_question(hive, entry: dict, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        record = {"id": entry.get("id"), "question": entry["question"], "category": entry.get("category"),
+                  "difficulty": entry.get("difficulty"), "answer": None, "status": "ok", "error": None}
+        start = time.perf_counter()
+        stats = None
+        try:
+            answer, stats = await hive_main.solve_question(hive, entry["question"])
+            record["answer"] = answer
+            record["correct"] = is_correct(answer, entry, hive_main.stated_precision(entry["question"]))
+        except Exception as e:
+            record["status"] = "unreliable" if str(e) == UNRELIABLE else "error"
+            record["error"] = str(e)
+            record["correct"] = False if entry.get("correct_answer") is not None else None
+        record["latency"] = time.perf_counter() - start
+        if stats is not None:
+            record.update(stats.to_dict())
+            if record["status"] == "ok" and stats.confidence == BEST_EFFORT:
+                record["status"] = "best_effort"
+        return record
+
+
+def summarize(records: list[dict], wall_time: float, timed: int = None):
+    """timed is how many of the records were answered within wall_time, all of them by default"""
+    timed = len(records) if timed is None else timed
+    stages = {}
+    model_calls = {}
+    retries = {}
+    failed_calls = {}
+    hedges = {}
+    coalesced = {}
+    for record in records:
+        for name, seconds in record.get("stage_times", {}).items():
+            stages.setdefault(name, []).append(seconds)
+        for name, count in record.get("model_calls", {}).items():
+            model_calls[name] = model_calls.get(name, 0) + count
+        for name, count in record.get("retries", {}).items():
+            retries[name] = retries.get(name, 0) + count
+        for name, count in record.get("failed_calls", {}).items():
+            failed_calls[name] = failed_calls.get(name, 0) + count
+        for name, count in record.get("hedges", {}).items():
+            hedges[name] = hedges.get(name, 0) + count
+        for name, count in record.get("coalesced", {}).items():
+            coalesced[name] = coalesced.get(name, 0) + count
+    stages["total"] = [r["latency"] for r in records]
+
+    graded = [r for r in records if r.get("correct") is not None]
+    rounds = [r.get("evaluation_rounds", 0) for r in records]
+    return {
+        "questions": len(records),
+        "wall_time": wall_time,
+        "throughput_per_min": timed / wall_time * 60 if wall_time else 0.0,
+        "latency": {
+            name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+            for name, values in stages.items()
+        },
+        "model_calls": model_calls,
+        "model_calls_per_question": sum(model_calls.values()) / len(records) if records else 0.0,
+        "retries": retries,
+        "failed_calls": failed_calls,
+        "hedges": hedges,
+        "coalesced": coalesced,
+        "evaluation_rounds": sum(rounds),
+        "evaluation_rounds_per_question": sum(rounds) / len(records) if records else 0.0,
+        "tokens_per_question": sum(r.get("tokens", 0) for r in records) / len(records) if records else 0.0,
+        "computed_locally_rate": sum(r.get("confidence") == COMPUTED for r in records) / len(records) if records else 0.0,
+        "best_effort_rate": sum(r["status"] == "best_effort" for r in records) / len(records) if records else 0.0,
+        "unreliable_rate": sum(r["status"] == "unreliable" for r in records) / len(records) if records else 0.0,
+        "error_rate": sum(r["status"] == "error" for r in records) / len(records) if records else 0.0,
+        "accuracy": sum(bool(r["correct"]) for r in graded) / len(graded) if graded else None
+    }
+
+
+def configuration():
+    """The pipeline settings a run is compared by"""
+    return {
+        "calculator_models": hive_main.CALCULATOR_MODELS,
+        "evaluator_models": hive_main.EVALUATOR_MODELS,
+        "calculation_runs": hive_main.CALCULATION_RUNS,
+        "evaluation_runs": hive_main.EVALUATION_RUNS,
+        "calculation_quorum": hive_main.CALCULATION_QUORUM,
+        "local_consensus": hive_main.LOCAL_CONSENSUS,
+        "response_cache": hive_main.RESPONSE_CACHE,
+        "research_cache": hive_main.RESEARCH_CACHE,
+        "streaming": hive_main.STREAMING,
+        "question_time_budget": hive_main.QUESTION_TIME_BUDGET,
+        "question_token_budget": hive_main.QUESTION_TOKEN_BUDGET,
+        "max_round_width": hive_main.MAX_ROUND_WIDTH,
+        "call_timeout": hive_main.CALL_TIMEOUT,
+        "question_deadline": hive_main.QUESTION_DEADLINE,
+        "hedging": hive_main.HEDGING,
+        "coalesce_questions": hive_main.COALESCE_QUESTIONS,
+        "coalesce_calls": hive_main.COALESCE_CALLS,
+        "fast_path": hive_main.FAST_PATH,
+        "verify_candidates": hive_main.VERIFY_CANDIDATES,
+        "adaptive_ensemble": hive_main.ADAPTIVE_ENSEMBLE,
+        "checkpoints": hive_main.CHECKPOINTS
+    }
+
+
+async def run_benchmark(questions, concurrency: int, results_path: str = None):
+    """Answer questions from any iterable, so a large dataset is read as it is consumed. With results_path
+    every record is appended to that JSONL file as soon as it is finished, and the summary covers every
+    question in that file, including the ones answered by earlier runs"""
+    semaphore = asyncio.Semaphore(concurrency)
+    questions = iter(questions)
+    records = []
+    results = open(results_path, "a", encoding="utf-8") if results_path is not None else None
+
+    async def work(hive):
+        for entry in questions:
+            record = await run_question(hive, entry, semaphore)
+            records.append(record)
+            if results is not None:
+                results.write(json.dumps(record, default=str) + "\n")
+                results.flush()
+
+    try:
+        async with hive_main.Hive() as hive:
+            start = time.perf_counter()
+            await asyncio.gather(*(work(hive) for _ in range(concurrency)))
+            wall_time = time.perf_counter() - start
+    finally:
+        if results is not None:
+            results.close()
+    timed = len(records)
+    if results_path is not None:
+        # a retried question's new record replaces its error
+        records = load_results(results_path)
+    return records, summarize(records, wall_time, timed=timed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Pure pipeline over a question set and report performance")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="JSONL (streamed) or JSON question set")
+    parser.add_argument("--concurrency", type=int, default=1, help="questions processed at the same time")
+    parser.add_argument("--limit", type=int, default=None, help="only run the first N questions")
+    parser.add_argument("--sample", type=int, default=None, help="run N questions drawn at random (see --seed)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --sample")
+    parser.add_argument("--shard", default=None, help="I/N: only run shard I (0-based) of N disjoint shards")
+    parser.add_argument("--results", default=None,
+                        help="JSONL file every finished question is appended to; questions already in it are skipped "
+                             "(those that ended with an error are asked again), so a stopped run resumes where it "
+                             "stopped")
+    parser.add_argument("--output", default=None, help="where to write the JSON report")
+    parser.add_argument("--label", default="", help="free-form name of the configuration under test")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's console logs")
+    parser.add_argument("--spans", default=None, help="also write every span of the run as JSONL")
+    parser.add_argument("--metrics", default=None, help="also write Prometheus metrics of the run")
+    args = parser.parse_args()
+
+    hive_main.CONSOLE_LOGS = args.verbose
+    hive_main.SPANS_PATH = args.spans or hive_main.SPANS_PATH
+    hive_main.METRICS_PATH = args.metrics or hive_main.METRICS_PATH
+    dataset = QuestionDataset(args.questions)
+    if args.sample is not None:
+        questions = dataset.sample(args.sample, seed=args.seed)
+    elif args.shard is not None:
+        index, shards = (int(part) for part in args.shard.split("/"))
+        questions = dataset.shard(index, shards)
+    else:
+        questions = iter(dataset)
+    previous = load_results(args.results)
+    done = {record.get("id") for record in previous if record.get("status") != "error"}
+    questions = itertools.islice((entry for entry in questions if entry["id"] not in done), args.limit)
+    started = datetime.now()
+    records, summary = asyncio.run(run_benchmark(questions, args.concurrency, results_path=args.results))
+
+    output = args.output or f"benchmark_{started.strftime('%Y%m%d_%H%M%S')}.json"
+    report = {
+        "label": args.label,
+        "started": started.isoformat(timespec="seconds"),
+        "question_set": args.questions,
+        "shard": args.shard,
+        "resumed_after": len(done),
+        "earlier_errors": len(previous) - len(done),
+        "concurrency": args.concurrency,
+        "config": configuration(),
+        "summary": summary,
+        "questions": records
+    }
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, default=str)
+
+    print(json.dumps(summary, indent=2))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The deadline of the whole question passed. Unlike a single slow call this is not worth a retry"""
+
+
+@contextmanager
+def deadline(seconds: float = None):
+    """Run the block (and the tasks it spawns) under a deadline `seconds` from now.
+    A nested deadline never extends an outer one. None keeps the current deadline"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left until the current deadline, None without one"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+async def within_deadline(awaitable, timeout: float = None):
+    """Await under the current deadline and an optional per-call timeout, whichever ends first.
+    The awaitable is cancelled when time runs out, which closes its Ollama request.
+    Raises DeadlineExceeded when the deadline ended it and asyncio.TimeoutError when the call timeout did"""
+    left = remaining()
+    if left is None or (timeout is not None and timeout < left):
+        if timeout is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, timeout)
+    if left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        if expired():
+            raise DeadlineExceeded() from None
+        raise
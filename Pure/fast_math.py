@@ -0,0 +1,319 @@
+import ast
+import math
+import re
+from fractions import Fraction
+
+from Pure.answer_normalizer import COMPUTE_ERRORS, MAX_EXACT_BITS, MAX_EXACT_EXPONENT, NotComputable, \
+    evaluate_answer, exact_bits, parse_expression, rounded, stated_precision
+
+COMPUTED = "computed"
+VERIFIED = "verified"
+
+# instruction words around an expression; a question with any other word is not a bare computation
+LEADING_WORDS = {
+    "what", "what's", "is", "are", "the", "value", "of", "compute", "calculate", "evaluate", "simplify",
+    "expression", "find", "exact", "solve", "please", "determine", "work", "out", "equation"
+}
+TRAILING_WORDS = {
+    "and", "give", "provide", "express", "write", "return", "the", "result", "answer", "in", "as", "a", "an",
+    "exact", "simplest", "simplified", "radical", "form", "fraction", "number", "numerical", "exactly", "please"
+}
+SOLVE_FOR = re.compile(r"\bsolve\s+for\s+([a-z])\s*[:,]?\s*", re.IGNORECASE)
+PRECISION_PHRASE = re.compile(
+    r",?\s*(?:\band\s+)?(?:\bround(?:ed)?\s+|\bcorrect\s+|\bgive\s+(?:the\s+)?(?:answer|result)\s+)?\bto\s+\d+\s*"
+    r"(?:decimal\s+places?|decimals?|digits?(?:\s+after\s+the\s+decimal\s+point)?)", re.IGNORECASE)
+EXPRESSION_CHARS = re.compile(r"^[\w\s+\-*/^().,=√π×·÷−\\{}]+$")
+OPERATOR = re.compile(r"[+\-*/^=√×·÷−]|\b(?:sqrt|cbrt|sin|cos|tan|exp|log|ln|abs)\s*\(")
+KNOWN_NAMES = {"pi", "e", "sqrt", "cbrt", "sin", "cos", "tan", "exp", "log", "ln", "abs"}
+MAX_FACTOR_STEPS = 10 ** 6
+
+
+def _squarefree(n: int):
+    """n = a * a * b with b squarefree. Returns (a, b)"""
+    outside, inside = 1, 1
+    factor = 2
+    steps = 0
+    while factor * factor <= n:
+        steps += 1
+        if steps > MAX_FACTOR_STEPS:
+            raise NotComputable("radicand too large")
+        count = 0
+        while n % factor == 0:
+            n //= factor
+            count += 1
+        outside *= factor ** (count // 2)
+        inside *= factor ** (count % 2)
+        factor += 1 if factor == 2 else 2
+    return outside, inside * n
+
+
+class Surd():
+    """Exact sum of rational multiples of square roots of squarefree integers, e.g. 3/2 + 6*sqrt(2).
+    Stored as radicand -> coefficient, with radicand 1 for the rational part"""
+    def __init__(self, terms: dict = None):
+        self.terms = {r: c for r, c in (terms or {}).items() if c != 0}
+        if any(exact_bits(c) + r.bit_length() > MAX_EXACT_BITS for r, c in self.terms.items()):
+            raise NotComputable("exact value too large")
+
+    def bits(self):
+        return max((exact_bits(c) + r.bit_length() for r, c in self.terms.items()), default=0)
+
+    @classmethod
+    def rational(cls, value):
+        return cls({1: Fraction(value)})
+
+    @classmethod
+    def sqrt(cls, value: Fraction):
+        if value < 0:
+            raise NotComputable("square root of a negative number")
+        # sqrt(p/q) = sqrt(p*q)/q
+        outside, inside = _squarefree(value.numerator * value.denominator)
+        return cls({inside: Fraction(outside, value.denominator)})
+
+    def is_rational(self):
+        return set(self.terms) <= {1}
+
+    def as_fraction(self):
+        return self.terms.get(1, Fraction(0))
+
+    def __float__(self):
+        return float(sum(float(c) * math.sqrt(r) for r, c in self.terms.items()))
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for radicand, coefficient in other.terms.items():
+            terms[radicand] = terms.get(radicand, Fraction(0)) + coefficient
+        return Surd(terms)
+
+    def __neg__(self):
+        return Surd({r: -c for r, c in self.terms.items()})
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __mul__(self, other):
+        result = Surd()
+        for r1, c1 in self.terms.items():
+            for r2, c2 in other.terms.items():
+                # sqrt(r1) * sqrt(r2) = sqrt(gcd^2 * r1/gcd * r2/gcd) = gcd * sqrt(r1*r2/gcd^2)
+                common = math.gcd(r1, r2)
+                result = result + Surd({(r1 // common) * (r2 // common): c1 * c2 * common})
+        return result
+
+    def inverse(self):
+        if not self.terms:
+            raise NotComputable("division by zero")
+        if len(self.terms) == 1:
+            # 1/(c*sqrt(r)) = sqrt(r)/(c*r)
+            (radicand, coefficient), = self.terms.items()
+            return Surd({radicand: 1 / (coefficient * radicand)})
+        if len(self.terms) == 2 and 1 in self.terms:
+            # 1/(a + b*sqrt(r)) = (a - b*sqrt(r)) / (a^2 - b^2*r)
+            radicand = next(r for r in self.terms if r != 1)
+            a, b = self.terms[1], self.terms[radicand]
+            return Surd({1: a, radicand: -b}) * Surd.rational(1 / (a * a - b * b * radicand))
+        raise NotComputable("cannot rationalize the denominator")
+
+    def __truediv__(self, other):
+        return self * other.inverse()
+
+    def power(self, exponent: Fraction):
+        if exponent.denominator == 2 and exponent > 0 and self.is_rational():
+            return Surd.sqrt(self.as_fraction()).power(Fraction(exponent.numerator))
+        if exponent.denominator != 1 or abs(exponent) > MAX_EXACT_EXPONENT \
+                or self.bits() * abs(exponent) > MAX_EXACT_BITS:
+            raise NotComputable("power")
+        if self.is_rational():
+            base = self.as_fraction()
+            if base == 0 and exponent < 0:
+                raise NotComputable("division by zero")
+            return Surd.rational(base ** int(exponent))
+        result = Surd.rational(1)
+        for _ in range(abs(int(exponent))):
+            result = result * self
+        return result if exponent >= 0 else result.inverse()
+
+    def __str__(self):
+        if not self.terms:
+            return "0"
+        parts = []
+        for radicand in sorted(self.terms):
+            coefficient = self.terms[radicand]
+            sign = "-" if coefficient < 0 else "+"
+            magnitude = abs(coefficient)
+            if radicand == 1:
+                text = str(magnitude)
+            else:
+                numerator = "" if magnitude.numerator == 1 else f"{magnitude.numerator}*"
+                text = f"{numerator}sqrt({radicand})"
+                if magnitude.denominator != 1:
+                    text += f"/{magnitude.denominator}"
+            parts.append((sign, text))
+        first_sign, first = parts[0]
+        return ("-" if first_sign == "-" else "") + first + "".join(f" {s} {t}" for s, t in parts[1:])
+
+
+def _exact(node):
+    """Evaluate an expression tree with Surd arithmetic. Raises NotComputable for anything not exact"""
+    if isinstance(node, ast.Expression):
+        return _exact(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return Surd.rational(Fraction(str(node.value)))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _exact(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left, right = _exact(node.left), _exact(node.right)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Div):
+            return left / right
+        if isinstance(node.op, ast.Pow) and right.is_rational():
+            return left.power(right.as_fraction())
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "sqrt" \
+            and len(node.args) == 1:
+        argument = _exact(node.args[0])
+        if argument.is_rational():
+            return Surd.sqrt(argument.as_fraction())
+    raise NotComputable(type(node).__name__)
+
+
+def extract_computation(question: str):
+    """The bare expression (or single-variable equation) a question asks to compute, or None for anything
+    that needs reading: word problems, proofs, derivatives, series. Returns (expression, variable)"""
+    text = PRECISION_PHRASE.sub("", question.strip()).strip().rstrip("?.!").strip()
+    variable = None
+    solve_for = SOLVE_FOR.search(text)
+    if solve_for is not None:
+        variable = solve_for.group(1)
+        text = text[:solve_for.start()] + " " + text[solve_for.end():]
+    words = text.split()
+    while words and words[0].lower().rstrip(":,") in LEADING_WORDS:
+        words.pop(0)
+    while words and words[-1].lower().strip(",") in TRAILING_WORDS:
+        words.pop()
+    expression = " ".join(words).strip().rstrip(",:")
+    if not expression or not EXPRESSION_CHARS.match(expression) or not OPERATOR.search(expression):
+        return None
+    if "=" not in expression and _names(expression) is None:
+        return None
+    if "=" not in expression and _names(expression) - KNOWN_NAMES:
+        return None
+    return expression, variable
+
+
+def _names(expression: str):
+    """Variable and function names in an expression, None if it does not parse"""
+    try:
+        tree = parse_expression(expression)
+    except NotComputable:
+        return None
+    return {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+
+
+def _solve_linear(expression: str, variable: str = None):
+    """Root of a linear equation lhs = rhs in one variable, exactly"""
+    sides = expression.split("=")
+    if len(sides) != 2:
+        raise NotComputable("not a single equation")
+    names = set()
+    for side in sides:
+        side_names = _names(side)
+        if side_names is None:
+            raise NotComputable("unparsable equation")
+        names |= side_names
+    names -= KNOWN_NAMES
+    if len(names) != 1 or (variable is not None and names != {variable}):
+        raise NotComputable("not an equation in one variable")
+    name = names.pop()
+
+    def residual(x: Fraction):
+        value = evaluate_answer(sides[0], {name: x}) - evaluate_answer(sides[1], {name: x})
+        if not isinstance(value, Fraction):
+            raise NotComputable("not rational")
+        return value
+
+    f0, f1, f2 = residual(Fraction(0)), residual(Fraction(1)), residual(Fraction(2))
+    slope = f1 - f0
+    if slope == 0 or f2 - f1 != slope:
+        raise NotComputable("not linear")
+    root = -f0 / slope
+    if residual(root) != 0:
+        raise NotComputable("not linear")
+    return Surd.rational(root)
+
+
+def question_value(question: str):
+    """Value of a directly computable question: a Surd when exact, a float otherwise. None if not computable"""
+    extracted = extract_computation(question)
+    if extracted is None:
+        return None
+    expression, variable = extracted
+    try:
+        if "=" in expression:
+            return _solve_linear(expression, variable)
+        try:
+            return _exact(parse_expression(expression))
+        except NotComputable:
+            value = evaluate_answer(expression)
+            if isinstance(value, tuple):
+                return None
+            value = float(value)
+            return value if math.isfinite(value) else None
+    except COMPUTE_ERRORS:
+        return None
+
+
+def format_value(value, precision: int = None):
+    """Answer text of a computed value, or None when an exact form is needed and there is none"""
+    if precision is not None:
+        return rounded(_decimal_value(value), precision)
+    if isinstance(value, Surd):
+        return str(value.as_fraction()) if value.is_rational() else str(value)
+    return None
+
+
+def _decimal_value(value):
+    """What a computed value is rounded from: the exact Fraction when it is rational, a float otherwise"""
+    if isinstance(value, Surd):
+        return value.as_fraction() if value.is_rational() else float(value)
+    return value
+
+
+def solve_locally(question: str):
+    """Answer for a question that is a plain computation, without any model. None when the hive is needed"""
+    value = question_value(question)
+    if value is None:
+        return None
+    try:
+        return format_value(value, stated_precision(question))
+    except COMPUTE_ERRORS:
+        return None
+
+
+def matches_value(candidate, value, precision: int = None):
+    """Whether a candidate answer is numerically the computed value (to the asked precision, if any)"""
+    try:
+        computed = evaluate_answer(candidate)
+    except COMPUTE_ERRORS:
+        return False
+    if isinstance(computed, tuple):
+        return False
+    if precision is not None:
+        return rounded(computed, precision) == rounded(_decimal_value(value), precision)
+    if isinstance(value, Surd) and value.is_rational() and isinstance(computed, Fraction):
+        return computed == value.as_fraction()
+    return math.isclose(float(computed), float(value), rel_tol=1e-9, abs_tol=1e-12)
+
+
+def verified_candidate(candidates: list, value, precision: int = None):
+    """The most frequent candidate matching the computed value, or None if no candidate does"""
+    matching = [c for c in candidates if c is not None and matches_value(c, value, precision)]
+    if not matching:
+        return None
+    literals = [str(c) for c in matching]
+    return max(matching, key=lambda c: (literals.count(str(c)), -len(str(c))))
@@ -0,0 +1,78 @@
+import json
+import re
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class MalformedResponse(ValueError):
+    """The model output holds no JSON object with the required keys, not even after repair"""
+    def __init__(self, text: str, required: tuple = ()):
+        wanted = f"JSON object with {', '.join(required)}" if required else "JSON object"
+        super().__init__(f"no {wanted} in model output: {text[:120]!r}")
+        self.text = text
+
+
+def extract_json(text: str, required: tuple = ()):
+    """The JSON object in a model response that has all `required` keys. Tolerates markdown fences, text before
+    and after the object and output cut off by num_predict, which is closed after its last complete value.
+    A required key cut off mid-value is missing, so such output raises MalformedResponse like no JSON at all"""
+    if isinstance(text, dict):
+        if all(key in text for key in required):
+            return text
+        raise MalformedResponse(str(text), required)
+    text = (text or "").strip()
+    candidates = [m.group(1).strip() for m in FENCE_PATTERN.finditer(text)] + [text]
+    for candidate in candidates:
+        start = candidate.find("{")
+        while start != -1:
+            data = _decode_from(candidate, start)
+            if data is not None and all(key in data for key in required):
+                return data
+            start = candidate.find("{", start + 1)
+    raise MalformedResponse(text, required)
+
+
+def _decode_from(text: str, start: int):
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        data = _close_truncated(text[start:])
+    return data if isinstance(data, dict) else None
+
+
+def _close_truncated(text: str):
+    """Cut a truncated object after its last complete value and close the open strings and brackets"""
+    stack = []
+    in_string = False
+    escaped = False
+    # index after the last complete value at which the object can be closed, with the stack at that point
+    cut = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif char in "}]":
+            if not stack or stack.pop() != char:
+                return None
+            if not stack:
+                return None
+            cut = (i + 1, list(stack))
+        elif char == ",":
+            cut = (i, list(stack))
+    if cut is None:
+        return None
+    end, open_brackets = cut
+    try:
+        return json.loads(text[:end].rstrip().rstrip(",") + "".join(reversed(open_brackets)))
+    except json.JSONDecodeError:
+        return None
@@ -1,10 +1,39 @@
+import os
+import sys
 import random
 import json
 import asyncio
+import time
 from datetime import datetime
 
-from Pure.Agent import Agent, check_ollama_model, quit_ollama
-from questions.question_bank import get_chosen_question
+# the script runs from its own directory, the shared Pure package is imported from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Pure.Agent import Agent
+from Pure.OllamaClient import OllamaClient, OLLAMA_HOST
+from Pure.OllamaPool import OllamaPool, Endpoint, host_failure, hedge_copy
+from Pure.ModelScheduler import ModelScheduler
+from Pure.ModelResidency import ModelResidency, GIGABYTE
+from Pure.model_admin import ensure_models
+from Pure.ResponseCache import ResponseCache
+from Pure.ResearchCache import ResearchCache
+from Pure.SingleFlight import SingleFlight, CoalescingClient, question_key
+from Pure.Replay import RecordingClient, ReplayClient, TraceWriter
+from Pure.answer_normalizer import clear_majority, equivalent, stated_precision
+from Pure.quorum import QuorumStats, gather_quorum
+from Pure.Hedger import Hedger
+from Pure.deadline import deadline
+from Pure.CheckpointStore import CheckpointStore, Checkpoint, ANSWERED, FAILED
+from Pure.EnsembleStats import EnsembleStats, question_category
+from Pure.BudgetController import BudgetController, AGREED, BEST_EFFORT
+from Pure.json_repair import extract_json
+from Pure.retry import with_retries
+from Pure.fast_math import solve_locally, question_value, verified_candidate, COMPUTED, VERIFIED
+from Pure.prompt_layout import shared_context, with_candidates
+from Pure.question_stats import start_question, stage, count_evaluation_round, count_failed_call, count_coalesced, \
+    record_calculation, current as current_question
+from Pure.tracing import span, annotate, start_tracing, stop_tracing, JsonlExporter, PrometheusExporter
+from Pure.questions.question_bank import get_chosen_question
 
 EVALUATION_RUNS=2
 CALCULATION_RUNS = 3
@@ -20,10 +49,105 @@ MODEL_LIGHT_KNOWLEDGE = "gemma2:2b"
 # CALCULATOR_MODELS = [MODEL_LIGHT_KNOWLEDGE, MODEL_LIGHT_ANALYTICAL, MODEL_LIGHT_KNOWLEDGE]
 CALCULATOR_MODELS = [MODEL_REGULAR, MODEL_LIGHT_ANALYTICAL, MODEL_REGULAR_LIGHT]
 EVALUATOR_MODELS = [MODEL_REGULAR, MODEL_REGULAR_LIGHT]
-USED_MODELS = set(CALCULATOR_MODELS + EVALUATOR_MODELS)
+USED_MODELS = set(CALCULATOR_MODELS + EVALUATOR_MODELS + [MODEL_LIGHT_ANALYTICAL])
+# Ollama hosts of the hive and the models each one serves (None: all of USED_MODELS). Every call goes to the
+# least loaded healthy host that has its model in memory; hosts failing ENDPOINT_MAX_FAILURES calls in a row or a
+# health poll are left out for ENDPOINT_EJECT_TIME seconds. Residency and queueing below are per host
+OLLAMA_ENDPOINTS = {OLLAMA_HOST: None}
+ENDPOINT_POLL_INTERVAL = 10
+ENDPOINT_MAX_FAILURES = 3
+ENDPOINT_EJECT_TIME = 30
+# how many requests each model serves at once (OLLAMA_NUM_PARALLEL), models not listed get 1
+MODEL_PARALLEL_SLOTS = {}
+# how many different models may be generating at the same time; keep it at or below the server's
+# OLLAMA_MAX_LOADED_MODELS (3 by default) and no lower than the number of calculator models, or one waits in a queue
+MAX_ACTIVE_MODELS = len(set(CALCULATOR_MODELS))
+# models stay loaded between questions; least recently used ones are evicted only above this budget
+RAM_BUDGET = 16 * GIGABYTE
+KEEP_ALIVE = "30m"
+UNLOAD_ON_EXIT = False
+# load calculator and evaluator models while the researcher is still working
+PREFETCH = True
+# cache agent responses in memory and in SQLite; research is always cached, calculators only at low temperature
+RESPONSE_CACHE = False
+RESPONSE_CACHE_PATH = os.path.join(os.path.dirname(__file__), "response_cache.sqlite3")
+RESPONSE_CACHE_POLICY = {"research": None, "calculator": 0.1}
+# reuse research of questions that differ only in numbers or phrasing; without an embed model similarity is lexical
+RESEARCH_CACHE = False
+RESEARCH_CACHE_EMBED_MODEL = None
+RESEARCH_CACHE_THRESHOLD = 0.9
+RESEARCH_CACHE_SIZE = 256
+# a question asked while the same one (up to case and spacing) is being answered waits for that answer;
+# identical concurrent calls of different questions at temperature <= COALESCE_MAX_TEMPERATURE are sent once
+COALESCE_QUESTIONS = True
+COALESCE_CALLS = True
+COALESCE_MAX_TEMPERATURE = 0.1
+# answer plain computations (exact rationals and square roots, linear equations, decimals to a stated precision)
+# locally without any model, and accept a calculator candidate that matches the locally computed value
+FAST_PATH = True
+VERIFY_CANDIDATES = True
+# accept the calculators' answer without evaluators when a clear majority of them is equivalent and in final form
+# (a number, fraction or simplified radical); anything else still goes to the evaluators
+LOCAL_CONSENSUS = True
+# stop waiting for calculators once this many of them agree and cancel the rest (None waits for all)
+CALCULATION_QUORUM = 2
+QUORUM_STATS = QuorumStats()
+# pick calculators by their history per question category (agreement with the accepted answer, latency, tokens,
+# failures) instead of at random; two that reliably agreed before start alone and the rest only join when they
+# disagree. The history is kept in ENSEMBLE_STATS_PATH
+ADAPTIVE_ENSEMBLE = False
+ENSEMBLE_STATS_PATH = os.path.join(os.path.dirname(__file__), "ensemble_stats.sqlite3")
+ENSEMBLE_MIN_SAMPLES = 5
+ENSEMBLE_EXPLORATION = 0.1
+# retry rounds of a question: each rejected round runs 1..MAX_ROUND_WIDTH calculators depending on how much
+# the candidates disagree, until a budget (None: unlimited) runs out or the leader is unchanged RETRY_PATIENCE rounds
+QUESTION_TIME_BUDGET = 600
+QUESTION_TOKEN_BUDGET = None
+MAX_RETRY_ROUNDS = CALCULATION_RUNS * 3
+MAX_ROUND_WIDTH = 3
+RETRY_PATIENCE = 2
+# answer with the best supported candidate when the rounds stop without agreement instead of raising
+BEST_EFFORT_ANSWERS = True
+
+# a single model call is cancelled after CALL_TIMEOUT seconds and every call of a question after QUESTION_DEADLINE
+CALL_TIMEOUT = 180
+QUESTION_DEADLINE = 900
+# calculator and evaluator calls slower than the 95th percentile of their stage are also sent to another model of
+# the stage and the first answer wins; every hedge is one extra model call. When the round already uses every
+# model of the stage (the evaluators by default), the same model is asked on another endpoint instead, so with a
+# single endpoint those calls are not hedged
+HEDGING = False
+HEDGER = Hedger(percentile=95, min_samples=10)
+
+# tries per agent call on broken JSON, dropped connections and server errors, with exponential backoff in between;
+# every retry raises the temperature a little. A call that still fails only drops out of its fan-out
+CALL_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+RETRY_TEMPERATURE_STEP = 0.05
+
+# save each question's research, candidates, retry round and evaluator verdicts in CHECKPOINT_PATH as they are
+# produced; a question asked again (e.g. after a failure or a crash) resumes from its last completed stage and one
+# that was answered with agreement is not asked again
+CHECKPOINTS = False
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), "checkpoints.sqlite3")
+
+# "record" writes every model call to TRACE_PATH, "replay" answers from it without Ollama (None: neither)
+TRACE_MODE = None
+TRACE_PATH = os.path.join(os.path.dirname(__file__), "trace.jsonl")
+# recorded latencies are multiplied by this in replay, 0 replays as fast as possible
+REPLAY_LATENCY_SCALE = 1.0
+# seeds the random role/model picks while recording or replaying so both runs send the same prompts
+TRACE_SEED = 0
+
+# spans of every question, stage, evaluation round and model call as JSONL (None disables)
+SPANS_PATH = None
+# the same spans aggregated into Prometheus text format, rewritten after every question (None disables)
+METRICS_PATH = None
 
 CONSOLE_LOGS = True
 QUESTION_BANK = False
+# stream calculator output and stop generation as soon as "final_answer" is complete
+STREAMING = False
 
 ROLE_RESEARCHER = """You are a researcher that gathers insight about given math problem.
 
@@ -146,13 +270,17 @@ FORMAT:
 }
 """
 ROLES_CALCULATOR = [ROLE_CALCULATOR_BASE, ROLE_CALCULATOR_ALGEBRA, ROLE_CALCULATOR_STEPWISE]
+# names the ensemble history is kept under
+CALCULATOR_ROLE_NAMES = {ROLE_CALCULATOR_BASE: "base", ROLE_CALCULATOR_ALGEBRA: "algebra",
+                         ROLE_CALCULATOR_STEPWISE: "stepwise"}
 ROLE_EVALUATOR = """You are a STRICT result selector for a math task.
 
 YOU WILL RECEIVE (as JSON in the user message):
 - question: the original user question/expression
 - research: factual, non-calculational insights relevant to the problem 
     (may include constraints, domains, definitions, typical pitfalls)
-- possible_results: an array of candidate final answers (strings or numbers)
+- possible_results: an array of distinct candidate final answers (strings or numbers)
+- support: how many calculators produced each candidate, in the same order as possible_results
 
 GOAL:
 Select the best final answer ONLY from possible_results.
@@ -175,7 +303,7 @@ SELECTION POLICY (STRICT ORDER):
 3) Evaluate: 
    - If a specific precision (e.g., "5 decimals") is required and no candidate meets it -> "#not_good".
    - If no precision specified prefer fractions
-   - Pick the cluster with the most support.
+   - Pick the cluster with the most support (sum of the support of its candidates).
    - If there is a tie or no clear majority (support < 2) and the problem is non-trivial -> "#not_good".
 
 OUTPUT FORMAT (exactly):
@@ -206,49 +334,161 @@ async def run_agent(agent: Agent, input: str, temperature: float = None, max_tok
         return await agent.ollama_chat(prompt=prompt)
 
 
-async def handle_research(agent: Agent, user_input, temperature: float, max_tokens: int):
+async def handle_research(agent: Agent, user_input, temperature: float, max_tokens: int,
+                          cache: ResearchCache = None):
     """Gathers insight from researcher and injects it into user's query"""
-    raw_insight = await run_agent(agent=agent, input=user_input, temperature=temperature, max_tokens=max_tokens)
+    if cache is not None:
+        research = await cache.lookup(user_input)
+        if research is not None:
+            if CONSOLE_LOGS:
+                print("[RESEARCH CACHE] reusing research of a similar question")
+            return research
+
+    async def attempt(n: int):
+        raw_insight = await run_agent(agent=agent, input=user_input, temperature=temperature + n * RETRY_TEMPERATURE_STEP,
+                                      max_tokens=max_tokens)
+        return extract_json(raw_insight)
 
     try:
-        return json.dumps(json.loads(raw_insight), indent=2)
-    except json.decoder.JSONDecodeError:
-        raise RuntimeError("Research agent failed to produce valid JSON")
-    finally:
-        quit_ollama(agent.model)
-
-
-async def run_worker(role: str, input: str, model: str, max_tokens: int):
+        research = json.dumps(await with_retries(attempt, attempts=CALL_ATTEMPTS, backoff=RETRY_BACKOFF, stage="research"),
+                              indent=2)
+    except Exception as e:
+        # calculators can still work from the question alone
+        count_failed_call("research")
+        if CONSOLE_LOGS:
+            print(f"[FAILED] research: {type(e).__name__}: {e}")
+        return "{}"
+
+    if cache is not None:
+        await cache.store(user_input, research)
+    return research
+
+
+def backup_assignment(model: str, role: str, choices: list[tuple], fan_out: list[tuple]):
+    """A (model, role) of the stage to hedge a call with that is not part of the call's fan-out, so that a backup
+    answer is never a second sample of a calculator or evaluator that already votes. Other models come first.
+    None when every choice is taken"""
+    free = [choice for choice in dict.fromkeys(choices) if choice not in fan_out and choice != (model, role)]
+    free.sort(key=lambda choice: choice[0] == model)
+    return free[0] if free else None
+
+
+async def hedged(agent: Agent, choices: list[tuple], fan_out: list[tuple], call):
+    """Await call(agent). With HEDGING a call slower than usual for its stage also goes to a (model, role) of the
+    stage outside the fan-out, or when there is none to the same model on another endpoint, and the first answer
+    wins. Returns the answer and the agent that gave it"""
+    if not HEDGING:
+        return await call(agent), agent
+    backup = backup_assignment(agent.model, agent.role, choices, fan_out)
+    if backup is None and len(getattr(agent.client, "serving", lambda model: [])(agent.model)) > 1:
+        backup = (agent.model, agent.role)
+    if backup is None:
+        return await call(agent), agent
+    backup_agent = Agent(model=backup[0], role=backup[1], client=agent.client, stage=agent.stage,
+                         timeout=agent.timeout)
+    hosts = set()
+
+    async def answer_of(answering: Agent, is_backup: bool):
+        with hedge_copy(hosts, is_backup):
+            return await call(answering), answering
+
+    return await HEDGER.run(agent.stage, lambda: answer_of(agent, False), lambda: answer_of(backup_agent, True))
+
+
+async def run_worker(client: OllamaClient, role: str, input: str, model: str, max_tokens: int,
+                     fan_out: list[tuple] = ()):
+    """final_answer of one calculator, None when it failed. fan_out is every (model, role) of its round"""
     if CONSOLE_LOGS:
         start = datetime.now()
         print(f"[START] {role[9:27]}... at {start.strftime('%H:%M:%S')} for model: {model}")
 
-    agent = Agent(model=model, role=role)
-    result = await run_agent(agent=agent, input=input, temperature=0.05, max_tokens=max_tokens)
+    agent = Agent(model=model, role=role, client=client, stage="calculator", timeout=CALL_TIMEOUT)
+    answered_by = agent
+    call_start = time.perf_counter()
 
-    if CONSOLE_LOGS:
-        end = datetime.now()
-        print(f"[END] {role[9:27]}... at {start.strftime('%H:%M:%S')} (duration {(end - start).total_seconds():.2f}s)")
+    async def attempt(n: int):
+        # a retry samples again slightly warmer, so it neither repeats the broken completion nor hits the cache
+        temperature = 0.05 + n * RETRY_TEMPERATURE_STEP
+
+        async def call(calculator: Agent):
+            if STREAMING:
+                return await calculator.ollama_chat_stream(prompt=calculator.build_chat_prompt(input),
+                                                           temperature=temperature, max_tokens=max_tokens,
+                                                           stop_field="final_answer")
+            return await run_agent(agent=calculator, input=input, temperature=temperature, max_tokens=max_tokens)
+
+        nonlocal answered_by
+        text, answered_by = await hedged(agent, [(m, r) for m in CALCULATOR_MODELS for r in ROLES_CALCULATOR],
+                                         fan_out, call)
+        return extract_json(text, required=("final_answer",))
 
     try:
-        data = json.loads(result)
+        data = await with_retries(attempt, attempts=CALL_ATTEMPTS, backoff=RETRY_BACKOFF, stage="calculator")
+    except asyncio.CancelledError:
+        # a straggler cut off by the quorum is a censored sample: it would have taken at least this long
+        record_calculation(model, CALCULATOR_ROLE_NAMES.get(role), time.perf_counter() - call_start, None, None,
+                           failed=False, cancelled=True)
+        raise
+    except Exception as e:
+        # a failed calculator is only a missing candidate, the rest of the fan-out goes on
+        count_failed_call("calculator")
+        record_calculation(model, CALCULATOR_ROLE_NAMES.get(role), time.perf_counter() - call_start, None, None,
+                           failed=True)
         if CONSOLE_LOGS:
-            print(f"Worker thought:\n{data.get('thought')}\n")
-        return data.get("final_answer")
-    except json.decoder.JSONDecodeError:
-        raise RuntimeError("Calculation agent failed to produce valid JSON")
+            print(f"[FAILED] {model}: {type(e).__name__}: {e}")
+        return None
+    # a hedged call may have been answered by the backup, whose model and role get the credit
+    record_calculation(answered_by.model, CALCULATOR_ROLE_NAMES.get(answered_by.role), time.perf_counter() - call_start,
+                       answered_by.last_tokens, data.get("final_answer"), failed=False)
 
-
-async def handle_worker(start_input: str, max_tokens: int, number_of_runs: int = 1):
-    tasks = []
+    if CONSOLE_LOGS:
+        end = datetime.now()
+        print(f"[END] {role[9:27]}... at {end.strftime('%H:%M:%S')} (duration {(end - start).total_seconds():.2f}s)")
+        if STREAMING and agent.last_stream_stats is not None:
+            stats = agent.last_stream_stats
+            print(f"[STREAM] {model}: first token after {stats['time_to_first_token'] or 0:.2f}s, "
+                  f"{stats['chunks']} chunks, stopped early: {stats['stopped_early']}")
+        print(f"Worker thought:\n{data.get('thought')}\n")
+    return data.get("final_answer")
+
+
+def calculator_assignments(number_of_runs: int):
+    """(model, role) of each calculator"""
+    assignments = []
     for i in range(number_of_runs):
         idx = random.randint(0, len(ROLES_CALCULATOR) - 1)
         role = ROLES_CALCULATOR[idx]
-        # if the models are the same for two calculators then we have a bottleneck and they're done sequentially anyway
+        # calculators sharing a model are queued by the scheduler according to MODEL_PARALLEL_SLOTS
         chosen_model = CALCULATOR_MODELS[i] if i < 3 else random.choice(CALCULATOR_MODELS)
-        tasks.append(run_worker(role=role, input=start_input, model=chosen_model, max_tokens=max_tokens))
+        assignments.append((chosen_model, role))
+    return assignments
+
+
+def calculator_pairs():
+    """Every (model, role name) a calculator can be run as"""
+    return [(model, name) for model in dict.fromkeys(CALCULATOR_MODELS) for name in CALCULATOR_ROLE_NAMES.values()]
+
+
+def ensemble_assignments(ensemble: EnsembleStats, category: str, width: int, exclude: list[tuple] = ()):
+    """(model, role) of `width` calculators ranked best for the category, see EnsembleStats.choose"""
+    roles = {name: role for role, name in CALCULATOR_ROLE_NAMES.items()}
+    excluded = [(model, CALCULATOR_ROLE_NAMES[role]) for model, role in exclude]
+    return [(model, roles[name]) for model, name in ensemble.choose(category, calculator_pairs(), width,
+                                                                     exclude=excluded)]
+
+
+async def handle_worker(client: OllamaClient, start_input: str, max_tokens: int, assignments: list[tuple],
+                        precision: int = None):
+    tasks = []
+    for chosen_model, role in assignments:
+        tasks.append((chosen_model, run_worker(client=client, role=role, input=start_input, model=chosen_model,
+                                               max_tokens=max_tokens, fan_out=assignments)))
 
-    results = await asyncio.gather(*tasks)
+    if CALCULATION_QUORUM is not None and len(assignments) > CALCULATION_QUORUM:
+        results = await gather_quorum(tasks, quorum=CALCULATION_QUORUM,
+                                      same=lambda a, b: equivalent(a, b, precision=precision), stats=QUORUM_STATS)
+    else:
+        results = await asyncio.gather(*(task for _, task in tasks))
     #results = []  # it should be gather but this lessens the chances of a timeout for now and makes it actually possible to test
     #for t in tasks:
     #    results.append(await t)
@@ -261,116 +501,411 @@ async def handle_worker(start_input: str, max_tokens: int, number_of_runs: int =
     return results
 
 
-async def handle_calculations(evaluator: Agent, user_input: str, research: str, max_tokens: int):
-    """Runs calculations with varying temperature"""
+async def save_progress(checkpoint: Checkpoint, **fields):
+    if checkpoint is not None:
+        await checkpoint.update(**fields)
+
+
+async def handle_calculations(client: OllamaClient, user_input: str, research: str, max_tokens: int,
+                              ensemble: EnsembleStats = None, checkpoint: Checkpoint = None):
+    """Runs calculations and evaluation rounds until the evaluators agree or the BudgetController stops them.
+    Without agreement the best supported candidate is returned and the question is marked as best effort.
+    With an ensemble the calculators are chosen by their history and the outcome is added to it.
+    With a checkpoint holding candidates of an earlier attempt those are evaluated instead of calculating anew"""
     possible_results = ""
     output_evaluation = ""
-    start_input = f"""
-    QUESTION: {user_input}
-
-    RESEARCH: {research}
-    """
+    # identical for every call of this question, so Ollama only evaluates it once per model and role
+    start_input = shared_context(user_input, research)
+    precision = stated_precision(user_input)
+    controller = BudgetController(time_budget=QUESTION_TIME_BUDGET, token_budget=QUESTION_TOKEN_BUDGET,
+                                  max_rounds=MAX_RETRY_ROUNDS, max_width=MAX_ROUND_WIDTH, patience=RETRY_PATIENCE,
+                                  precision=precision)
+    confidence = BEST_EFFORT
     if CONSOLE_LOGS:
         print("START CALCULATIONS")
 
-    results_list = await handle_worker(start_input=start_input, max_tokens=max_tokens, number_of_runs=CALCULATION_RUNS)
-    possible_results = results_list
+    # computable questions the fast path did not answer (e.g. no exact form) still get their candidates checked
+    computed_value = question_value(user_input) if VERIFY_CANDIDATES else None
 
-    count_runs = 0
-    while count_runs < CALCULATION_RUNS * 3:
+    category = question_category(user_input)
+    if ensemble is not None:
+        assignments = ensemble_assignments(ensemble, category, CALCULATION_RUNS)
+        chosen = [(model, CALCULATOR_ROLE_NAMES[role]) for model, role in assignments]
+        assignments = assignments[:ensemble.initial_width(category, chosen, CALCULATION_RUNS)]
+    else:
+        assignments = calculator_assignments(CALCULATION_RUNS)
+    resumed_rounds = checkpoint.get("round", 0) if checkpoint is not None else 0
+    round_start = time.perf_counter()
+    if checkpoint is not None and checkpoint.get("candidates"):
+        possible_results = list(checkpoint.get("candidates"))
+        round_calls = 0
+        if CONSOLE_LOGS:
+            print(f"[CHECKPOINT] resuming with {len(possible_results)} candidates after {resumed_rounds} rounds")
+    else:
+        with stage("calculate"):
+            possible_results = await handle_worker(client=client, start_input=start_input, max_tokens=max_tokens,
+                                                   assignments=assignments, precision=precision)
+            if len(assignments) < CALCULATION_RUNS and clear_majority(possible_results, precision=precision, final_only=True) is None \
+                    and (computed_value is None or verified_candidate(possible_results, computed_value, precision) is None):
+                # the narrow ensemble disagrees, the remaining calculators join before any evaluator runs
+                if CONSOLE_LOGS:
+                    print(f"[ENSEMBLE] {len(assignments)} calculators disagree, widening to {CALCULATION_RUNS}")
+                extra = ensemble_assignments(ensemble, category, CALCULATION_RUNS - len(assignments), exclude=assignments)
+                possible_results += await handle_worker(client=client, start_input=start_input, max_tokens=max_tokens,
+                                                        assignments=extra, precision=precision)
+                assignments += extra
+        round_calls = len(assignments)
+        await save_progress(checkpoint, stage="calculate", candidates=list(possible_results), round=0)
+    next_assignment = 0
+
+    while True:
         if CONSOLE_LOGS:
             print("POSSIBLE ANSWERS: \n", "\n".join(f"- {r}" for r in possible_results))
+        if computed_value is not None:
+            verified = verified_candidate(possible_results, computed_value, precision)
+            if verified is not None:
+                if CONSOLE_LOGS:
+                    print(f"[VERIFIED] {verified} matches the locally computed value, skipping evaluation")
+                output_evaluation = verified
+                confidence = VERIFIED
+                break
+        if LOCAL_CONSENSUS:
+            majority = clear_majority(possible_results, precision=precision, final_only=True)
+            if majority is not None:
+                if CONSOLE_LOGS:
+                    print(f"[CONSENSUS] calculators agree on {majority}, skipping evaluation")
+                output_evaluation = majority
+                confidence = AGREED
+                break
         tasks = []
-        for i in range(EVALUATION_RUNS):
-            tasks.append(handle_evaluation(agent=Agent(model=EVALUATOR_MODELS[i%len(EVALUATOR_MODELS)], role=ROLE_EVALUATOR),
-                                           user_input=user_input, research=research,
-                                           results=possible_results, temperature=random.uniform(0.03, 0.06), max_tokens=1000))
-        output_evaluation = await asyncio.gather(*tasks)
-        output_evaluation = await handle_answer(output_evaluation)
+        evaluators = [(EVALUATOR_MODELS[i % len(EVALUATOR_MODELS)], ROLE_EVALUATOR) for i in range(EVALUATION_RUNS)]
+        for model, role in evaluators:
+            tasks.append(handle_evaluation(agent=Agent(model=model, role=role, client=client, stage="evaluator",
+                                                       timeout=CALL_TIMEOUT),
+                                           context=start_input, results=possible_results, temperature=random.uniform(0.03, 0.06), max_tokens=1000,
+                                           fan_out=evaluators))
+        count_evaluation_round()
+        with span("evaluation_round", kind="round", round=controller.rounds + 1, candidates=len(possible_results)) as round_span:
+            with stage("evaluate"):
+                output_evaluation = await asyncio.gather(*tasks)
+            if checkpoint is not None:
+                await checkpoint.add_evaluation(output_evaluation)
+            output_evaluation = await handle_answer(output_evaluation, precision=precision)
+            round_span.set(agreed=output_evaluation != "#not_good")
 
         if CONSOLE_LOGS:
             print("evaluation: ", output_evaluation)
 
         if output_evaluation != "#not_good":
+            confidence = AGREED
             break
         elif CONSOLE_LOGS:
             print(f"Answers not good enough")
 
-        full_input = f"""{start_input}
+        controller.record_round(time.perf_counter() - round_start, round_calls + EVALUATION_RUNS, possible_results)
+        width = controller.next_width(possible_results)
+        if width == 0:
+            if CONSOLE_LOGS:
+                print(f"[BUDGET] stopping after {controller.rounds} rounds: {controller.stop_reason}")
+            break
 
-        POSSIBLE ANSWERS: {results_list}"""
-        new_results = await handle_worker(start_input=full_input, max_tokens=max_tokens, number_of_runs=1)
+        if ensemble is not None:
+            round_assignments = ensemble_assignments(ensemble, category, width)
+        else:
+            # rerun models and roles that already evaluated the shared context of this question
+            round_assignments = [assignments[(next_assignment + j) % len(assignments)] for j in range(width)]
+            next_assignment += width
+        full_input = with_candidates(start_input, possible_results)
+        round_start = time.perf_counter()
+        with stage("calculate"):
+            new_results = await handle_worker(client=client, start_input=full_input, max_tokens=max_tokens,
+                                              assignments=round_assignments, precision=precision)
+        round_calls = width
 
         possible_results += new_results
-        count_runs += 1
-
-    if count_runs >= CALCULATION_RUNS * 3:
-        raise Exception("Could not find reliable answer")
+        await save_progress(checkpoint, stage="calculate", candidates=list(possible_results),
+                            round=resumed_rounds + controller.rounds)
+
+    stats = current_question()
+    if ensemble is not None and stats is not None:
+        # only an accepted answer says which calculators were right, a best effort one still counts their cost
+        await ensemble.record(category, stats.calculations,
+                              verdict=output_evaluation if confidence != BEST_EFFORT else None, precision=precision)
+
+    if confidence == BEST_EFFORT:
+        output_evaluation = controller.best_effort(possible_results) if BEST_EFFORT_ANSWERS else None
+        if output_evaluation is None:
+            raise Exception("Could not find reliable answer")
+        if CONSOLE_LOGS:
+            print(f"[BUDGET] best effort answer: {output_evaluation}")
 
-    quit_ollama(evaluator.model)
+    if stats is not None:
+        stats.confidence = confidence
+        stats.stop_reason = controller.stop_reason
+    annotate(confidence=confidence, stop_reason=controller.stop_reason, retry_rounds=controller.rounds)
     return output_evaluation
 
 
-async def handle_answer(output_evaluation:str):
-    final_answer = output_evaluation[0]
+async def handle_answer(output_evaluation:str, precision: int = None):
+    """Evaluators agree when all their answers are equivalent, e.g. 0.5 and 1/2.
+    Evaluators whose calls failed are left out, but at least two of them (or every one, when fewer run)
+    have to answer"""
+    answers = [answer for answer in output_evaluation if answer is not None]
+    if len(answers) < min(2, EVALUATION_RUNS):
+        return "#not_good"
+    final_answer = answers[0]
     i=1
-    for answer in output_evaluation:
+    for answer in answers:
         if CONSOLE_LOGS:
             print(f"Answer from evaluator {i}: {answer}")
-        if final_answer != answer:
+        if not equivalent(final_answer, answer, precision=precision):
             return "#not_good"
         i+=1
     return final_answer
 
 
-async def handle_evaluation(agent: Agent, user_input, research: str, results: str, temperature: float, max_tokens: int):
-    """Adds possible results to user's query and evaluates them"""
-    new_input = f"""
-    QUESTION: {user_input}
-
-    RESEARCH: {research}
+async def handle_evaluation(agent: Agent, context: str, results: list, temperature: float, max_tokens: int,
+                            fan_out: list[tuple] = ()):
+    """Adds possible results to the question's shared context and evaluates them. Returns None if the call failed.
+    fan_out is every (model, role) evaluating the same round"""
+    new_input = with_candidates(context, results)
 
-    POSSIBLE ANSWERS: {results}
-    """
+    async def attempt(n: int):
+        async def call(evaluator: Agent):
+            return await run_agent(agent=evaluator, input=new_input, temperature=temperature + n * RETRY_TEMPERATURE_STEP,
+                                   max_tokens=max_tokens)
 
-    output = await run_agent(agent=agent, input=new_input, temperature=temperature, max_tokens=max_tokens)
+        text, _ = await hedged(agent, [(m, ROLE_EVALUATOR) for m in EVALUATOR_MODELS], fan_out, call)
+        return extract_json(text, required=("final_answer",))
 
     try:
-        return json.loads(output).get("final_answer")
-    except json.decoder.JSONDecodeError:
-        raise RuntimeError("Calculation agent failed to produce valid JSON")
-    except KeyError:
-        raise RuntimeError("Evaluation JSON missing 'final_answer' key")
+        data = await with_retries(attempt, attempts=CALL_ATTEMPTS, backoff=RETRY_BACKOFF, stage="evaluator")
+    except Exception as e:
+        count_failed_call("evaluator")
+        if CONSOLE_LOGS:
+            print(f"[FAILED] evaluator {agent.model}: {type(e).__name__}: {e}")
+        return None
+    return data.get("final_answer")
+
+
+class Hive():
+    """The client stack configured above: one Ollama HTTP client, model residency and scheduler per endpoint,
+    the endpoint pool routing between them and the caches on top"""
+    def __init__(self, metrics: bool = False):
+        # metrics=True aggregates them even without METRICS_PATH, for a process that serves them itself
+        self.metrics = PrometheusExporter(METRICS_PATH) if METRICS_PATH is not None or metrics else None
+        if TRACE_MODE is not None:
+            random.seed(TRACE_SEED)
+        if TRACE_MODE == "replay":
+            # routing does not matter for recorded answers, one endpoint serves them all
+            transports = {"replay": (ReplayClient(TRACE_PATH, latency_scale=REPLAY_LATENCY_SCALE), None)}
+        elif TRACE_MODE == "record":
+            writer = TraceWriter(TRACE_PATH)
+            transports = {host: (RecordingClient(OllamaClient(host=host), writer=writer), models)
+                          for host, models in OLLAMA_ENDPOINTS.items()}
+        else:
+            transports = {host: (OllamaClient(host=host), models) for host, models in OLLAMA_ENDPOINTS.items()}
+        endpoints = []
+        for host, (ollama, models) in transports.items():
+            residency = ModelResidency(ollama, ram_budget=RAM_BUDGET, keep_alive=KEEP_ALIVE)
+            scheduler = ModelScheduler(residency, slots=MODEL_PARALLEL_SLOTS, max_active_models=MAX_ACTIVE_MODELS)
+            endpoints.append(Endpoint(host, ollama, residency, scheduler, models=models))
+        self.pool = OllamaPool(endpoints, poll_interval=ENDPOINT_POLL_INTERVAL, max_failures=ENDPOINT_MAX_FAILURES,
+                               eject_time=ENDPOINT_EJECT_TIME)
+        self.client = self.pool
+        self.response_cache = None
+        if RESPONSE_CACHE:
+            self.response_cache = ResponseCache(self.pool, path=RESPONSE_CACHE_PATH, policy=RESPONSE_CACHE_POLICY)
+            self.client = self.response_cache
+        self.coalescing = None
+        if COALESCE_CALLS:
+            self.coalescing = CoalescingClient(self.client, max_temperature=COALESCE_MAX_TEMPERATURE)
+            self.client = self.coalescing
+        self.questions = SingleFlight()
+        self.checkpoints = CheckpointStore(CHECKPOINT_PATH) if CHECKPOINTS else None
+        self.ensemble = None
+        if ADAPTIVE_ENSEMBLE:
+            self.ensemble = EnsembleStats(path=ENSEMBLE_STATS_PATH, min_samples=ENSEMBLE_MIN_SAMPLES,
+                                          exploration=ENSEMBLE_EXPLORATION)
+        self.research_cache = None
+        if RESEARCH_CACHE:
+            self.research_cache = ResearchCache(self.pool, embed_model=RESEARCH_CACHE_EMBED_MODEL,
+                                                threshold=RESEARCH_CACHE_THRESHOLD, max_entries=RESEARCH_CACHE_SIZE)
+
+    async def __aenter__(self):
+        if SPANS_PATH is not None:
+            start_tracing(JsonlExporter(SPANS_PATH))
+        if self.metrics is not None:
+            start_tracing(self.metrics)
+        try:
+            await self.pool.open()
+            await self.ensure_models()
+        except BaseException as e:
+            # a Hive that fails to start still closes its sessions, the poller and the stores
+            await self.__aexit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    async def ensure_models(self):
+        """Pull the missing models on every healthy endpoint. A host that cannot be reached is ejected like
+        one that failed its poll; the Hive only fails to start when no host is left"""
+        endpoints = [endpoint for endpoint in self.pool.endpoints if endpoint.healthy]
+        results = await asyncio.gather(*(ensure_models(endpoint.ollama, USED_MODELS if endpoint.models is None else
+                                                       [m for m in USED_MODELS if endpoint.serves(m)])
+                                         for endpoint in endpoints), return_exceptions=True)
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, BaseException):
+                if not host_failure(result):
+                    raise result
+                self.pool.eject(endpoint)
+        if not any(endpoint.healthy for endpoint in self.pool.endpoints):
+            raise ConnectionError(f"No Ollama host is reachable: {', '.join(e.host for e in self.pool.endpoints)}")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self.response_cache is not None:
+                self.response_cache.close()
+            if self.ensemble is not None:
+                self.ensemble.close()
+            if self.checkpoints is not None:
+                self.checkpoints.close()
+            if UNLOAD_ON_EXIT:
+                await self.pool.unload_all()
+                if CONSOLE_LOGS:
+                    print("\nClosed all models")
+        finally:
+            stop_tracing()
+            await self.pool.close()
+
+    def print_stats(self):
+        for endpoint in self.pool.endpoints:
+            prefix = f"{endpoint.host} " if len(self.pool.endpoints) > 1 else ""
+            for model, stats in endpoint.scheduler.stats().items():
+                print(f"[QUEUE] {prefix}{model}: {stats['requests']} requests, avg wait {stats['avg_wait']:.2f}s, "
+                      f"max wait {stats['max_wait']:.2f}s")
+            print(f"[RESIDENCY] {prefix}{endpoint.residency.stats()}")
+            for stage_name, stats in endpoint.residency.prefetch_stats().items():
+                print(f"[PREFETCH] {prefix}{stage_name}: {stats['models']} loaded in {stats['load_time']:.2f}s, "
+                      f"{stats['hidden']:.2f}s hidden, skipped {stats['skipped']}, failed {stats['failed']}")
+        if len(self.pool.endpoints) > 1:
+            print(f"[POOL] {self.pool.stats()}")
+        if self.response_cache is not None:
+            print(f"[CACHE] {self.response_cache.cache_stats()}")
+        if self.research_cache is not None:
+            print(f"[RESEARCH CACHE] {self.research_cache.stats()}")
+        if COALESCE_QUESTIONS:
+            print(f"[COALESCE] questions: {self.questions.stats()}")
+        if self.coalescing is not None:
+            print(f"[COALESCE] calls: {self.coalescing.stats()}")
+        if self.checkpoints is not None:
+            print(f"[CHECKPOINT] {self.checkpoints.summary()}")
+        if self.ensemble is not None:
+            for category, calculators in self.ensemble.summary().items():
+                for calculator, stats in calculators.items():
+                    print(f"[ENSEMBLE] {category} {calculator}: {stats}")
+        if CALCULATION_QUORUM is not None:
+            print(f"[QUORUM] {QUORUM_STATS.summary()}")
+        if HEDGING:
+            for stage_name, stats in HEDGER.stats().items():
+                print(f"[HEDGE] {stage_name}: {stats}")
+        if TRACE_MODE == "replay":
+            print(f"[REPLAY] {self.pool.endpoints[0].ollama.stats()}")
+
+
+async def solve_question(hive: Hive, question_input: str):
+    """Runs research, calculations and evaluation for one question. Returns the answer and its QuestionStats.
+    With COALESCE_QUESTIONS a question asked again while it is being answered waits for that answer"""
+    if not COALESCE_QUESTIONS:
+        return await _solve_question(hive, question_input)
+    (answer, leader_stats), joined = await hive.questions.run(question_key(question_input),
+                                                              lambda: _solve_question(hive, question_input))
+    if not joined:
+        return answer, leader_stats
+    stats = start_question(question_input)
+    count_coalesced("question")
+    stats.confidence = leader_stats.confidence
+    stats.stop_reason = leader_stats.stop_reason
+    stats.finish()
+    return answer, stats
+
+
+async def _solve_question(hive: Hive, question_input: str):
+    stats = start_question(question_input)
+    agent_researcher = Agent(model=MODEL_LIGHT_ANALYTICAL, role=ROLE_RESEARCHER, client=hive.client, stage="research",
+                             timeout=CALL_TIMEOUT)
+    with span("question", kind="question", question=question_input[:200]) as question_span, deadline(QUESTION_DEADLINE):
+        if FAST_PATH:
+            with stage("fast_path"):
+                local_answer = solve_locally(question_input)
+            if local_answer is not None:
+                if CONSOLE_LOGS:
+                    print(f"[FAST PATH] computed locally: {local_answer}")
+                stats.confidence = COMPUTED
+                stats.finish()
+                question_span.set(answer=local_answer, confidence=COMPUTED)
+                return local_answer, stats
+        checkpoint = await hive.checkpoints.open(question_input) if hive.checkpoints is not None else None
+        if checkpoint is not None and checkpoint.get("stage") == ANSWERED and checkpoint.get("confidence") != BEST_EFFORT:
+            if CONSOLE_LOGS:
+                print(f"[CHECKPOINT] answered before: {checkpoint.get('answer')}")
+            stats.confidence = checkpoint.get("confidence")
+            stats.finish()
+            question_span.set(answer=checkpoint.get("answer"), resumed=True)
+            return checkpoint.get("answer"), stats
+        try:
+            with stage("research"):
+                research = checkpoint.get("research") if checkpoint is not None else None
+                research_task = None
+                if research is None:
+                    research_task = asyncio.create_task(handle_research(agent=agent_researcher, user_input=question_input,
+                                                                        temperature=0.15, max_tokens=2000,
+                                                                        cache=hive.research_cache))
+                if PREFETCH:
+                    hive.pool.prefetch(CALCULATOR_MODELS, stage="calculator")
+                    hive.pool.prefetch(EVALUATOR_MODELS, stage="evaluator")
+                if research_task is not None:
+                    research = await research_task
+                    # failed research ("{}") is tried again when the question resumes
+                    if research != "{}":
+                        await save_progress(checkpoint, stage="research", research=research)
+            if CONSOLE_LOGS:
+                print(research)
+
+            results = await handle_calculations(client=hive.client, user_input=question_input, research=research,
+                                                max_tokens=3000, ensemble=hive.ensemble, checkpoint=checkpoint)
+        except Exception as e:
+            await save_progress(checkpoint, stage=FAILED, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            stats.finish()
+        await save_progress(checkpoint, stage=ANSWERED, answer=results, confidence=stats.confidence,
+                            stop_reason=stats.stop_reason, error=None)
+        question_span.set(answer=results)
+    return results, stats
 
 
 async def main():
-    for model in USED_MODELS:
-        check_ollama_model(model)
-
-    try:
-        agent_researcher = Agent(model=MODEL_LIGHT_ANALYTICAL, role=ROLE_RESEARCHER)
-        agent_evaluator = Agent(model=MODEL_REGULAR, role=ROLE_EVALUATOR)
+    async with Hive() as hive:
         if QUESTION_BANK:
             question_input = get_chosen_question()
             print(f"Chosen question: {question_input}\n")
         else:
             question_input = input("> ")
 
-        research = await handle_research(agent=agent_researcher, user_input=question_input, temperature=0.15,
-                                         max_tokens=2000)
-        if CONSOLE_LOGS:
-            print(research)
-
-        results = await handle_calculations(evaluator=agent_evaluator, user_input=question_input,
-                                            research=research, max_tokens=3000)
+        try:
+            results, stats = await solve_question(hive, question_input)
+        except Exception as e:
+            print(f"AGENT EVALUATION FAILED: {e}")
+            if CHECKPOINTS:
+                print(f"(progress saved in {CHECKPOINT_PATH}, asking the same question again resumes it)")
+            raise
 
         print("AGENT EVALUATION: ", results)
+        if stats.confidence == BEST_EFFORT:
+            print(f"(best effort, evaluators did not agree: {stats.stop_reason})")
 
-    finally:
-        for model in USED_MODELS:
-            quit_ollama(model)
         if CONSOLE_LOGS:
-            print("\nClosed all models")
+            hive.print_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+import asyncio
+
+from Pure.OllamaClient import OllamaClient, OLLAMA_HOST
+
+PULL_TIMEOUT = 3600
+
+# host -> models known to be available there, kept for the whole process
+_available = {}
+
+
+def normalize_name(model: str):
+    """Ollama lists untagged models as <name>:latest"""
+    return model if ":" in model else f"{model}:latest"
+
+
+async def list_models(client: OllamaClient, refresh: bool = False):
+    """Names of models available on the client's host. Asks Ollama's /api/tags only once per host and process"""
+    host = getattr(client, "host", None)
+    if refresh or host not in _available:
+        data = await client.get("/api/tags")
+        _available.setdefault(host, set()).update(entry["name"] for entry in data.get("models", []))
+    return set(_available[host])
+
+
+async def pull_model(client: OllamaClient, model: str):
+    print(f"Pulling model '{model}'...")
+    await client.post("/api/pull", {"model": model, "stream": False}, timeout=PULL_TIMEOUT)
+    _available.setdefault(getattr(client, "host", None), set()).add(normalize_name(model))
+
+
+async def ensure_models(client: OllamaClient, models):
+    """Ensure Ollama models are available locally; pull the missing ones concurrently"""
+    available = await list_models(client)
+    missing = [m for m in dict.fromkeys(models) if normalize_name(m) not in available]
+    try:
+        await asyncio.gather(*(pull_model(client, m) for m in missing))
+    except Exception as e:
+        print(f"Error while pulling models {missing}:\n{e}")
+        raise
+
+
+async def stop_model(client: OllamaClient, model: str):
+    """Unload a model from memory. Saves a lot of RAM"""
+    try:
+        await client.post("/api/generate", {"model": model, "keep_alive": 0})
+    except Exception as e:
+        print(e)
+
+
+def ensure_models_sync(models, host: str = OLLAMA_HOST):
+    """Blocking variant of ensure_models for the synchronous LangChain/LangGraph scripts"""
+    async def run():
+        async with OllamaClient(host=host) as client:
+            await ensure_models(client, models)
+    asyncio.run(run())
+
+
+def stop_model_sync(model: str, host: str = OLLAMA_HOST):
+    """Blocking variant of stop_model for the synchronous LangChain/LangGraph scripts"""
+    async def run():
+        async with OllamaClient(host=host) as client:
+            await stop_model(client, model)
+    asyncio.run(run())
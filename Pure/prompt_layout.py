@@ -0,0 +1,31 @@
+import json
+
+# Ollama keeps the evaluated prompt of every loaded model and only evaluates what follows the longest common
+# prefix with it. Everything that stays the same across the rounds of a question therefore goes first,
+# byte for byte identical, and the parts that change (the candidates) go last.
+
+
+def shared_context(question: str, research: str):
+    """Stable prefix of every calculator and evaluator prompt of a question"""
+    return f"QUESTION: {question}\n\nRESEARCH: {research}\n"
+
+
+def dedupe_candidates(candidates):
+    """Distinct candidates in first-seen order and how many calculators produced each. Missing answers are dropped"""
+    unique = []
+    support = []
+    for candidate in candidates:
+        if candidate is None:
+            continue
+        if candidate in unique:
+            support[unique.index(candidate)] += 1
+        else:
+            unique.append(candidate)
+            support.append(1)
+    return unique, support
+
+
+def with_candidates(context: str, candidates):
+    """The shared context followed by the deduplicated candidates and their support"""
+    unique, support = dedupe_candidates(candidates)
+    return f"{context}\nPOSSIBLE ANSWERS: {json.dumps(unique)}\nSUPPORT: {json.dumps(support)}\n"
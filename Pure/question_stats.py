@@ -0,0 +1,138 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from Pure.tracing import span
+
+_current = contextvars.ContextVar("question_stats", default=None)
+
+
+class QuestionStats():
+    """Per-question counters: time spent per stage, model calls, retries, failed calls, hedges and
+    coalesced calls per stage, generated tokens and evaluation rounds"""
+    def __init__(self, question: str):
+        self.question = question
+        self.start = time.perf_counter()
+        self.end = None
+        self.stage_times = {}
+        self.model_calls = {}
+        self.retries = {}
+        self.failed_calls = {}
+        self.hedges = {}
+        self.coalesced = {}
+        self.tokens = 0
+        self.evaluation_rounds = 0
+        # one entry per finished calculator call, what EnsembleStats learns from
+        self.calculations = []
+        self.confidence = None
+        self.stop_reason = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def total_time(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self):
+        return {
+            "total_time": self.total_time,
+            "stage_times": dict(self.stage_times),
+            "model_calls": dict(self.model_calls),
+            "retries": dict(self.retries),
+            "failed_calls": dict(self.failed_calls),
+            "hedges": dict(self.hedges),
+            "coalesced": dict(self.coalesced),
+            "tokens": self.tokens,
+            "evaluation_rounds": self.evaluation_rounds,
+            "confidence": self.confidence,
+            "stop_reason": self.stop_reason
+        }
+
+
+def start_question(question: str):
+    """Start collecting stats for a question in the current task (and the tasks it spawns)"""
+    stats = QuestionStats(question)
+    _current.set(stats)
+    return stats
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage of the current question and trace it as a span. Not counted outside a question"""
+    stats = _current.get()
+    with span(name, kind="stage"):
+        if stats is None:
+            yield
+            return
+        with stats.stage(name):
+            yield
+
+
+def count_model_call(stage_name: str):
+    stats = _current.get()
+    if stats is not None:
+        stats.model_calls[stage_name] = stats.model_calls.get(stage_name, 0) + 1
+
+
+def count_retry(stage_name: str):
+    stats = _current.get()
+    if stats is not None:
+        stats.retries[stage_name] = stats.retries.get(stage_name, 0) + 1
+
+
+def count_failed_call(stage_name: str):
+    """A call that failed for good and was left out of its fan-out"""
+    stats = _current.get()
+    if stats is not None:
+        stats.failed_calls[stage_name] = stats.failed_calls.get(stage_name, 0) + 1
+
+
+def count_hedge(stage_name: str):
+    """A backup copy sent for a slow call, i.e. one extra model call"""
+    stats = _current.get()
+    if stats is not None:
+        stats.hedges[stage_name] = stats.hedges.get(stage_name, 0) + 1
+
+
+def count_coalesced(stage_name: str):
+    """A call (or with stage "question" the whole question) that shared the result of an identical one in flight"""
+    stats = _current.get()
+    if stats is not None:
+        stats.coalesced[stage_name] = stats.coalesced.get(stage_name, 0) + 1
+
+
+def count_tokens(data: dict):
+    """Add the prompt and generated tokens Ollama reports for a finished call. For streams closed before
+    Ollama's final chunk the Agent passes the number of chunks it received instead"""
+    stats = _current.get()
+    if stats is not None:
+        stats.tokens += (data.get("prompt_eval_count") or 0) + (data.get("eval_count") or 0)
+
+
+def record_calculation(model: str, role: str, latency: float, tokens: int, answer, failed: bool,
+                       cancelled: bool = False):
+    """Add one calculator run. A cancelled run (a quorum or deadline stopped it) has no answer and its latency
+    is only the time it ran before the cancellation"""
+    stats = _current.get()
+    if stats is not None:
+        stats.calculations.append({"model": model, "role": role, "latency": latency, "tokens": tokens,
+                                   "answer": answer, "failed": failed, "cancelled": cancelled})
+
+
+def count_evaluation_round():
+    stats = _current.get()
+    if stats is not None:
+        stats.evaluation_rounds += 1
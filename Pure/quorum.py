@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from Pure.answer_normalizer import equivalent
+
+
+class QuorumStats():
+    """How often a fan-out ended early, how many calls were cancelled and roughly how much time it saved.
+    Saved time is estimated from the mean duration of earlier completed calls of the same kind"""
+    def __init__(self):
+        self.runs = 0
+        self.early_exits = 0
+        self.cancelled = 0
+        self.time_saved = 0.0
+        self.durations = {}
+
+    def record_duration(self, key: str, seconds: float):
+        count, mean = self.durations.get(key, (0, 0.0))
+        self.durations[key] = (count + 1, mean + (seconds - mean) / (count + 1))
+
+    def expected_duration(self, key: str):
+        return self.durations.get(key, (0, None))[1]
+
+    def record_early_exit(self, cancelled_keys: list[str], elapsed: float):
+        self.early_exits += 1
+        self.cancelled += len(cancelled_keys)
+        expected = [self.expected_duration(k) for k in cancelled_keys]
+        self.time_saved += max([e - elapsed for e in expected if e is not None] + [0.0])
+
+    def summary(self):
+        return {
+            "runs": self.runs,
+            "early_exits": self.early_exits,
+            "early_exit_rate": self.early_exits / self.runs if self.runs else 0.0,
+            "cancelled_calls": self.cancelled,
+            "estimated_time_saved": self.time_saved
+        }
+
+
+def reached_quorum(results: list, quorum: int, same=equivalent):
+    return any(sum(1 for other in results if same(candidate, other)) >= quorum for candidate in results)
+
+
+async def gather_quorum(calls: list[tuple], quorum: int, same=equivalent, stats: QuorumStats = None):
+    """Run (key, coroutine) pairs concurrently and return their results in completion order.
+    As soon as `quorum` results agree under `same`, the remaining calls are cancelled,
+    which closes their requests and frees their model slots"""
+    start = time.perf_counter()
+    keys = {asyncio.ensure_future(coroutine): key for key, coroutine in calls}
+    pending = set(keys)
+    results = []
+    if stats is not None:
+        stats.runs += 1
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results.append(task.result())
+                if stats is not None:
+                    stats.record_duration(keys[task], time.perf_counter() - start)
+            if pending and reached_quorum(results, quorum, same):
+                if stats is not None:
+                    stats.record_early_exit([keys[t] for t in pending], time.perf_counter() - start)
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return results
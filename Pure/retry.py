@@ -0,0 +1,41 @@
+import asyncio
+import json
+import random
+
+import aiohttp
+
+from Pure.deadline import DeadlineExceeded, expired
+from Pure.json_repair import MalformedResponse
+from Pure.OllamaClient import StreamError
+from Pure.question_stats import count_retry
+from Pure.tracing import annotate
+
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+
+
+def retryable(error: BaseException):
+    """Broken output, dropped connections, timeouts and server side errors are worth another try.
+    Client errors such as an unknown model and a passed question deadline are not"""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (MalformedResponse, StreamError, json.JSONDecodeError, aiohttp.ClientError,
+                              asyncio.TimeoutError))
+
+
+async def with_retries(attempt, attempts: int = DEFAULT_ATTEMPTS, backoff: float = DEFAULT_BACKOFF,
+                       stage: str = None):
+    """Await attempt(n) for n = 0, 1, ... until it succeeds or `attempts` tries failed with retryable errors.
+    Waits with exponential backoff and jitter in between. The last error is raised"""
+    for n in range(attempts):
+        try:
+            return await attempt(n)
+        except Exception as e:
+            if n + 1 >= attempts or not retryable(e) or expired():
+                raise
+            count_retry(stage)
+            annotate(retries=n + 1, last_error=type(e).__name__)
+            await asyncio.sleep(min(MAX_BACKOFF, backoff * 2 ** n) * random.uniform(0.5, 1.0))
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("span", default=None)
+_exporters = []
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Ollama reports durations in nanoseconds
+NANOSECONDS = 1e9
+
+
+class Span():
+    """One timed unit of work: a question, a stage, an evaluation round or a single model call"""
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start", "end", "wall_start", "attributes")
+
+    def __init__(self, name: str, kind: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes or {}
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, value: float):
+        """Sum a numeric attribute, for calls that are retried or queued more than once"""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.wall_start,
+            "duration": self.duration,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan():
+    """Handed out while tracing is disabled so callers never have to check"""
+    __slots__ = ()
+    duration = 0.0
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, value: float):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def enabled():
+    return bool(_exporters)
+
+
+def start_tracing(*exporters):
+    """Start exporting spans. Without exporters span() costs one list check"""
+    _exporters.extend(exporters)
+
+
+def stop_tracing():
+    """Stop exporting and close the exporters"""
+    exporters = list(_exporters)
+    _exporters.clear()
+    for exporter in exporters:
+        exporter.close()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Time the enclosed block as a child of the current span. Tasks created inside inherit it as parent"""
+    if not _exporters:
+        yield NOOP_SPAN
+        return
+    current = Span(name, kind, parent=_current.get(), attributes=attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except asyncio.CancelledError:
+        current.set(cancelled=True)
+        raise
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+        for exporter in _exporters:
+            exporter.export(current)
+
+
+def current_span():
+    return _current.get() if _exporters else NOOP_SPAN
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, e.g. from client layers that do not own it"""
+    if _exporters:
+        current = _current.get()
+        if current is not None:
+            current.set(**attributes)
+
+
+def record_response(data: dict):
+    """Copy Ollama's token counts and timings of a finished generation onto the current span"""
+    if not _exporters:
+        return
+    current = _current.get()
+    if current is None:
+        return
+    tokens_in = data.get("prompt_eval_count")
+    tokens_out = data.get("eval_count")
+    eval_duration = data.get("eval_duration")
+    if tokens_in is not None:
+        current.add("tokens_in", tokens_in)
+    if tokens_out is not None:
+        current.add("tokens_out", tokens_out)
+    if data.get("load_duration") is not None:
+        current.add("load_time", data["load_duration"] / NANOSECONDS)
+    if data.get("prompt_eval_duration") is not None:
+        current.add("prompt_time", data["prompt_eval_duration"] / NANOSECONDS)
+    if eval_duration:
+        current.add("eval_time", eval_duration / NANOSECONDS)
+        current.set(tokens_per_sec=(tokens_out or 0) / (eval_duration / NANOSECONDS))
+
+
+class JsonlExporter():
+    """Appends every finished span as one JSON line"""
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def export(self, finished: Span):
+        line = json.dumps(finished.to_dict(), separators=(",", ":"), default=str) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + "}"
+
+
+class PrometheusExporter():
+    """Aggregates spans into Prometheus metrics and writes them in the text exposition format,
+    e.g. for node_exporter's textfile collector. The file is rewritten whenever a question finishes, so a
+    long-running process is visible while it runs. render() returns the same text, e.g. for a /metrics endpoint"""
+    def __init__(self, path: str = None, buckets: tuple = DURATION_BUCKETS):
+        self.path = path
+        self.buckets = buckets
+        self.durations = {}
+        self.queue_waits = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _observe(self, histograms: dict, labels: tuple, value: float):
+        histogram = histograms.setdefault(labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def _count(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def export(self, finished: Span):
+        attributes = finished.attributes
+        model = attributes.get("model", "")
+        with self.lock:
+            self._observe(self.durations, (finished.kind, finished.name, model), finished.duration)
+            if finished.kind == "model_call":
+                self._count("hive_model_calls_total", (model, attributes.get("stage", "")), 1)
+                if "error" in attributes:
+                    self._count("hive_model_call_errors_total", (model, attributes.get("stage", "")), 1)
+                if "queue_wait" in attributes:
+                    self._observe(self.queue_waits, (model,), attributes["queue_wait"])
+                for attribute, direction in (("tokens_in", "in"), ("tokens_out", "out")):
+                    if attribute in attributes:
+                        self._count("hive_tokens_total", (model, direction), attributes[attribute])
+                for attribute in ("load_time", "eval_time"):
+                    if attribute in attributes:
+                        self._count(f"hive_model_{attribute}_seconds_total", (model,), attributes[attribute])
+        if finished.kind == "question":
+            self.write()
+
+    def _render_histogram(self, lines: list, name: str, label_names: tuple, histograms: dict):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in sorted(histograms.items()):
+            base = dict(zip(label_names, labels))
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f"{name}_bucket{_labels(dict(base, le=bound))} {count}")
+            lines.append(f"{name}_bucket{_labels(dict(base, le='+Inf'))} {histogram['count']}")
+            lines.append(f"{name}_sum{_labels(base)} {histogram['sum']}")
+            lines.append(f"{name}_count{_labels(base)} {histogram['count']}")
+
+    def render(self):
+        lines = []
+        with self.lock:
+            self._render_histogram(lines, "hive_span_duration_seconds", ("kind", "name", "model"), self.durations)
+            self._render_histogram(lines, "hive_queue_wait_seconds", ("model",), self.queue_waits)
+            label_names = {
+                "hive_model_calls_total": ("model", "stage"),
+                "hive_model_call_errors_total": ("model", "stage"),
+                "hive_tokens_total": ("model", "direction"),
+                "hive_model_load_time_seconds_total": ("model",),
+                "hive_model_eval_time_seconds_total": ("model",)
+            }
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"{name}{_labels(dict(zip(label_names[name], labels)))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Replace the metrics file atomically so a scraper never reads half of it"""
+        if self.path is None:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(self.render())
+        os.replace(temporary, self.path)
+
+    def close(self):
+        self.write()
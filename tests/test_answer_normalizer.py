@@ -0,0 +1,97 @@
+from fractions import Fraction
+
+import pytest
+
+from Pure.answer_normalizer import (NO_SOLUTION, NotComputable, canonicalize, clear_majority, cluster_answers,
+                                    equivalent, evaluate_answer, is_final_form, rounded, stated_precision)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("0.5", "1/2"),
+    ("0.50", "\\frac{1}{2}"),
+    ("2√3", "2*sqrt(3)"),
+    ("x = 4", "4"),
+    ("1,000", "1000"),
+    ("2x + 1", "1 + 2*x"),
+    ("(1, 2)", "(1.0, 2)"),
+])
+def test_equivalent_spellings(a, b):
+    assert equivalent(a, b)
+
+
+@pytest.mark.parametrize("a, b", [("0.5", "0.51"), ("2x", "x^2"), ("3", "-3")])
+def test_different_answers(a, b):
+    assert not equivalent(a, b)
+
+
+def test_precision_rounds_before_comparing():
+    assert equivalent("3.14159", "3.1416", precision=3)
+    assert not equivalent("3.14159", "3.1416")
+
+
+def test_canonicalize_keeps_markers_and_empty_answers():
+    assert canonicalize(" #No_Solution ") == NO_SOLUTION
+    assert canonicalize("") is None
+    assert canonicalize(None) is None
+
+
+def test_evaluate_answer_stays_exact():
+    assert evaluate_answer("1/3 + 1/6") == Fraction(1, 2)
+    assert evaluate_answer("sqrt(9/4)") == Fraction(3, 2)
+    assert isinstance(evaluate_answer("sqrt(2)"), float)
+    with pytest.raises(NotComputable):
+        evaluate_answer("y + 1")
+
+
+@pytest.mark.parametrize("value, precision, expected", [
+    (Fraction(1, 8), 2, "0.13"),
+    (Fraction(5, 2), 0, "3"),
+    (Fraction(-5, 2), 0, "-3"),
+    (2.675, 2, "2.68"),
+    (-0.001, 2, "0.00"),
+])
+def test_rounded_half_up(value, precision, expected):
+    assert rounded(value, precision) == expected
+
+
+def test_huge_exact_values_are_not_computed():
+    with pytest.raises(NotComputable):
+        evaluate_answer("7^4000 * 7^4000")
+
+
+def test_cluster_answers_orders_by_support():
+    clusters = cluster_answers(["1/2", "0.5", "3", "0.50"])
+    assert [c["support"] for c in clusters] == [3, 1]
+    assert clusters[0]["representative"] in ("1/2", "0.5", "0.50")
+
+
+def test_clear_majority():
+    assert equivalent(clear_majority(["1/2", "0.5", "3"]), "1/2")
+    assert clear_majority(["1", "2"]) is None
+    assert clear_majority(["1", "1", "2", "2"]) is None
+    assert clear_majority(["#not_good", "#not_good", "1"]) is None
+
+
+def test_stated_precision():
+    assert stated_precision("Round to 3 decimal places") == 3
+    assert stated_precision("What is 2+2?") is None
+
+
+@pytest.mark.parametrize("answer", ["5", "-3/4", "0.25", "2*sqrt(3)", "(3 + sqrt(5))/2", "-1 + sqrt(2)",
+                                    "3*sqrt(2)/2", "(1, -2)", "x = 4"])
+def test_final_forms(answer):
+    assert is_final_form(answer)
+
+
+@pytest.mark.parametrize("answer", ["(10 choose 5) * 0.5^10", "-2 +- sqrt(20/3) * 18", "252*0.5^10", "sqrt(8)",
+                                    "1/2 + 1/3", "3/4/2", "pi", "x + 1", "3 cm", NO_SOLUTION])
+def test_non_final_forms(answer):
+    assert not is_final_form(answer)
+
+
+def test_clear_majority_in_final_form_only():
+    assert clear_majority(["(10 choose 5) * 0.5^10"] * 2, final_only=True) is None
+    assert clear_majority(["-2 +- sqrt(20/3) * 18"] * 2 + ["5"], final_only=True) is None
+    assert clear_majority(["252 * 0.5^10", "252*0.5^10", "3"], final_only=True) is None
+    # a cluster with a final spelling is answered with it
+    assert clear_majority(["252*0.5^10", "252*0.5^10", "63/256"], final_only=True) == "63/256"
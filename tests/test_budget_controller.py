@@ -0,0 +1,76 @@
+import contextvars
+
+from Pure.BudgetController import BudgetController
+from Pure.deadline import deadline
+from Pure.question_stats import count_tokens, start_question
+
+
+def in_question(test):
+    """Run `test` with its own QuestionStats, as the pipeline does for every question"""
+    return contextvars.copy_context().run(lambda: test(start_question("test question")))
+
+
+def test_width_grows_with_disagreement():
+    controller = BudgetController(max_width=3)
+    assert controller.disagreement(["1", "1/1", "1.0"]) == 0.0
+    assert controller.next_width(["1", "1/1", "1.0"]) == 1
+    assert controller.next_width(["1", "2", "3"]) == 2
+    assert controller.next_width(["1", "2", "3", "4", "5"]) == 3
+    assert controller.next_width([]) == 3
+
+
+def test_not_good_does_not_count_as_a_candidate():
+    controller = BudgetController(max_width=3)
+    assert controller.disagreement(["5", "#not_good"]) == 0.0
+
+
+def test_stops_after_max_rounds():
+    controller = BudgetController(max_rounds=2)
+    controller.record_round(0.1, 3, ["1", "2"])
+    controller.record_round(0.1, 3, ["3", "4"])
+    assert controller.next_width(["1", "2"]) == 0
+    assert controller.stop_reason == "max_rounds"
+
+
+def test_stops_when_the_leader_stalls():
+    controller = BudgetController(patience=2)
+    for _ in range(3):
+        controller.record_round(0.1, 2, ["7", "7", "8"])
+    assert controller.next_width(["7", "7", "8"]) == 0
+    assert controller.stop_reason == "stalled"
+
+
+def test_stops_when_the_next_round_does_not_fit_the_time_budget():
+    controller = BudgetController(time_budget=1.0)
+    controller.start -= 0.5
+    controller.record_round(0.8, 2, ["1", "2"])
+    assert controller.next_width(["1", "2"]) == 0
+    assert controller.stop_reason == "time_budget"
+
+
+def test_token_budget_caps_the_width():
+    def test(stats):
+        controller = BudgetController(token_budget=1000, max_width=3)
+        count_tokens({"prompt_eval_count": 200, "eval_count": 200})
+        controller.record_round(0.1, 1, ["1", "2"])
+        # 400 tokens per call, 600 left: one more call fits
+        assert controller.next_width(["1", "2", "3"]) == 1
+        count_tokens({"eval_count": 600})
+        assert controller.next_width(["1", "2", "3"]) == 0
+        assert controller.stop_reason == "token_budget"
+        assert controller.summary()["tokens"] == stats.tokens == 1000
+    in_question(test)
+
+
+def test_stops_at_the_question_deadline():
+    controller = BudgetController()
+    with deadline(0):
+        assert controller.next_width(["1", "2"]) == 0
+    assert controller.stop_reason == "deadline"
+
+
+def test_best_effort_prefers_an_answer_over_no_solution():
+    controller = BudgetController()
+    assert controller.best_effort(["#no_solution", "#no_solution", "4"]) == "4"
+    assert controller.best_effort(["#no_solution"]) == "#no_solution"
+    assert controller.best_effort([]) is None
@@ -0,0 +1,47 @@
+import asyncio
+
+from Pure.CheckpointStore import ANSWERED, CheckpointStore
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+
+    async def first_run():
+        store = CheckpointStore(path)
+        checkpoint = await store.open("What is 2+2?")
+        assert not checkpoint.resumed
+        await checkpoint.update(stage="calculate", research="{}", candidates=["4", "5"], round=1)
+        await checkpoint.add_evaluation(["#not_good", "4"])
+        store.close()
+
+    async def second_run():
+        store = CheckpointStore(path)
+        # the same question asked with different case and spacing
+        checkpoint = await store.open("  what is 2+2 ")
+        store.close()
+        return checkpoint, store.counters
+
+    asyncio.run(first_run())
+    checkpoint, counters = asyncio.run(second_run())
+    assert checkpoint.resumed
+    assert checkpoint.get("stage") == "evaluate"
+    assert checkpoint.get("candidates") == ["4", "5"]
+    assert checkpoint.get("round") == 1
+    assert checkpoint.get("evaluations") == [["#not_good", "4"]]
+    assert counters == {"started": 0, "resumed": 1, "saves": 0}
+
+
+def test_summary_counts_stages(tmp_path):
+    async def run():
+        store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+        for question in ("a", "b", "c"):
+            await (await store.open(question)).update(stage="calculate")
+        await (await store.open("a")).update(stage=ANSWERED, answer="1")
+        summary = store.summary()
+        store.close()
+        return summary
+
+    summary = asyncio.run(run())
+    assert summary["stages"] == {"calculate": 2, ANSWERED: 1}
+    assert summary["started"] == 3 and summary["resumed"] == 1 and summary["saves"] == 4
+
@@ -0,0 +1,51 @@
+import asyncio
+import socket
+
+import Pure.main as hive_main
+from Pure.FakeOllama import FakeOllama, load_answers
+from Pure.QuestionDataset import QuestionDataset
+from Pure.answer_normalizer import equivalent
+from Pure.benchmark import DEFAULT_QUESTIONS
+
+QUESTIONS = 3
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def test_hive_answers_through_the_evaluators(monkeypatch):
+    """End to end against the stand-in server: research, calculators and evaluator rounds, no local shortcuts"""
+    host = f"http://127.0.0.1:{free_port()}"
+    monkeypatch.setattr(hive_main, "OLLAMA_ENDPOINTS", {host: None})
+    monkeypatch.setattr(hive_main, "LOCAL_CONSENSUS", False)
+    monkeypatch.setattr(hive_main, "FAST_PATH", False)
+    monkeypatch.setattr(hive_main, "CONSOLE_LOGS", False)
+    monkeypatch.setattr(hive_main, "QUESTION_DEADLINE", 60)
+    entries = [entry for entry in QuestionDataset(DEFAULT_QUESTIONS) if entry["correct_answer"] is not None]
+    entries = entries[:QUESTIONS]
+    server = FakeOllama(load_delay=0, token_latency=0, wrong_answer_rate=0, answers=load_answers(DEFAULT_QUESTIONS))
+
+    async def run():
+        await server.start(port=int(host.rsplit(":", 1)[1]))
+        try:
+            async with hive_main.Hive() as hive:
+                return [await hive_main.solve_question(hive, entry["question"]) for entry in entries]
+        finally:
+            await server.stop()
+
+    results = asyncio.run(run())
+    for entry, (answer, stats) in zip(entries, results):
+        assert equivalent(answer, entry["correct_answer"])
+        assert stats.model_calls.get("evaluator", 0) > 0
+    assert server.requests > 0
+
+
+def test_parallel_slots_per_model():
+    async def run():
+        server = FakeOllama(parallel={"phi4-mini": 4, "qwen2.5:7b": 2})
+        return [server.slot(model)._value for model in ("phi4-mini:latest", "qwen2.5:7b", "gemma2:2b")]
+
+    assert asyncio.run(run()) == [4, 2, 1]
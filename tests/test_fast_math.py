@@ -0,0 +1,73 @@
+import time
+from fractions import Fraction
+
+import pytest
+
+from Pure.answer_normalizer import NotComputable
+from Pure.fast_math import Surd, extract_computation, matches_value, question_value, solve_locally, verified_candidate
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What is 12*13?", "156"),
+    ("Compute 1/3 + 1/6", "1/2"),
+    ("Simplify sqrt(8) + sqrt(2)", "3*sqrt(2)"),
+    ("What is 1/(1 + sqrt(2))?", "-1 + sqrt(2)"),
+    ("Solve for x: 3x + 5 = 20", "5"),
+    ("What is 2^10?", "1024"),
+    ("Calculate 10/4, rounded to 1 decimal place", "2.5"),
+    ("What is 1/8 to 2 decimal places?", "0.13"),
+    ("Evaluate 5/2 to 0 decimal places", "3"),
+    ("What is sqrt(2) to 3 decimal places?", "1.414"),
+])
+def test_solve_locally(question, answer):
+    assert solve_locally(question) == answer
+
+
+@pytest.mark.parametrize("question", [
+    "A train leaves at 3 pm going 60 km/h. When does it arrive 150 km away?",
+    "What is the derivative of x^3 at x = 2?",
+    "Solve x^2 = 4",
+    "What is sin(1)?",
+    "What is 1/0?",
+])
+def test_questions_that_need_the_hive(question):
+    assert solve_locally(question) is None
+
+
+def test_extract_computation_strips_instructions():
+    assert extract_computation("Please calculate 3 + 4 and give the answer as a fraction.") == ("3 + 4", None)
+    assert extract_computation("Solve for y: 2y = 8") == ("2y = 8", "y")
+
+
+@pytest.mark.parametrize("question", ["What is 7^4000 * 7^4000?", "What is (9^4096)^4096?", "What is 10^100000?"])
+def test_huge_exact_values_give_up_quickly(question):
+    start = time.perf_counter()
+    assert solve_locally(question) is None
+    assert time.perf_counter() - start < 1.0
+
+
+def test_surd_arithmetic():
+    root2 = Surd.sqrt(Fraction(2))
+    assert (root2 * root2).as_fraction() == 2
+    assert str(Surd.sqrt(Fraction(12))) == "2*sqrt(3)"
+    assert str(Surd.sqrt(Fraction(1, 2))) == "sqrt(2)/2"
+    assert (Surd.rational(1) / root2).terms == {2: Fraction(1, 2)}
+    with pytest.raises(NotComputable):
+        Surd.sqrt(Fraction(-1))
+    with pytest.raises(NotComputable):
+        Surd().inverse()
+
+
+def test_matches_value():
+    value = question_value("What is 1/3 + 1/6?")
+    assert matches_value("0.5", value)
+    assert matches_value("1/2", value)
+    assert not matches_value("0.51", value)
+    assert matches_value("0.50", question_value("What is 0.998/2?"), precision=2)
+    assert matches_value("sqrt(2)*3", question_value("Simplify sqrt(18)"))
+
+
+def test_verified_candidate_picks_the_most_frequent_match():
+    value = question_value("What is 6*7?")
+    assert verified_candidate(["41", "42", "42.0", "42", None], value) == "42"
+    assert verified_candidate(["41", "#no_solution"], value) is None
@@ -0,0 +1,50 @@
+import pytest
+
+from Pure.json_repair import MalformedResponse, extract_json
+
+
+def test_plain_object():
+    assert extract_json('{"thought": "t", "final_answer": "4"}') == {"thought": "t", "final_answer": "4"}
+
+
+def test_markdown_fence_and_surrounding_text():
+    text = 'Here you go:\n```json\n{"final_answer": "x = 2"}\n```\nHope it helps.'
+    assert extract_json(text, required=("final_answer",)) == {"final_answer": "x = 2"}
+
+
+def test_skips_objects_without_the_required_keys():
+    text = 'Example: {"a": 1}. Answer: {"thought": "ok", "final_answer": 3}'
+    assert extract_json(text, required=("final_answer",))["final_answer"] == 3
+
+
+def test_truncated_output_is_closed_after_its_last_complete_value():
+    data = extract_json('{"final_answer": "7", "thought": "first, add the two numb')
+    assert data == {"final_answer": "7"}
+
+
+def test_nested_truncated_output():
+    data = extract_json('{"final_answer": "1", "steps": [{"n": 1}, {"n": 2}, {"n"')
+    assert data == {"final_answer": "1", "steps": [{"n": 1}, {"n": 2}]}
+
+
+def test_required_key_cut_off_mid_value_raises():
+    with pytest.raises(MalformedResponse):
+        extract_json('{"thought": "done", "final_answer": "12', required=("final_answer",))
+
+
+def test_no_json_raises():
+    with pytest.raises(MalformedResponse):
+        extract_json("I cannot answer that.")
+    with pytest.raises(MalformedResponse):
+        extract_json("")
+
+
+def test_dict_passes_through():
+    assert extract_json({"final_answer": 1}, required=("final_answer",)) == {"final_answer": 1}
+    with pytest.raises(MalformedResponse):
+        extract_json({"thought": "t"}, required=("final_answer",))
+
+
+def test_malformed_response_is_a_value_error():
+    with pytest.raises(ValueError):
+        extract_json("nothing")
@@ -0,0 +1,108 @@
+import asyncio
+
+from Pure.ModelScheduler import ModelScheduler
+
+
+class GatedClient():
+    """Chat calls block until their model's gate opens; records which models are generating"""
+    def __init__(self):
+        self.gates = {}
+        self.active = []
+
+    def gate(self, model: str):
+        return self.gates.setdefault(model, asyncio.Event())
+
+    async def chat(self, package: dict, stage: str = None):
+        self.active.append(package["model"])
+        try:
+            await self.gate(package["model"]).wait()
+        finally:
+            self.active.remove(package["model"])
+        return {"model": package["model"]}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_model_gets_only_its_slots():
+    async def run():
+        client = GatedClient()
+        scheduler = ModelScheduler(client, slots={"a": 2})
+        tasks = [asyncio.ensure_future(scheduler.chat({"model": "a"})) for _ in range(3)]
+        await settle()
+        running, queued = list(client.active), scheduler.queue_depth("a")
+        client.gate("a").set()
+        await asyncio.gather(*tasks)
+        return running, queued, scheduler.running, scheduler.queue_depth()
+
+    assert asyncio.run(run()) == (["a", "a"], 1, {}, 0)
+
+
+def test_new_model_waits_for_an_active_one_to_finish():
+    async def run():
+        client = GatedClient()
+        scheduler = ModelScheduler(client, max_active_models=2)
+        tasks = [asyncio.ensure_future(scheduler.chat({"model": m})) for m in ("a", "b", "c")]
+        await settle()
+        before = sorted(client.active)
+        client.gate("a").set()
+        await settle()
+        after = sorted(client.active)
+        client.gate("b").set()
+        client.gate("c").set()
+        await asyncio.gather(*tasks)
+        return before, after
+
+    assert asyncio.run(run()) == (["a", "b"], ["b", "c"])
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        client = GatedClient()
+        scheduler = ModelScheduler(client)
+        first = asyncio.ensure_future(scheduler.chat({"model": "a"}))
+        second = asyncio.ensure_future(scheduler.chat({"model": "a"}))
+        await settle()
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        queued = scheduler.queue_depth("a")
+        client.gate("a").set()
+        await first
+        return second.cancelled(), queued, scheduler.running
+
+    assert asyncio.run(run()) == (True, 0, {})
+
+
+def test_cancelled_call_frees_its_slot():
+    async def run():
+        client = GatedClient()
+        scheduler = ModelScheduler(client)
+        first = asyncio.ensure_future(scheduler.chat({"model": "a"}))
+        second = asyncio.ensure_future(scheduler.chat({"model": "a"}))
+        await settle()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await settle()
+        running = list(client.active)
+        client.gate("a").set()
+        await second
+        return running, scheduler.running
+
+    assert asyncio.run(run()) == (["a"], {})
+
+
+def test_waiter_cancelled_after_its_grant_releases_the_slot():
+    async def run():
+        scheduler = ModelScheduler(GatedClient())
+        await scheduler.acquire("a")
+        waiter = asyncio.ensure_future(scheduler.acquire("a"))
+        await settle()
+        # the slot is handed over and the waiter cancelled before it gets to run
+        scheduler.release("a")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return scheduler.running, scheduler.queue_depth()
+
+    assert asyncio.run(run()) == ({}, 0)
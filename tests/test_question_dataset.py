@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from Pure.QuestionDataset import QuestionDataset, normalize_entry, shard_of
+
+RECORDS = 40
+
+
+@pytest.fixture
+def questions(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    lines = [json.dumps({"question": f"What is {i} + {i}?", "correct_answer": str(2 * i)}) for i in range(RECORDS)]
+    # blank lines are not records
+    path.write_text("\n".join(lines[:10]) + "\n\n" + "\n".join(lines[10:]) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_normalize_entry_defaults():
+    entry = normalize_entry({"question": "What is the probability of two heads?"}, 3)
+    assert entry["id"] == "3"
+    assert entry["category"] == "probability"
+    assert entry["correct_answer"] is None and entry["difficulty"] is None
+    assert normalize_entry("What is 1+1?", 0)["question"] == "What is 1+1?"
+    with pytest.raises(ValueError):
+        normalize_entry({"answer": 1}, 0)
+
+
+def test_iteration_and_random_access_agree(questions):
+    dataset = QuestionDataset(questions)
+    entries = list(dataset)
+    assert len(dataset) == RECORDS == len(entries)
+    assert [e["id"] for e in entries] == [str(i) for i in range(RECORDS)]
+    assert dataset[25] == entries[25]
+    assert dataset[-1] == entries[-1]
+    with pytest.raises(IndexError):
+        dataset[RECORDS]
+
+
+def test_index_is_saved_and_rebuilt_when_the_file_changes(questions):
+    offsets = QuestionDataset(questions).offsets()
+    assert os.path.exists(questions + ".idx")
+    assert QuestionDataset(questions).offsets() == offsets
+
+    with open(questions, "a", encoding="utf-8") as file:
+        file.write(json.dumps({"question": "What is 100 + 100?"}) + "\n")
+    dataset = QuestionDataset(questions)
+    assert len(dataset) == RECORDS + 1
+    assert dataset[RECORDS]["question"] == "What is 100 + 100?"
+
+
+def test_sample_is_deterministic(questions):
+    dataset = QuestionDataset(questions)
+    first = [e["id"] for e in dataset.sample(10, seed=7)]
+    assert first == [e["id"] for e in dataset.sample(10, seed=7)]
+    assert len(set(first)) == 10
+    assert len(dataset.sample(RECORDS * 2)) == RECORDS
+
+
+def test_shards_are_disjoint_and_complete(questions):
+    dataset = QuestionDataset(questions)
+    shards = [[e["id"] for e in dataset.shard(i, 3)] for i in range(3)]
+    assert sorted(sum(shards, []), key=int) == [str(i) for i in range(RECORDS)]
+    assert all(shard_of(question_id, 3) == i for i, shard in enumerate(shards) for question_id in shard)
+    with pytest.raises(ValueError):
+        list(dataset.shard(3, 3))
+
+
+def test_json_list(tmp_path):
+    path = tmp_path / "questions.json"
+    path.write_text(json.dumps([{"id": "a", "question": "What is 1+1?"}, {"question": "Solve 2x = 4"}]))
+    dataset = QuestionDataset(str(path))
+    assert len(dataset) == 2
+    assert [e["id"] for e in dataset] == ["a", "1"]
+    assert dataset[1]["category"] == "equation"
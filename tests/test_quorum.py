@@ -0,0 +1,86 @@
+import asyncio
+
+from Pure.quorum import QuorumStats, gather_quorum, reached_quorum
+
+
+def test_reached_quorum_counts_equivalent_answers():
+    assert reached_quorum(["0.5", "1/2"], 2)
+    assert not reached_quorum(["0.5", "2"], 2)
+
+
+def test_quorum_cancels_the_remaining_calls():
+    cancelled = []
+
+    async def answer(value: str, wait: asyncio.Event = None):
+        if wait is None:
+            return value
+        try:
+            await wait.wait()
+        except asyncio.CancelledError:
+            cancelled.append(value)
+            raise
+        return value
+
+    async def run():
+        never = asyncio.Event()
+        stats = QuorumStats()
+        results = await gather_quorum([("a", answer("4")), ("b", answer("4.0")), ("c", answer("5", never))],
+                                      quorum=2, stats=stats)
+        return results, stats.summary()
+
+    results, summary = asyncio.run(run())
+    assert sorted(results) == ["4", "4.0"]
+    assert cancelled == ["5"]
+    assert summary["early_exits"] == 1 and summary["cancelled_calls"] == 1
+
+
+def test_without_quorum_every_call_finishes():
+    async def run():
+        return await gather_quorum([(k, asyncio.sleep(0, result=k)) for k in ("1", "2", "3")], quorum=2)
+
+    assert sorted(asyncio.run(run())) == ["1", "2", "3"]
+
+
+def test_cancelling_the_caller_cancels_every_call():
+    cancelled = []
+
+    async def hang(key: str, running: asyncio.Event):
+        running.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(key)
+            raise
+
+    async def run():
+        running = [asyncio.Event(), asyncio.Event()]
+        quorum = asyncio.ensure_future(gather_quorum([("a", hang("a", running[0])), ("b", hang("b", running[1]))],
+                                                     quorum=2))
+        await asyncio.gather(*(r.wait() for r in running))
+        quorum.cancel()
+        await asyncio.gather(quorum, return_exceptions=True)
+        return quorum.cancelled()
+
+    assert asyncio.run(run())
+    assert sorted(cancelled) == ["a", "b"]
+
+
+def test_error_cancels_the_other_calls():
+    cancelled = []
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def hang():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append("hang")
+            raise
+
+    async def run():
+        return await asyncio.gather(gather_quorum([("fail", fail()), ("hang", hang())], quorum=2),
+                                    return_exceptions=True)
+
+    assert isinstance(asyncio.run(run())[0], RuntimeError)
+    assert cancelled == ["hang"]
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from Pure.ResearchCache import ResearchCache, normalize_question
+
+
+def test_only_standalone_numbers_are_masked():
+    assert normalize_question("Solve  x^2 - 5x + 6 = 0") == "solve x^2 - <num>x + <num> = <num>"
+    assert normalize_question("log2(x) = 3.5") == "log2(x) = <num>"
+    assert normalize_question("x**3 + 10") == "x**3 + <num>"
+
+
+@pytest.mark.parametrize("asked, hit", [
+    ("What is the probability of exactly 7 heads in 12 coin flips?", True),
+    ("Solve x^2 - 7x + 12 = 0", True),
+    ("What is the probability of at least 5 heads in 10 coin flips?", False),
+    ("Find the minimum of f(x) = x^2 - 4x on [0, 5]", False),
+    ("Solve x^3 - 5x + 6 = 0", False),
+    ("Solve log3(x) + 1 = 4", False),
+])
+def test_lexical_lookup(asked, hit):
+    async def run():
+        cache = ResearchCache(None)
+        for question in ("What is the probability of exactly 5 heads in 10 coin flips?",
+                         "Find the maximum of f(x) = x^2 - 4x on [0, 5]", "Solve x^2 - 5x + 6 = 0",
+                         "Solve log2(x) + 1 = 4"):
+            await cache.store(question, question)
+        return await cache.lookup(asked)
+
+    assert (asyncio.run(run()) is not None) == hit
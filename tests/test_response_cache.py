@@ -0,0 +1,73 @@
+import asyncio
+
+from Pure.ResponseCache import ResponseCache
+
+PACKAGE = {"model": "qwen2.5:3b", "messages": [{"role": "user", "content": "2+2"}], "options": {"temperature": 0.05}}
+
+
+class ScriptedClient():
+    """Answers chat calls with the given contents in order"""
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.calls = 0
+
+    async def chat(self, package: dict, stage: str = None):
+        self.calls += 1
+        return {"message": {"role": "assistant", "content": self.contents.pop(0)}, "done": True}
+
+    async def chat_stream(self, package: dict, stage: str = None):
+        self.calls += 1
+        yield {"message": {"role": "assistant", "content": self.contents.pop(0)}, "done": True}
+
+
+def test_malformed_responses_are_not_cached(tmp_path):
+    client = ScriptedClient('{"thought": "cut off', '{"final_answer": "4"}')
+
+    async def run():
+        cache = ResponseCache(client, path=str(tmp_path / "cache.sqlite3"))
+        first = await cache.chat(PACKAGE, stage="calculator")
+        second = await cache.chat(PACKAGE, stage="calculator")
+        third = await cache.chat(PACKAGE, stage="calculator")
+        stats = cache.cache_stats()
+        cache.close()
+        return first, second, third, stats
+
+    first, second, third, stats = asyncio.run(run())
+    assert first["message"]["content"] == '{"thought": "cut off'
+    assert second["message"]["content"] == third["message"]["content"] == '{"final_answer": "4"}'
+    assert client.calls == 2
+    assert stats["rejected"] == 1 and stats["memory_hits"] == 1 and stats["disk_entries"] == 1
+
+
+def test_malformed_streams_are_not_cached():
+    client = ScriptedClient("no json here", '{"final_answer": "4"}')
+
+    async def run():
+        cache = ResponseCache(client)
+        for _ in range(3):
+            async for _ in cache.chat_stream(PACKAGE, stage="calculator"):
+                pass
+        return cache.cache_stats()
+
+    stats = asyncio.run(run())
+    assert client.calls == 2
+    assert stats["rejected"] == 1 and stats["memory_hits"] == 1
+
+
+def test_malformed_rows_on_disk_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        # a row written before responses were checked
+        old = ResponseCache(None, path=path, required_keys={})
+        await old.store("key", PACKAGE, "calculator", {"message": {"content": "broken"}})
+        old.close()
+        cache = ResponseCache(None, path=path)
+        response = await cache.lookup("key", "calculator")
+        stats = cache.cache_stats()
+        cache.close()
+        return response, stats
+
+    response, stats = asyncio.run(run())
+    assert response is None
+    assert stats["disk_entries"] == 0
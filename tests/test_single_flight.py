@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from Pure.SingleFlight import SingleFlight, question_key
+
+
+def test_question_key_ignores_case_spacing_and_punctuation():
+    assert question_key("  What is  2+2? ") == question_key("what is 2+2") == "what is 2+2"
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.run("key", compute) for _ in range(3)))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert calls == 1
+    assert sorted(joined for _, joined in results) == [False, True, True]
+    assert all(result == "answer" for result, _ in results)
+    assert flights.stats() == {"leaders": 1, "waiters": 2, "in_flight": 0}
+
+
+def test_finished_key_runs_again():
+    async def run():
+        flights = SingleFlight()
+        first = await flights.run("key", lambda: asyncio.sleep(0, result=1))
+        second = await flights.run("key", lambda: asyncio.sleep(0, result=2))
+        return first, second
+
+    assert asyncio.run(run()) == ((1, False), (2, False))
+
+
+def test_same_owner_is_never_merged():
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.run("key", lambda: asyncio.sleep(0.01, result="a"), owner="q1"),
+                                    flights.run("key", lambda: asyncio.sleep(0.01, result="b"), owner="q1"))
+
+    assert asyncio.run(run()) == [("a", False), ("b", False)]
+
+
+def test_errors_reach_every_caller():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.run("key", fail), flights.run("key", fail), return_exceptions=True)
+
+    assert [type(e) for e in asyncio.run(run())] == [RuntimeError, RuntimeError]
+
+
+def test_computation_survives_until_every_caller_is_cancelled():
+    async def run():
+        flights = SingleFlight()
+        finished = asyncio.Event()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            finished.set()
+            return "done"
+
+        leader = asyncio.create_task(flights.run("key", compute))
+        waiter = asyncio.create_task(flights.run("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await waiter == ("done", True)
+        assert finished.is_set()
+
+        only = asyncio.create_task(flights.run("other", compute))
+        await asyncio.sleep(0.01)
+        only.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await only
+        await asyncio.sleep(0.01)
+        return flights.stats()["in_flight"]
+
+    assert asyncio.run(run()) == 0